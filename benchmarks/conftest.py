@@ -0,0 +1,137 @@
+import ftplib
+import os
+from typing import Callable, Iterator
+
+import pytest
+from file_retriever import Client
+from file_retriever._clients import _ftpClient, _sftpClient
+
+from benchmarks.servers import FTPStandIn, SFTPStandIn
+from vendor_file_cli.config import load_vendor_configs
+
+
+@pytest.fixture(autouse=True)
+def clear_vendor_configs():
+    load_vendor_configs.cache_clear()
+    yield
+    load_vendor_configs.cache_clear()
+
+
+@pytest.fixture
+def stand_in_sessions(monkeypatch) -> dict[str, Callable]:
+    """
+    Map of client names to functions returning a connected `file_retriever`
+    session. `Client` objects created during a benchmark are connected to the
+    stand-in servers rather than the hosts in their env vars.
+    """
+    sessions: dict[str, Callable] = {}
+
+    def connect_to_server(self, username, password):
+        return sessions[self.name]()
+
+    monkeypatch.setattr(Client, "_Client__connect_to_server", connect_to_server)
+    monkeypatch.setattr(
+        "vendor_file_cli.utils.write_data_to_sheet", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr(
+        "vendor_file_cli.validator.write_data_to_sheet", lambda *args, **kwargs: None
+    )
+    return sessions
+
+
+def _register(monkeypatch, name: str, port: str, src: str, dst: str) -> None:
+    monkeypatch.setenv(f"{name}_HOST", "127.0.0.1")
+    monkeypatch.setenv(f"{name}_PORT", port)
+    monkeypatch.setenv(f"{name}_USER", "bench")
+    monkeypatch.setenv(f"{name}_PASSWORD", "bench")
+    monkeypatch.setenv(f"{name}_SRC", src)
+    monkeypatch.setenv(f"{name}_DST", dst)
+
+
+@pytest.fixture
+def sftp_server(tmp_path) -> Iterator[SFTPStandIn]:
+    with SFTPStandIn(str(tmp_path / "sftp")) as server:
+        yield server
+
+
+@pytest.fixture
+def ftp_server(tmp_path) -> Iterator[FTPStandIn]:
+    root = tmp_path / "ftp"
+    root.mkdir()
+    with FTPStandIn(str(root)) as server:
+        yield server
+
+
+@pytest.fixture
+def nsdrop(monkeypatch, stand_in_sessions, sftp_server) -> SFTPStandIn:
+    """NSDROP stand-in served over SFTP."""
+
+    def session() -> _sftpClient:
+        client = _sftpClient.__new__(_sftpClient)
+        client.connection = sftp_server.connect()
+        return client
+
+    stand_in_sessions["NSDROP"] = session
+    _register(monkeypatch, "NSDROP", "22", "", "")
+    for vendor in ["eastview", "midwest_nypl"]:
+        os.makedirs(
+            os.path.join(sftp_server.root, f"NSDROP/vendor_records/{vendor}"),
+            exist_ok=True,
+        )
+    return sftp_server
+
+
+@pytest.fixture
+def sftp_vendor(monkeypatch, stand_in_sessions, nsdrop) -> SFTPStandIn:
+    """EASTVIEW stand-in served over SFTP from the same server as NSDROP."""
+
+    def session() -> _sftpClient:
+        client = _sftpClient.__new__(_sftpClient)
+        client.connection = nsdrop.connect()
+        return client
+
+    stand_in_sessions["EASTVIEW"] = session
+    _register(
+        monkeypatch, "EASTVIEW", "22", "eastview_src", "NSDROP/vendor_records/eastview"
+    )
+    return nsdrop
+
+
+@pytest.fixture
+def ftp_vendor(monkeypatch, stand_in_sessions, nsdrop, ftp_server) -> FTPStandIn:
+    """MIDWEST_NYPL stand-in served over FTP."""
+
+    def session() -> _ftpClient:
+        ftp = ftplib.FTP()
+        ftp.connect(host=ftp_server.host, port=ftp_server.port)
+        ftp.login(user="bench", passwd="bench")
+        client = _ftpClient.__new__(_ftpClient)
+        client.connection = ftp
+        return client
+
+    stand_in_sessions["MIDWEST_NYPL"] = session
+    _register(
+        monkeypatch,
+        "MIDWEST_NYPL",
+        "21",
+        "midwest_src",
+        "NSDROP/vendor_records/midwest_nypl",
+    )
+    return ftp_server
+
+
+@pytest.fixture
+def distant_sftp_vendor(
+    monkeypatch, stand_in_sessions, tmp_path
+) -> Iterator[SFTPStandIn]:
+    """EASTVIEW stand-in served over SFTP with 20ms of delay each way."""
+    with SFTPStandIn(str(tmp_path / "distant"), delay=0.02) as server:
+
+        def session() -> _sftpClient:
+            client = _sftpClient.__new__(_sftpClient)
+            client.connection = server.connect()
+            return client
+
+        stand_in_sessions["EASTVIEW"] = session
+        _register(monkeypatch, "EASTVIEW", "22", "eastview_src", "")
+        yield server
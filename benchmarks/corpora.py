@@ -0,0 +1,119 @@
+"""Generate synthetic vendor directories and MARC files for benchmarks."""
+
+import os
+import random
+import time
+
+from pymarc import Field, Indicators, Record, Subfield
+
+# The largest corpora take minutes to generate and run. They are only included
+# when BENCH_FULL is set, eg. `BENCH_FULL=1 pytest benchmarks`.
+FULL = os.environ.get("BENCH_FULL") is not None
+FILE_COUNTS = [100, 1_000, 10_000] + ([100_000] if FULL else [])
+RECORD_COUNTS = [1, 100, 1_000] + ([10_000, 50_000] if FULL else [])
+
+
+def synthetic_record(n: int, valid: bool = True) -> Record:
+    """
+    Create a vendor-style MARC record. Records that are not `valid` are missing
+    the 245 and 960 fields and have a malformed 852.
+    """
+    bib = Record()
+    bib.leader = "00454cam a22001575i 4500"
+    bib.add_field(Field(tag="001", data=f"on{1381158740 + n}"))
+    bib.add_field(Field(tag="003", data="OCoLC"))
+    bib.add_field(Field(tag="005", data="20240101000000.0"))
+    bib.add_field(Field(tag="008", data="240101s2024    ru a          000 0 rus d"))
+    bib.add_field(
+        Field(
+            tag="020",
+            indicators=Indicators(" ", " "),
+            subfields=[Subfield("a", f"978{n:010d}")],
+        )
+    )
+    if valid:
+        bib.add_field(
+            Field(
+                tag="245",
+                indicators=Indicators("1", "0"),
+                subfields=[Subfield("a", f"Synthetic title {n} /"), Subfield("c", "")],
+            )
+        )
+    bib.add_field(
+        Field(
+            tag="852",
+            indicators=Indicators("8", " "),
+            subfields=[Subfield("h", f"ReCAP 24-{n:06d}" if valid else "")],
+        )
+    )
+    bib.add_field(
+        Field(
+            tag="901",
+            indicators=Indicators(" ", " "),
+            subfields=[Subfield("a", "EVP"), Subfield("b", "CATRL")],
+        )
+    )
+    bib.add_field(
+        Field(
+            tag="949",
+            indicators=Indicators(" ", "1"),
+            subfields=[
+                Subfield("z", "8528"),
+                Subfield("a", f"ReCAP 24-{n:06d}"),
+                Subfield("i", f"33433{n:09d}"),
+                Subfield("p", "13.20"),
+                Subfield("v", "EVP"),
+                Subfield("h", "43"),
+                Subfield("l", "rc2ma"),
+                Subfield("t", "55"),
+            ],
+        )
+    )
+    if valid:
+        bib.add_field(
+            Field(
+                tag="960",
+                indicators=Indicators(" ", " "),
+                subfields=[Subfield("s", "13.20"), Subfield("t", "MAF")],
+            )
+        )
+    return bib
+
+
+def synthetic_marc_file(record_count: int, invalid_ratio: float = 0.0) -> bytes:
+    """
+    Create the binary MARC21 content for a file of `record_count` records. A
+    fraction of the records (`invalid_ratio`) will fail validation.
+    """
+    rng = random.Random(record_count)
+    return b"".join(
+        synthetic_record(n, valid=rng.random() >= invalid_ratio).as_marc21()
+        for n in range(record_count)
+    )
+
+
+def synthetic_vendor_dir(
+    root: str, file_count: int, file_size: int = 1024, max_age_days: int = 60
+) -> list[str]:
+    """
+    Populate `root` with `file_count` files of `file_size` bytes. File mtimes are
+    spread evenly over the last `max_age_days` days so that timedelta filters
+    select a predictable share of the listing.
+
+    Returns:
+        list of file names written to `root`
+    """
+    os.makedirs(root, exist_ok=True)
+    now = time.time()
+    step = max_age_days * 86400 / max(file_count, 1)
+    payload = b"\x00" * file_size
+    names = []
+    for n in range(file_count):
+        name = f"vendor_file_{n:06d}.mrc"
+        path = os.path.join(root, name)
+        with open(path, "wb") as fh:
+            fh.write(payload)
+        mtime = now - n * step
+        os.utime(path, (mtime, mtime))
+        names.append(name)
+    return names
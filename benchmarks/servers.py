@@ -0,0 +1,266 @@
+"""In-process SFTP and FTP servers used as stand-ins for vendor servers and NSDROP."""
+
+import contextlib
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Any, Optional
+
+import paramiko
+from paramiko.sftp import SFTP_NO_SUCH_FILE, SFTP_OK
+
+
+class _StubServer(paramiko.ServerInterface):
+    """Accept any username/password combination."""
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        return paramiko.OPEN_SUCCEEDED
+
+
+class _StubHandle(paramiko.SFTPHandle):
+    """SFTP file handle backed by a local file with optional per-read latency."""
+
+    def __init__(self, flags: int, latency: float) -> None:
+        super().__init__(flags)
+        self.latency = latency
+
+    def read(self, offset: int, length: int) -> bytes | int:
+        if self.latency:
+            time.sleep(self.latency)
+        return super().read(offset, length)
+
+    def stat(self) -> paramiko.SFTPAttributes | int:
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class _StubSFTPServer(paramiko.SFTPServerInterface):
+    """Serve files from `root` directory over SFTP."""
+
+    root: str = ""
+    latency: float = 0.0
+
+    def _local_path(self, path: str) -> str:
+        return os.path.join(self.root, self.canonicalize(path).lstrip("/"))
+
+    def list_folder(self, path: str) -> list[paramiko.SFTPAttributes] | int:
+        if self.latency:
+            time.sleep(self.latency)
+        local_path = self._local_path(path)
+        if not os.path.isdir(local_path):
+            return SFTP_NO_SUCH_FILE
+        out = []
+        for entry in os.scandir(local_path):
+            attr = paramiko.SFTPAttributes.from_stat(entry.stat())
+            attr.filename = entry.name
+            out.append(attr)
+        return out
+
+    def stat(self, path: str) -> paramiko.SFTPAttributes | int:
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local_path(path)))
+        except OSError:
+            return SFTP_NO_SUCH_FILE
+
+    lstat = stat
+
+    def open(
+        self, path: str, flags: int, attr: paramiko.SFTPAttributes
+    ) -> paramiko.SFTPHandle | int:
+        local_path = self._local_path(path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        try:
+            fd = os.open(local_path, flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        mode = "wb" if flags & (os.O_WRONLY | os.O_RDWR) else "rb"
+        fobj = os.fdopen(fd, mode)
+        handle = _StubHandle(flags, self.latency)
+        handle.filename = local_path
+        handle.readfile = fobj
+        handle.writefile = fobj if mode == "wb" else None
+        return handle
+
+    def remove(self, path: str) -> int:
+        os.remove(self._local_path(path))
+        return SFTP_OK
+
+    def mkdir(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        os.makedirs(self._local_path(path), exist_ok=True)
+        return SFTP_OK
+
+
+class LatencyProxy:
+    """
+    TCP proxy which delays data in each direction by `delay` seconds. Unlike the
+    `latency` of `SFTPStandIn`, which is added while the server handles each
+    request, the delay does not limit how many requests can be in flight, so
+    it behaves like a long-distance link.
+    """
+
+    def __init__(self, target: tuple[str, int], delay: float) -> None:
+        self.target = target
+        self.delay = delay
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.host, self.port = self.sock.getsockname()
+
+    def __enter__(self) -> "LatencyProxy":
+        self.sock.listen(16)
+        threading.Thread(target=self._serve, daemon=True).start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.sock.close()
+
+    def _pipe(self, src: socket.socket, dst: socket.socket) -> None:
+        chunks: queue.Queue = queue.Queue()
+
+        def deliver() -> None:
+            while (item := chunks.get()) is not None:
+                due, data = item
+                time.sleep(max(0.0, due - time.monotonic()))
+                try:
+                    dst.sendall(data)
+                except OSError:
+                    return
+            with contextlib.suppress(OSError):
+                dst.shutdown(socket.SHUT_WR)
+
+        threading.Thread(target=deliver, daemon=True).start()
+        while True:
+            try:
+                data = src.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                chunks.put(None)
+                return
+            chunks.put((time.monotonic() + self.delay, data))
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(self.target)
+            for src, dst in ((conn, upstream), (upstream, conn)):
+                threading.Thread(
+                    target=self._pipe, args=(src, dst), daemon=True
+                ).start()
+
+
+class SFTPStandIn:
+    """
+    Local SFTP server serving the contents of `root`. Each accepted connection
+    is handled on its own daemon thread. `latency` (in seconds) is added to
+    every read, stat and directory listing to simulate a slow host. `delay` (in
+    seconds) is added to the link between clients and the server in each
+    direction to simulate a distant host. If `compression` is True the server
+    offers zlib compression.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        latency: float = 0.0,
+        delay: float = 0.0,
+        compression: bool = False,
+    ) -> None:
+        self.root = root
+        self.latency = latency
+        self.compression = compression
+        self.proxy: Optional[LatencyProxy] = None
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.host, self.port = self.sock.getsockname()
+        self._transports: list[paramiko.Transport] = []
+        self._thread: Optional[threading.Thread] = None
+        if delay:
+            self.proxy = LatencyProxy((self.host, self.port), delay)
+
+    def __enter__(self) -> "SFTPStandIn":
+        self.sock.listen(16)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        if self.proxy is not None:
+            self.proxy.__enter__()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self.proxy is not None:
+            self.proxy.__exit__()
+        for transport in self._transports:
+            transport.close()
+        self.sock.close()
+
+    def _serve(self) -> None:
+        server_cls = type(
+            "BoundSFTPServer",
+            (_StubSFTPServer,),
+            {"root": self.root, "latency": self.latency},
+        )
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.use_compression(self.compression)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer, server_cls)
+            transport.start_server(server=_StubServer())
+            self._transports.append(transport)
+
+    def connect(self) -> paramiko.SFTPClient:
+        """Open an SFTP client session against the stand-in server."""
+        address = (self.host, self.port)
+        if self.proxy is not None:
+            address = (self.proxy.host, self.proxy.port)
+        transport = paramiko.Transport(address)
+        transport.connect(username="bench", password="bench")
+        sftp = paramiko.SFTPClient.from_transport(transport)
+        assert sftp is not None
+        return sftp
+
+
+class FTPStandIn:
+    """Local FTP server serving the contents of `root` using pyftpdlib."""
+
+    def __init__(self, root: str) -> None:
+        from pyftpdlib.authorizers import DummyAuthorizer  # type: ignore
+        from pyftpdlib.handlers import FTPHandler  # type: ignore
+        from pyftpdlib.servers import ThreadedFTPServer  # type: ignore
+
+        self.root = root
+        logging.getLogger("pyftpdlib").setLevel(logging.WARNING)
+        authorizer = DummyAuthorizer()
+        authorizer.add_user("bench", "bench", root, perm="elradfmwMT")
+        handler = type("BenchFTPHandler", (FTPHandler,), {"authorizer": authorizer})
+        self.server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+        self.host, self.port = self.server.address
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "FTPStandIn":
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={"timeout": 0.1}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.server.close_all()
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import shutil
+from collections import Counter
+from typing import Optional
+
+import pytest
+
+from benchmarks.corpora import synthetic_vendor_dir
+from vendor_file_cli import commands
+from vendor_file_cli.sharding import Shard
+
+pytestmark = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="workers inherit the stand-in sessions through fork",
+)
+
+
+def _worker(shard: Shard, lease_dir: Optional[str], copied: multiprocessing.Queue):
+    names = []
+    get_single_file = commands.get_single_file
+
+    def record(**kwargs):
+        names.append(kwargs["file"].file_name)
+        return get_single_file(**kwargs)
+
+    commands.get_single_file = record
+    commands.get_vendor_files(
+        vendors=["eastview"], days=30, shard=shard, lease_dir=lease_dir
+    )
+    copied.put(names)
+
+
+def run_workers(shards: list[Shard], lease_dir: Optional[str]) -> Counter:
+    """Run one process per shard and count how many times each file was copied."""
+    ctx = multiprocessing.get_context("fork")
+    copied = ctx.Queue()
+    workers = [
+        ctx.Process(target=_worker, args=(shard, lease_dir, copied)) for shard in shards
+    ]
+    for worker in workers:
+        worker.start()
+    counts: Counter = Counter()
+    for _ in workers:
+        counts.update(copied.get(timeout=300))
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    return counts
+
+
+@pytest.fixture
+def sharded_vendor(monkeypatch, sftp_vendor):
+    monkeypatch.setenv("EASTVIEW_SHARD_BY_FILE", "true")
+    monkeypatch.setattr(
+        "vendor_file_cli.validator.validate_file", lambda *args, **kwargs: None
+    )
+    names = synthetic_vendor_dir(os.path.join(sftp_vendor.root, "eastview_src"), 200)
+    return sftp_vendor, names[:100]
+
+
+def _clear_nsdrop(root: str) -> None:
+    dst = os.path.join(root, "NSDROP/vendor_records/eastview")
+    shutil.rmtree(dst)
+    os.makedirs(dst)
+
+
+@pytest.mark.parametrize("leases", ["local", "nsdrop"])
+@pytest.mark.parametrize("worker_count", [1, 2, 4])
+def test_bench_sharded_run(benchmark, tmp_path, sharded_vendor, worker_count, leases):
+    server, expected = sharded_vendor
+    lease_dir = str(tmp_path / "leases") if leases == "local" else None
+    shards = [Shard(i, worker_count) for i in range(1, worker_count + 1)]
+    counts = benchmark.pedantic(
+        run_workers,
+        args=(shards, lease_dir),
+        setup=lambda: _clear_nsdrop(server.root),
+        rounds=3,
+    )
+    assert sorted(counts) == sorted(expected)
+    assert set(counts.values()) == {1}
+    assert sorted(
+        os.listdir(os.path.join(server.root, "NSDROP/vendor_records/eastview"))
+    ) == sorted(expected)
+
+
+@pytest.mark.parametrize("worker_count", [2, 4])
+def test_bench_overlapping_workers(benchmark, tmp_path, sharded_vendor, worker_count):
+    """Workers that were all given the same shard only copy each file once."""
+    server, expected = sharded_vendor
+    counts = benchmark.pedantic(
+        run_workers,
+        args=([Shard(1, 1)] * worker_count, str(tmp_path / "leases")),
+        setup=lambda: _clear_nsdrop(server.root),
+        rounds=3,
+    )
+    assert sorted(counts) == sorted(expected)
+    assert set(counts.values()) == {1}
+    assert os.listdir(tmp_path / "leases") == []
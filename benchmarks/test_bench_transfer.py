@@ -0,0 +1,140 @@
+import datetime
+import functools
+import os
+
+import pytest
+
+from benchmarks.corpora import FILE_COUNTS, synthetic_marc_file, synthetic_vendor_dir
+from vendor_file_cli.commands import get_vendor_files, validate_files
+from vendor_file_cli.utils import connect, fetch_file
+from vendor_file_cli.validator import get_single_file, get_vendor_file_list
+
+
+@pytest.mark.parametrize("file_count", FILE_COUNTS)
+def test_bench_get_vendor_file_list_sftp(benchmark, sftp_vendor, file_count):
+    synthetic_vendor_dir(os.path.join(sftp_vendor.root, "eastview_src"), file_count)
+    with connect("nsdrop") as nsdrop_client, connect("eastview") as vendor_client:
+        files = benchmark(
+            get_vendor_file_list,
+            vendor="eastview",
+            timedelta=datetime.timedelta(days=30),
+            nsdrop_client=nsdrop_client,
+            vendor_client=vendor_client,
+        )
+    assert 0 < len(files) <= file_count
+
+
+@pytest.mark.parametrize("file_count", FILE_COUNTS)
+def test_bench_get_vendor_file_list_ftp(benchmark, ftp_vendor, file_count):
+    synthetic_vendor_dir(os.path.join(ftp_vendor.root, "midwest_src"), file_count)
+    with connect("nsdrop") as nsdrop_client, connect("midwest_nypl") as vendor_client:
+        files = benchmark(
+            get_vendor_file_list,
+            vendor="midwest_nypl",
+            timedelta=datetime.timedelta(days=30),
+            nsdrop_client=nsdrop_client,
+            vendor_client=vendor_client,
+        )
+    assert 0 < len(files) <= file_count
+
+
+@pytest.mark.parametrize("vendor", ["eastview", "midwest_nypl"])
+@pytest.mark.parametrize("record_count", [1, 1_000])
+def test_bench_get_single_file(
+    benchmark, sftp_vendor, ftp_vendor, vendor, record_count
+):
+    content = synthetic_marc_file(record_count, invalid_ratio=0.1)
+    if vendor == "eastview":
+        src = os.path.join(sftp_vendor.root, "eastview_src")
+    else:
+        src = os.path.join(ftp_vendor.root, "midwest_src")
+    os.makedirs(src, exist_ok=True)
+    with open(os.path.join(src, "bench.mrc"), "wb") as fh:
+        fh.write(content)
+    with connect("nsdrop") as nsdrop_client, connect(vendor) as vendor_client:
+        file_info = vendor_client.get_file_info(
+            file_name="bench.mrc", remote_dir=os.environ[f"{vendor.upper()}_SRC"]
+        )
+        fetched = benchmark(
+            get_single_file,
+            vendor=vendor,
+            file=file_info,
+            vendor_client=vendor_client,
+            nsdrop_client=nsdrop_client,
+            test=True,
+        )
+    assert fetched.file_stream.getvalue() == content
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_bench_get_vendor_files_workers(benchmark, monkeypatch, sftp_vendor, workers):
+    monkeypatch.setenv("EASTVIEW_MAX_SESSIONS", "4")
+    monkeypatch.setattr(
+        "vendor_file_cli.validator.validate_file", lambda *args, **kwargs: None
+    )
+    src = os.path.join(sftp_vendor.root, "eastview_src")
+    os.makedirs(src, exist_ok=True)
+    for n, size in enumerate([64, 16, 8, 4, 2, 1, 1, 1]):
+        with open(os.path.join(src, f"bench_{n}.mrc"), "wb") as fh:
+            fh.write(b"\x00" * size * 1024 * 1024)
+    dst = os.path.join(sftp_vendor.root, "NSDROP/vendor_records/eastview")
+
+    def clear_dst():
+        for name in os.listdir(dst):
+            os.remove(os.path.join(dst, name))
+
+    benchmark.pedantic(
+        get_vendor_files,
+        kwargs={"vendors": ["eastview"], "days": 30, "workers": workers},
+        setup=clear_dst,
+        rounds=3,
+    )
+    assert len(os.listdir(dst)) == 8
+
+
+@pytest.mark.parametrize("tuned", [False, True])
+def test_bench_fetch_file_high_latency(
+    benchmark, monkeypatch, distant_sftp_vendor, tuned
+):
+    content = os.urandom(4 * 1024 * 1024)
+    src = os.path.join(distant_sftp_vendor.root, "eastview_src")
+    os.makedirs(src, exist_ok=True)
+    with open(os.path.join(src, "bench.mrc"), "wb") as fh:
+        fh.write(content)
+    if not tuned:
+        monkeypatch.setattr(
+            "vendor_file_cli.utils.tune_session", lambda *args, **kwargs: None
+        )
+    with connect("eastview") as vendor_client:
+        file_info = vendor_client.get_file_info(
+            file_name="bench.mrc", remote_dir="eastview_src"
+        )
+        if tuned:
+            fetch = functools.partial(fetch_file, vendor_client)
+        else:
+            fetch = vendor_client.get_file
+        fetched = benchmark.pedantic(
+            fetch, kwargs={"file": file_info, "remote_dir": "eastview_src"}, rounds=3
+        )
+    assert fetched.file_stream.getvalue() == content
+
+
+def test_bench_validate_files_named(benchmark, monkeypatch, sftp_vendor):
+    validated = []
+    monkeypatch.setattr(
+        "vendor_file_cli.commands.validate_file",
+        lambda file_obj, **kwargs: validated.append(file_obj.file_name),
+    )
+    dst = os.path.join(sftp_vendor.root, "NSDROP/vendor_records/eastview")
+    content = synthetic_marc_file(1)
+    for n in range(1_000):
+        with open(os.path.join(dst, f"bench_{n}.mrc"), "wb") as fh:
+            fh.write(content)
+    names = [f"bench_{n}.mrc" for n in range(0, 1_000, 5)]
+    benchmark.pedantic(
+        validate_files,
+        kwargs={"vendor": "eastview", "files": names, "test": True},
+        setup=validated.clear,
+        rounds=3,
+    )
+    assert sorted(validated) == sorted(names)
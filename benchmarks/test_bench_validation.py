@@ -0,0 +1,57 @@
+import io
+
+import pytest
+from file_retriever import File, FileInfo
+
+from benchmarks.corpora import RECORD_COUNTS, synthetic_marc_file
+from vendor_file_cli import utils
+from vendor_file_cli.validator import validate_file
+
+
+class _StubSheet:
+    def spreadsheets(self, *args, **kwargs):
+        return self
+
+    def values(self, *args, **kwargs):
+        return self
+
+    def append(self, *args, **kwargs):
+        return self
+
+    def execute(self, *args, **kwargs):
+        return {}
+
+
+def _marc_file(record_count: int, invalid_ratio: float) -> File:
+    content = synthetic_marc_file(record_count, invalid_ratio=invalid_ratio)
+    info = FileInfo("bench.mrc", 1700000000, 33188, len(content), 0, 0, None)
+    return File.from_fileinfo(info, io.BytesIO(content))
+
+
+@pytest.fixture
+def stub_sheet(monkeypatch):
+    monkeypatch.setattr(utils, "configure_sheet", lambda: None)
+    monkeypatch.setattr(utils, "build", lambda *args, **kwargs: _StubSheet())
+
+
+@pytest.mark.parametrize("invalid_ratio", [0.0, 0.5])
+@pytest.mark.parametrize("record_count", RECORD_COUNTS)
+def test_bench_validate_file(benchmark, stub_sheet, record_count, invalid_ratio):
+    file_obj = _marc_file(record_count, invalid_ratio)
+    out = benchmark(validate_file, file_obj=file_obj, vendor="eastview", test=True)
+    assert out["record_count"] == record_count
+
+
+@pytest.mark.parametrize("record_count", RECORD_COUNTS)
+def test_bench_write_data_to_sheet(benchmark, stub_sheet, record_count):
+    batches = []
+    validate_file(
+        _marc_file(record_count, 0.5),
+        vendor="eastview",
+        test=True,
+        batch_size=record_count,
+        sink=lambda values, test: batches.append(values),
+    )
+    values = batches[0]
+    result = benchmark(utils.write_data_to_sheet, values=values, test=True)
+    assert result == {}
@@ -1,13 +1,18 @@
+import contextlib
 import datetime
 import ftplib
 import io
 import os
+import socket
 
 import pytest
 from click.testing import CliRunner
 from file_retriever import Client, File, FileInfo
 from pydantic_core import InitErrorDetails, ValidationError
-from pymarc import Field, Indicators, Record, Subfield
+from pymarc import Field, Indicators, Record, Subfield, record_to_xml
+
+from vendor_file_cli.config import load_vendor_configs
+from vendor_file_cli.memo import get_validation_memo
 
 
 @pytest.fixture(autouse=True)
@@ -15,6 +20,26 @@ def set_caplog_level(caplog):
     caplog.set_level("DEBUG")
 
 
+@pytest.fixture(autouse=True)
+def clear_vendor_configs():
+    load_vendor_configs.cache_clear()
+    yield
+    load_vendor_configs.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_validation_memo():
+    get_validation_memo.cache_clear()
+    yield
+    get_validation_memo.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def state_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("VENDOR_FILE_CLI_STATE_DIR", str(tmp_path / "state"))
+    return tmp_path / "state"
+
+
 class StubFileInfo(FileInfo):
     def __init__(self, file_name: str | None = None):
         today = datetime.datetime.now(tz=datetime.timezone.utc)
@@ -43,6 +68,17 @@ def stub_record() -> Record:
     return stub_marc()
 
 
+@pytest.fixture
+def stub_marcxml(stub_record) -> bytes:
+    records = record_to_xml(stub_record, namespace=True) * 2
+    return (
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<collection xmlns="http://www.loc.gov/MARC21/slim">'
+        + records
+        + b"</collection>"
+    )
+
+
 @pytest.fixture
 def stub_file_info() -> FileInfo:
     return StubFileInfo(file_name="foo.mrc")
@@ -126,6 +162,7 @@ def stub_client(monkeypatch, mock_sheet_config):
     monkeypatch.setattr(Client, "_Client__connect_to_server", mock_connect_to_server)
     monkeypatch.setattr(Client, "check_file", lambda *args, **kwargs: False)
     monkeypatch.setattr("vendor_file_cli.validator.write_data_to_sheet", stub_response)
+    monkeypatch.setattr("vendor_file_cli.pipeline.write_data_to_sheet", stub_response)
     monkeypatch.setattr(os.path, "isfile", lambda *args, **kwargs: True)
 
     def stub_client_response(name):
@@ -185,6 +222,17 @@ def unset_env_var(monkeypatch, mock_vendor_creds) -> None:
             monkeypatch.delenv(var, raising=False)
 
 
+@pytest.fixture
+def stub_socket(monkeypatch):
+    def stub_getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))]
+
+    monkeypatch.setattr("socket.getaddrinfo", stub_getaddrinfo)
+    monkeypatch.setattr(
+        "socket.create_connection", lambda *args, **kwargs: contextlib.nullcontext()
+    )
+
+
 @pytest.fixture
 def cli_runner(monkeypatch, stub_client) -> CliRunner:
     runner = CliRunner()
@@ -234,6 +282,18 @@ def mock_sheet_config(monkeypatch, mock_open_file):
     monkeypatch.setenv("GOOGLE_SHEET_CLIENT_SECRET", "qux")
 
 
+@pytest.fixture
+def sheet_rows(monkeypatch) -> dict:
+    rows: dict = {}
+
+    def collect_rows(values, test):
+        for k, v in values.items():
+            rows.setdefault(k, []).extend(v)
+
+    monkeypatch.setattr("vendor_file_cli.validator.write_data_to_sheet", collect_rows)
+    return rows
+
+
 @pytest.fixture
 def mock_sheet_config_expired_creds(monkeypatch, mock_sheet_config):
     monkeypatch.setattr(MockCreds, "valid", False)
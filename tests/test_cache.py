@@ -0,0 +1,156 @@
+import io
+import os
+import threading
+
+import pytest
+from file_retriever import File, FileInfo
+
+from vendor_file_cli.cache import ContentCache, MappedStream
+from vendor_file_cli.utils import file_lock, read_marc_stream
+
+
+def stub_info(
+    content: bytes, mtime: int = 1700000000, name: str = "foo.mrc"
+) -> FileInfo:
+    return FileInfo(name, mtime, 33188, len(content), 0, 0, None)
+
+
+def stub_file(content: bytes, mtime: int = 1700000000, name: str = "foo.mrc") -> File:
+    return File.from_fileinfo(stub_info(content, mtime, name), io.BytesIO(content))
+
+
+@pytest.fixture
+def cache(tmp_path) -> ContentCache:
+    clock = iter(range(1000))
+    return ContentCache(
+        str(tmp_path / "cache"), max_bytes=10, clock=lambda: next(clock)
+    )
+
+
+def test_mapped_stream(tmp_path):
+    path = tmp_path / "foo.mrc"
+    path.write_bytes(b"0123456789")
+    stream = MappedStream(str(path))
+    assert stream.read(4) == b"0123"
+    buffer = bytearray(3)
+    assert stream.readinto(buffer) == 3
+    assert buffer == b"456"
+    assert stream.tell() == 7
+    assert stream.read() == b"789"
+    assert stream.seek(-2, io.SEEK_END) == 8
+    assert stream.read(10) == b"89"
+    assert stream.getvalue() == b"0123456789"
+    assert bytes(stream.getbuffer()[2:4]) == b"23"
+    assert stream.seekable()
+    stream.close()
+    assert stream.closed
+
+
+def test_mapped_stream_marc(tmp_path, stub_record):
+    path = tmp_path / "foo.mrc"
+    path.write_bytes(stub_record.as_marc21() * 2)
+    records = list(read_marc_stream(MappedStream(str(path))))
+    assert [i["001"].data for i in records] == ["on1381158740", "on1381158740"]
+
+
+def test_content_cache_get_put(cache):
+    file = stub_file(b"foo")
+    assert cache.get("NSDROP/foo", stub_info(b"foo")) is None
+    cache.put("NSDROP/foo", file)
+    assert file.file_stream.tell() == 0
+    cached = cache.get("NSDROP/foo", stub_info(b"foo"))
+    assert isinstance(cached.file_stream, MappedStream)
+    assert cached.file_stream.read() == b"foo"
+    assert cached.file_name == "foo.mrc"
+    assert cache.get("NSDROP/bar", stub_info(b"foo")) is None
+
+
+def test_content_cache_changed(cache, caplog):
+    cache.put("NSDROP/foo", stub_file(b"foo"))
+    assert cache.get("NSDROP/foo", stub_info(b"foo", mtime=1700000001)) is None
+    assert cache.get("NSDROP/foo", stub_info(b"fooo")) is None
+    assert "Cached copy of NSDROP/foo/foo.mrc is out of date" in caplog.text
+
+
+def test_content_cache_nsdrop_info(cache):
+    file = stub_file(b"foo")
+    written = FileInfo("foo.mrc", 1800000000, 33188, 3, 0, 0, None)
+    cache.put("NSDROP/foo", file, written)
+    assert cache.get("NSDROP/foo", stub_info(b"foo")) is None
+    assert cache.get("NSDROP/foo", written).file_stream.read() == b"foo"
+
+
+def test_content_cache_evict(cache, caplog):
+    cache.put("NSDROP", stub_file(b"aaaa", name="a.mrc"))
+    cache.put("NSDROP", stub_file(b"bbbb", name="b.mrc"))
+    assert cache.get("NSDROP", stub_info(b"aaaa", name="a.mrc")) is not None
+    cache.put("NSDROP", stub_file(b"cccc", name="c.mrc"))
+    assert "Evicted NSDROP/b.mrc from content cache" in caplog.text
+    assert cache.get("NSDROP", stub_info(b"bbbb", name="b.mrc")) is None
+    assert cache.get("NSDROP", stub_info(b"aaaa", name="a.mrc")) is not None
+    assert cache.get("NSDROP", stub_info(b"cccc", name="c.mrc")) is not None
+    assert len(os.listdir(cache.directory)) == 4
+
+
+def test_content_cache_evict_in_use(cache, monkeypatch, caplog):
+    cache.put("NSDROP", stub_file(b"aaaa", name="a.mrc"))
+    cache.put("NSDROP", stub_file(b"bbbb", name="b.mrc"))
+
+    def locked(path):
+        raise PermissionError("file is in use")
+
+    monkeypatch.setattr(os, "remove", locked)
+    cache.put("NSDROP", stub_file(b"cccc", name="c.mrc"))
+    assert "Unable to remove NSDROP/a.mrc from content cache" in caplog.text
+    assert cache.get("NSDROP", stub_info(b"aaaa", name="a.mrc")) is None
+    assert cache.get("NSDROP", stub_info(b"cccc", name="c.mrc")) is not None
+
+
+@pytest.mark.parametrize("content", [b"", b"01234567890"])
+def test_content_cache_not_cached(cache, content):
+    cache.put("NSDROP", stub_file(content))
+    assert cache.get("NSDROP", stub_info(content)) is None
+
+
+def test_content_cache_size_mismatch(cache):
+    file = stub_file(b"foo")
+    cache.put("NSDROP", file, FileInfo("foo.mrc", 1700000000, 33188, 4, 0, 0, None))
+    assert (
+        cache.get("NSDROP", FileInfo("foo.mrc", 1700000000, 33188, 4, 0, 0, None))
+        is None
+    )
+
+
+def test_content_cache_disabled(monkeypatch, state_dir):
+    monkeypatch.setenv("VENDOR_FILE_CLI_CACHE_SIZE", "0")
+    cache = ContentCache()
+    file = stub_file(b"foo")
+    cache.put("NSDROP", file)
+    assert cache.get("NSDROP", stub_info(b"foo")) is None
+    assert not os.path.exists(state_dir / "cache")
+
+
+def test_content_cache_shared(tmp_path):
+    file = stub_file(b"foo")
+    ContentCache(str(tmp_path)).put("NSDROP", file)
+    cached = ContentCache(str(tmp_path)).get("NSDROP", stub_info(b"foo"))
+    assert cached.file_stream.read() == b"foo"
+
+
+def test_content_cache_shared_index(tmp_path):
+    first = ContentCache(str(tmp_path / "cache"), max_bytes=10)
+    second = ContentCache(str(tmp_path / "cache"), max_bytes=10)
+    first.put("NSDROP/leila", stub_file(b"foo"))
+    added = threading.Event()
+
+    def put():
+        second.put("NSDROP/leila", stub_file(b"bar", name="bar.mrc"))
+        added.set()
+
+    with file_lock(first.lock_path):
+        thread = threading.Thread(target=put)
+        thread.start()
+        assert not added.wait(0.1)
+    thread.join(5)
+    assert first.get("NSDROP/leila", stub_info(b"foo")) is not None
+    assert first.get("NSDROP/leila", stub_info(b"bar", name="bar.mrc")) is not None
@@ -1,9 +1,12 @@
+import json
 import os
+import socket
 
 import pytest
 from click.testing import CliRunner
 
 from vendor_file_cli import main, vendor_file_cli
+from vendor_file_cli.journal import RunJournal
 
 
 def test_main(mocker):
@@ -19,6 +22,35 @@ def test_vendor_file_cli():
     assert runner.get_default_prog_name(vendor_file_cli) == "vendor-file-cli"
 
 
+def test_vendor_file_cli_logging_options(cli_runner, mocker):
+    mock_configure = mocker.patch("vendor_file_cli.configure_logging")
+    result = cli_runner.invoke(
+        cli=vendor_file_cli,
+        args=[
+            "--log-format",
+            "json",
+            "--log-level",
+            "info",
+            "--log-level",
+            "file_retriever=WARNING",
+            "available-vendors",
+        ],
+    )
+    assert result.exit_code == 0
+    mock_configure.assert_called_once_with(
+        log_format="json",
+        levels={"file_retriever": "WARNING", "vendor_file_cli": "INFO"},
+    )
+
+
+def test_vendor_file_cli_invalid_log_level(cli_runner):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["--log-level", "foo", "available-vendors"]
+    )
+    assert result.exit_code == 2
+    assert "Invalid log level: FOO" in result.output
+
+
 def test_vendor_file_cli_get_all_vendor_files(cli_runner, caplog):
     result = cli_runner.invoke(cli=vendor_file_cli, args=["all-vendor-files"])
     assert result.exit_code == 0
@@ -50,6 +82,115 @@ def test_vendor_file_cli_get_all_vendor_files_test(cli_runner, caplog):
     assert "Running in test mode" in caplog.text
 
 
+def test_vendor_file_cli_get_all_vendor_files_pipeline(cli_runner, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["all-vendor-files", "--pipeline"]
+    )
+    assert result.exit_code == 0
+    assert "(EASTVIEW) Client session closed" in caplog.text
+    assert "(NSDROP) Validating EASTVIEW file: foo.mrc" in caplog.text
+
+
+def test_vendor_file_cli_get_all_vendor_files_shard(cli_runner, tmp_path, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli,
+        args=["all-vendor-files", "--shard", "2/2", "--lease-dir", str(tmp_path)],
+    )
+    assert result.exit_code == 0
+    assert "Running shard 2/2" in caplog.text
+
+
+def test_vendor_file_cli_get_recent_vendor_files_workers(cli_runner, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["vendor-files", "-v", "all", "-w", "3"]
+    )
+    assert result.exit_code == 0
+    assert "on 3 worker(s). Predicted makespan: " in caplog.text
+
+
+def test_vendor_file_cli_get_recent_vendor_files_deadline(cli_runner, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["vendor-files", "-v", "leila", "--deadline", "5"]
+    )
+    assert result.exit_code == 0
+    assert "Run deadline exceeded" not in caplog.text
+
+
+def test_vendor_file_cli_get_recent_vendor_files_dedupe(cli_runner, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["vendor-files", "-v", "leila", "--dedupe", "skip"]
+    )
+    assert result.exit_code == 0
+    assert "(NSDROP) Writing foo.mrc to `NSDROP/vendor_records/leila`" in caplog.text
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["vendor-files", "-v", "leila", "--dedupe", "foo"]
+    )
+    assert result.exit_code == 2
+
+
+def test_vendor_file_cli_get_recent_vendor_files_resume(cli_runner, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["vendor-files", "-v", "leila", "--resume"]
+    )
+    assert result.exit_code == 0
+    assert "No interrupted run to resume. Starting a new run." in caplog.text
+
+
+def test_vendor_file_cli_get_recent_vendor_files_unfinished(cli_runner, caplog):
+    with RunJournal({"vendors": ["LEILA"], "days": 0, "hours": 0, "shard": None}):
+        pass
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["vendor-files", "-v", "leila"]
+    )
+    assert result.exit_code == 0
+    assert "The previous run with the same options did not finish." in caplog.text
+
+
+@pytest.mark.parametrize("shard", ["foo", "3/2"])
+def test_vendor_file_cli_get_all_vendor_files_invalid_shard(cli_runner, shard):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["all-vendor-files", "--shard", shard]
+    )
+    assert result.exit_code == 2
+    assert "Invalid shard" in result.output
+
+
+def test_vendor_file_cli_check_connections(cli_runner, stub_socket):
+    result = cli_runner.invoke(cli=vendor_file_cli, args=["check-connections"])
+    assert result.exit_code == 0
+    assert result.stdout.splitlines()[0].split() == [
+        "SERVER",
+        "HOST",
+        "DNS",
+        "TCP",
+        "HANDSHAKE",
+        "LISTING",
+        "FILES",
+        "ERROR",
+    ]
+    assert "ftp.eastview.com:22" in result.stdout
+
+
+def test_vendor_file_cli_check_connections_json(cli_runner, monkeypatch):
+    def stub_getaddrinfo(*args, **kwargs):
+        raise socket.gaierror("Name or service not known")
+
+    monkeypatch.setattr("socket.getaddrinfo", stub_getaddrinfo)
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["check-connections", "--json"]
+    )
+    assert result.exit_code == 1
+    checks = json.loads(result.stdout)
+    assert [i["name"] for i in checks] == [
+        "NSDROP",
+        "EASTVIEW",
+        "LEILA",
+        "MIDWEST_NYPL",
+        "BAKERTAYLOR_BPL",
+    ]
+    assert checks[0]["error"] == "dns: gaierror: Name or service not known"
+
+
 def test_vendor_file_cli_get_available_vendors(cli_runner):
     result = cli_runner.invoke(cli=vendor_file_cli, args=["available-vendors"])
     assert result.exit_code == 0
@@ -86,11 +227,20 @@ def test_vendor_file_cli_get_recent_vendor_files_multiple_vendors(cli_runner, ca
 def test_vendor_file_cli_validate_vendor_files(cli_runner, caplog):
     result = cli_runner.invoke(
         cli=vendor_file_cli,
-        args=["validate-file", "-v", "eastview", "-f", "foo.mrc"],
+        args=["validate-file", "-v", "eastview", "-f", "bar.mrc"],
     )
     assert result.exit_code == 0
     assert "(NSDROP) Connecting to " in caplog.text
-    assert "(NSDROP) Validating eastview file: foo.mrc" in caplog.text
+    assert "(NSDROP) Validating eastview file: bar.mrc" in caplog.text
+
+
+def test_vendor_file_cli_validate_vendor_files_multiple(cli_runner, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli,
+        args=["validate-file", "-v", "eastview", "-f", "bar.mrc", "-f", "*.mrc"],
+    )
+    assert result.exit_code == 0
+    assert caplog.text.count("(NSDROP) Validating eastview file: bar.mrc") == 1
 
 
 def test_vendor_file_cli_validate_vendor_files_invalid_vendor(cli_runner, caplog):
@@ -105,13 +255,30 @@ def test_vendor_file_cli_validate_vendor_files_invalid_vendor(cli_runner, caplog
     )
 
 
+def test_vendor_file_cli_validate_vendor_files_not_validated(cli_runner, caplog):
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["validate-file", "-v", "midwest_nypl", "-f", "foo"]
+    )
+    assert result.exit_code == 0
+    assert "Vendor not supported for validation." in result.stdout
+
+
 def test_vendor_file_cli_validate_vendor_files_test(cli_runner, caplog):
     result = cli_runner.invoke(
         cli=vendor_file_cli,
-        args=["validate-file", "-v", "eastview", "-f", "foo.mrc", "--test"],
+        args=["validate-file", "-v", "eastview", "-f", "bar.mrc", "--test"],
     )
     assert result.exit_code == 0
     assert "(NSDROP) Connecting to " in caplog.text
-    assert "(NSDROP) Validating eastview file: foo.mrc" in caplog.text
+    assert "(NSDROP) Validating eastview file: bar.mrc" in caplog.text
     assert result.exit_code == 0
     assert "Running in test mode" in caplog.text
+
+
+def test_vendor_file_cli_serve(cli_runner, mocker):
+    mock_run = mocker.patch("vendor_file_cli.FetchDaemon.run")
+    result = cli_runner.invoke(
+        cli=vendor_file_cli, args=["serve", "-v", "leila", "-i", "5", "--test"]
+    )
+    assert result.exit_code == 0
+    mock_run.assert_called_once()
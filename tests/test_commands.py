@@ -1,4 +1,12 @@
+import json
+import os
+import threading
+
+from file_retriever import Client, FileInfo
+
 from vendor_file_cli.commands import get_vendor_files, validate_files
+from vendor_file_cli.journal import RunJournal, journal_name
+from vendor_file_cli.sharding import LocalLeaseStore, Shard
 
 
 def test_get_vendor_files(stub_client, caplog):
@@ -12,6 +20,111 @@ def test_get_vendor_files(stub_client, caplog):
     assert "(NSDROP) Client session closed" in caplog.text
 
 
+def test_get_vendor_files_no_deadline(stub_client, monkeypatch, caplog):
+    def stub_deadline(*args, **kwargs):
+        raise AssertionError("Deadline should only be built with a budget")
+
+    monkeypatch.setattr("vendor_file_cli.commands.Deadline", stub_deadline)
+    get_vendor_files(vendors=["leila"], days=300)
+    assert "(NSDROP) 1 file(s) copied to `NSDROP/vendor_records/leila`" in caplog.text
+
+
+def test_get_vendor_files_pipeline(stub_client, caplog):
+    get_vendor_files(vendors=["leila", "eastview"], days=300, pipeline=True)
+    assert "(LEILA) 1 file(s) on LEILA server to copy to NSDROP" in caplog.text
+    assert "(NSDROP) Validating leila file: foo.mrc" in caplog.text
+    assert "(NSDROP) Validating eastview file: foo.mrc" in caplog.text
+    assert (
+        "(NSDROP) 1 file(s) copied to `NSDROP/vendor_records/eastview`" in caplog.text
+    )
+    assert "Unable to validate" not in caplog.text
+
+
+def test_get_vendor_files_workers(stub_client, caplog):
+    get_vendor_files(vendors=["leila", "eastview"], days=300, workers=2)
+    assert "(LEILA) 1 file(s) on LEILA server to copy to NSDROP" in caplog.text
+    assert "Copying 2 file(s) on 2 worker(s). Predicted makespan: " in caplog.text
+    assert "(NSDROP) Writing foo.mrc to `NSDROP/vendor_records/leila`" in caplog.text
+    assert (
+        "(NSDROP) 1 file(s) copied to `NSDROP/vendor_records/eastview`" in caplog.text
+    )
+    assert "Copied 2 file(s) in " in caplog.text
+
+
+def test_get_vendor_files_dedupe(stub_client, state_dir, caplog):
+    get_vendor_files(vendors=["leila", "eastview"], days=300, dedupe="skip")
+    assert "(NSDROP) 1 file(s) copied to `NSDROP/vendor_records/leila`" in caplog.text
+    assert "copied to `NSDROP/vendor_records/eastview`" not in caplog.text
+    params = {"vendors": ["LEILA", "EASTVIEW"], "days": 300, "hours": 0, "shard": None}
+    with open(state_dir / journal_name(params), "r") as fh:
+        copied = [i for i in fh if '"copied"' in i]
+    assert len(copied) == 1 and '"LEILA"' in copied[0]
+
+
+def test_get_vendor_files_shard(stub_client, tmp_path, caplog):
+    vendors = ["leila", "eastview", "midwest_nypl"]
+    for index in (1, 2):
+        get_vendor_files(
+            vendors=vendors,
+            days=300,
+            shard=Shard(index, 2),
+            lease_dir=str(tmp_path / "leases"),
+        )
+    assert "Running shard 1/2" in caplog.text
+    assert "Running shard 2/2" in caplog.text
+    for vendor in ["LEILA", "EASTVIEW", "MIDWEST_NYPL"]:
+        assert caplog.text.count(f"({vendor}) 1 file(s) on {vendor} server") == 1
+    assert list((tmp_path / "leases").iterdir()) == []
+
+
+def test_get_vendor_files_shard_leased(stub_client, tmp_path, caplog):
+    leases = LocalLeaseStore(str(tmp_path / "leases"))
+    assert leases.acquire("LEILA/foo.mrc") is True
+    get_vendor_files(
+        vendors=["leila"],
+        days=300,
+        shard=Shard(1, 1),
+        lease_dir=str(tmp_path / "leases"),
+    )
+    assert "(NSDROP) Skipping foo.mrc. File is being copied by another worker." in (
+        caplog.text
+    )
+    assert "Writing foo.mrc" not in caplog.text
+    assert "file(s) copied to" not in caplog.text
+
+
+def test_get_vendor_files_deadline_exceeded(
+    stub_client, state_dir, monkeypatch, caplog
+):
+    monkeypatch.setattr("vendor_file_cli.deadlines.Deadline.remaining", lambda self: 0)
+    get_vendor_files(vendors=["leila", "eastview"], days=300, deadline=1)
+    assert "Run deadline exceeded. 2 vendor(s) not finished." in caplog.text
+    assert "Writing foo.mrc" not in caplog.text
+    params = {"vendors": ["LEILA", "EASTVIEW"], "days": 300, "hours": 0, "shard": None}
+    with open(state_dir / journal_name(params), "r") as fh:
+        assert json.loads(fh.read().splitlines()[-1])["event"] == "stop"
+
+
+def test_get_vendor_files_timeout(stub_client, monkeypatch, caplog):
+    monkeypatch.setenv("VENDOR_FILE_CLI_LIST_TIMEOUT", "0.1")
+    stalled = threading.Event()
+    list_file_info = Client.list_file_info
+
+    def stub_list_file_info(self, *args, **kwargs):
+        if self.name == "LEILA":
+            stalled.wait(1)
+        return list_file_info(self, *args, **kwargs)
+
+    monkeypatch.setattr(Client, "list_file_info", stub_list_file_info)
+    get_vendor_files(vendors=["leila", "eastview"], days=300, deadline=60)
+    stalled.set()
+    assert "(LEILA) List timed out after 0s." in caplog.text
+    assert "(LEILA) Client session closed" in caplog.text
+    assert (
+        "(NSDROP) 1 file(s) copied to `NSDROP/vendor_records/eastview`" in caplog.text
+    )
+
+
 def test_get_vendor_files_invalid_creds(stub_client_auth_error, caplog):
     get_vendor_files(vendors=["leila", "eastview", "midwest_nypl"], days=300)
     assert (
@@ -35,6 +148,48 @@ def test_get_vendor_files_no_files(stub_client, caplog):
     assert "(NSDROP) Client session closed" in caplog.text
 
 
+def test_get_vendor_files_resume(stub_client, caplog):
+    params = {"vendors": ["LEILA", "EASTVIEW"], "days": 300, "hours": 0, "shard": None}
+    file = FileInfo("foo.mrc", 1700000000, 33188, 140401, 0, 0, None)
+    with RunJournal(params) as journal:
+        journal.record_plan("leila", [file])
+        journal.record_copied("leila", file)
+        journal.record_vendor_done("leila")
+        journal.record_plan("eastview", [file])
+    get_vendor_files(vendors=["leila", "eastview"], days=300, resume=True)
+    assert "Resuming interrupted run: 1 vendor(s) finished" in caplog.text
+    assert "(LEILA) Finished in interrupted run. Skipping." in caplog.text
+    assert "(LEILA) Connecting to " not in caplog.text
+    assert (
+        "(NSDROP) 1 file(s) copied to `NSDROP/vendor_records/eastview`" in caplog.text
+    )
+    caplog.clear()
+    get_vendor_files(vendors=["leila", "eastview"], days=300, resume=True)
+    assert "Previous run finished. Starting a new run." in caplog.text
+    assert "(LEILA) 1 file(s) on LEILA server to copy to NSDROP" in caplog.text
+
+
+def test_get_vendor_files_unfinished_run(stub_client, caplog):
+    params = {"vendors": ["LEILA"], "days": 300, "hours": 0, "shard": None}
+    with RunJournal(params) as journal:
+        journal.record_plan("leila", [])
+    get_vendor_files(vendors=["leila"], days=300)
+    assert "The previous run with the same options did not finish." in caplog.text
+    assert "(LEILA) 1 file(s) on LEILA server to copy to NSDROP" in caplog.text
+
+
+def test_get_vendor_files_resume_workers(stub_client, caplog):
+    params = {"vendors": ["LEILA", "EASTVIEW"], "days": 300, "hours": 0, "shard": None}
+    file = FileInfo("foo.mrc", 1700000000, 33188, 140401, 0, 0, None)
+    with RunJournal(params) as journal:
+        journal.record_plan("leila", [file])
+    get_vendor_files(vendors=["leila", "eastview"], days=300, workers=2, resume=True)
+    assert "(LEILA) 1 file(s) left to copy from interrupted run" in caplog.text
+    assert "(LEILA) 1 file(s) on LEILA server to copy to NSDROP" not in caplog.text
+    assert "(EASTVIEW) 1 file(s) on EASTVIEW server to copy to NSDROP" in caplog.text
+    assert "Copied 2 file(s) in " in caplog.text
+
+
 def test_validate_files(stub_client, caplog):
     validate_files(vendor="eastview", files=None, test=True)
     assert "(NSDROP) Connecting to " in caplog.text
@@ -42,6 +197,28 @@ def test_validate_files(stub_client, caplog):
 
 
 def test_validate_files_with_list(stub_client, caplog):
-    validate_files(vendor="eastview", files=["foo.mrc"], test=True)
+    validate_files(vendor="eastview", files=["bar.mrc"], test=True)
     assert "(NSDROP) Connecting to " in caplog.text
-    assert "(NSDROP) Validating eastview file: foo.mrc" in caplog.text
+    assert "(NSDROP) Validating eastview file: bar.mrc" in caplog.text
+    assert caplog.text.count("(NSDROP) Connecting to ") == 1
+
+
+def test_validate_files_cache(stub_client, state_dir, caplog):
+    validate_files(vendor="eastview", files=["bar.mrc"], test=True)
+    assert not os.path.exists(state_dir / "cache")
+    assert "Not caching" not in caplog.text
+    validate_files(vendor="eastview", files=["bar.mrc"], test=True, cache=True)
+    assert os.path.exists(state_dir / "cache")
+    assert (
+        "Not caching NSDROP/vendor_records/eastview/bar.mrc: size does not match "
+        "NSDROP" in caplog.text
+    )
+
+
+def test_validate_files_glob(stub_client, caplog):
+    validate_files(vendor="eastview", files=["*.mrc", "foo.mrc", "b?r.*"], test=True)
+    assert caplog.text.count("(NSDROP) Validating eastview file: bar.mrc") == 1
+    assert (
+        "(NSDROP) No files matching foo.mrc in `NSDROP/vendor_records/eastview`"
+        in caplog.text
+    )
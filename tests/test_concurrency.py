@@ -0,0 +1,69 @@
+import pytest
+
+from vendor_file_cli.concurrency import AIMDLimit, ConcurrencyController
+from vendor_file_cli.utils import read_state, write_state
+
+
+def test_aimd_limit_increase(caplog):
+    limit = AIMDLimit("LEILA", limit=2, ceiling=4)
+    limit.record(size=100, started=0, finished=1, ok=True)
+    assert limit.limit == 2
+    limit.record(size=100, started=0, finished=1, ok=True)
+    assert limit.limit == 3
+    assert "(LEILA) Concurrency limit raised to 3." in caplog.text
+    for _ in range(3):
+        limit.record(size=200, started=1, finished=2, ok=True)
+    assert limit.limit == 4
+    for _ in range(4):
+        limit.record(size=400, started=2, finished=3, ok=True)
+    assert limit.limit == 4
+
+
+def test_aimd_limit_throughput_drop(caplog):
+    limit = AIMDLimit("LEILA", limit=2, ceiling=8)
+    for _ in range(2):
+        limit.record(size=100, started=0, finished=1, ok=True)
+    assert limit.limit == 3
+    for _ in range(3):
+        limit.record(size=100, started=1, finished=3, ok=True)
+    assert limit.limit == 2
+    assert "(LEILA) Concurrency limit lowered to 2." in caplog.text
+    for _ in range(2):
+        limit.record(size=150, started=3, finished=5, ok=True)
+    assert limit.limit == 2
+
+
+def test_aimd_limit_error():
+    limit = AIMDLimit("LEILA", limit=8, ceiling=16)
+    limit.record(size=0, started=1, finished=2, ok=False)
+    assert limit.limit == 4
+    limit.record(size=0, started=1.5, finished=2.5, ok=False)
+    assert limit.limit == 4
+    limit.record(size=0, started=3, finished=4, ok=False)
+    assert limit.limit == 2
+    limit.record(size=0, started=5, finished=6, ok=False)
+    limit.record(size=0, started=7, finished=8, ok=False)
+    assert limit.limit == 1
+
+
+@pytest.mark.parametrize("start, ceiling, expected", [(0, 4, 1), (10, 4, 4)])
+def test_aimd_limit_bounds(start, ceiling, expected):
+    assert AIMDLimit("LEILA", limit=start, ceiling=ceiling).limit == expected
+
+
+def test_concurrency_controller(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("LEILA_MAX_SESSIONS", "3")
+    write_state("concurrency_limits.json", {"LEILA": 5, "FOO": 7})
+    controller = ConcurrencyController(["leila", "eastview", "nsdrop"])
+    assert controller.limits() == {"LEILA": 3, "EASTVIEW": 2, "NSDROP": 2}
+    assert controller.limit("foo") == 2
+    controller.record("eastview", size=0, started=0, finished=1, ok=False)
+    controller.record("foo", size=0, started=0, finished=1, ok=False)
+    assert controller.limit("eastview") == 1
+    controller.save()
+    assert read_state("concurrency_limits.json") == {
+        "LEILA": 3,
+        "EASTVIEW": 1,
+        "NSDROP": 2,
+        "FOO": 7,
+    }
@@ -0,0 +1,170 @@
+import pytest
+
+from vendor_file_cli.config import (
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_MEMO_SIZE,
+    DEFAULT_TIMEOUTS,
+    ConfigError,
+    VendorConfig,
+    get_cache_size,
+    get_global_rate_limits,
+    get_operation_timeouts,
+    get_required_tags,
+    get_validation_memo_settings,
+    get_vendor_code,
+    get_vendor_config,
+    load_vendor_configs,
+)
+
+
+def test_load_vendor_configs(mock_vendor_creds):
+    configs = load_vendor_configs()
+    assert isinstance(configs["EASTVIEW"], VendorConfig)
+    assert configs["EASTVIEW"].host == "ftp.eastview.com"
+    assert configs["EASTVIEW"].port == "22"
+    assert configs["EASTVIEW"].src == "eastview_src"
+    assert configs["EASTVIEW"].dst == "NSDROP/vendor_records/eastview"
+    assert configs["EASTVIEW"].validation_code == "EVP"
+    assert configs["MIDWEST_NYPL"].validate is False
+    assert configs["BAKERTAYLOR_BPL"].extra_dirs == ("",)
+    assert "password='bar'" not in repr(configs["LEILA"])
+
+
+def test_load_vendor_configs_cached(mock_vendor_creds, monkeypatch):
+    configs = load_vendor_configs()
+    monkeypatch.setenv("LEILA_HOST", "sftp.leila.com")
+    assert load_vendor_configs() is configs
+    assert get_vendor_config("leila").host == "ftp.leila.com"
+    load_vendor_configs.cache_clear()
+    assert get_vendor_config("leila").host == "sftp.leila.com"
+
+
+def test_load_vendor_configs_optional_settings(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("MIDWEST_NYPL_EXTRA_DIRS", "foo, bar")
+    monkeypatch.setenv("MIDWEST_NYPL_ROOT_PREFIXES", "ADD")
+    monkeypatch.setenv("MIDWEST_NYPL_VALIDATION_CODE", "MWT")
+    monkeypatch.setenv("MIDWEST_NYPL_MAX_SESSIONS", "4")
+    monkeypatch.setenv("MIDWEST_NYPL_SHARD_BY_FILE", "True")
+    monkeypatch.setenv("MIDWEST_NYPL_COMPRESSION", "true")
+    config = get_vendor_config("midwest_nypl")
+    assert config.extra_dirs == ("foo", "bar")
+    assert config.root_prefixes == ("ADD",)
+    assert config.vendor_code == "MWT"
+    assert config.validate is True
+    assert config.max_sessions == 4
+    assert config.shard_by_file is True
+    assert config.compression is True
+    assert get_vendor_config("leila").shard_by_file is False
+    assert get_vendor_config("leila").compression is False
+
+
+@pytest.mark.parametrize(
+    "value, rate",
+    [
+        ("2048", 2048),
+        ("512k", 524288),
+        (" 1.5M ", 1572864),
+        ("1G", 1024**3),
+        ("0", None),
+    ],
+)
+def test_load_vendor_configs_rate_limits(mock_vendor_creds, monkeypatch, value, rate):
+    monkeypatch.setenv("LEILA_BYTES_PER_SECOND", value)
+    monkeypatch.setenv("LEILA_OPS_PER_SECOND", "0.5")
+    config = get_vendor_config("leila")
+    assert config.bytes_per_second == rate
+    assert config.ops_per_second == 0.5
+    assert get_vendor_config("eastview").bytes_per_second is None
+
+
+@pytest.mark.parametrize(
+    "value, size", [(None, DEFAULT_CACHE_SIZE), ("512M", 512 * 1024**2), ("0", 0)]
+)
+def test_get_cache_size(monkeypatch, value, size):
+    if value is not None:
+        monkeypatch.setenv("VENDOR_FILE_CLI_CACHE_SIZE", value)
+    assert get_cache_size() == size
+
+
+def test_get_global_rate_limits(monkeypatch):
+    assert get_global_rate_limits() == (None, None)
+    monkeypatch.setenv("VENDOR_FILE_CLI_BYTES_PER_SECOND", "10M")
+    monkeypatch.setenv("VENDOR_FILE_CLI_OPS_PER_SECOND", "5")
+    assert get_global_rate_limits() == (10 * 1024**2, 5)
+
+
+def test_get_operation_timeouts(monkeypatch):
+    assert get_operation_timeouts() == DEFAULT_TIMEOUTS
+    monkeypatch.setenv("VENDOR_FILE_CLI_LIST_TIMEOUT", "30")
+    timeouts = get_operation_timeouts()
+    assert timeouts["list"] == 30
+    assert timeouts["get"] == DEFAULT_TIMEOUTS["get"]
+
+
+def test_get_vendor_config_not_found(mock_vendor_creds):
+    with pytest.raises(KeyError) as exc:
+        get_vendor_config("foo")
+    assert "No credentials found for FOO." in str(exc.value)
+
+
+@pytest.mark.parametrize("setting", ["SRC", "DST"])
+def test_get_vendor_config_missing_dir(mock_vendor_creds, monkeypatch, setting):
+    monkeypatch.delenv(f"LEILA_{setting}")
+    load_vendor_configs.cache_clear()
+    config = get_vendor_config("leila")
+    with pytest.raises(ConfigError) as exc:
+        getattr(config, setting.lower())
+    assert str(exc.value) == (
+        f"LEILA_{setting} is not set. Add it to the credentials for LEILA."
+    )
+    assert isinstance(exc.value, KeyError)
+
+
+def test_get_required_tags(mock_vendor_creds, monkeypatch):
+    assert get_required_tags("eastview") == ("001", "852")
+    assert get_required_tags("midwest_nypl") == ()
+    monkeypatch.setenv("EASTVIEW_REQUIRED_TAGS", "001, 960")
+    monkeypatch.setenv("LEILA_REQUIRED_TAGS", "")
+    load_vendor_configs.cache_clear()
+    assert get_required_tags("eastview") == ("001", "960")
+    assert get_required_tags("leila") == ()
+    assert get_required_tags("foo") == ()
+
+
+def test_get_validation_memo_settings(monkeypatch):
+    assert get_validation_memo_settings() == (DEFAULT_MEMO_SIZE, False)
+    monkeypatch.setenv("VENDOR_FILE_CLI_MEMO_SIZE", "0")
+    monkeypatch.setenv("VENDOR_FILE_CLI_MEMO_PERSIST", "true")
+    assert get_validation_memo_settings() == (0, True)
+
+
+@pytest.mark.parametrize(
+    "vendor, vendor_code",
+    [
+        ("amalivre_sasb", "AUXAM"),
+        ("eastview", "EVP"),
+        ("leila", "LEILA"),
+        ("midwest_nypl", "MIDWEST_NYPL"),
+        ("foo", "FOO"),
+        ("amalivre_sasb_2", "AUXAM"),
+        ("eastview_nypl", "EVP"),
+    ],
+)
+def test_get_vendor_code(mock_vendor_creds, vendor, vendor_code):
+    assert get_vendor_code(vendor) == vendor_code
+
+
+def test_get_vendor_code_configured_vendor(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("AMALIVRE_SASB_2_HOST", "ftp.amalivre_sasb_2.com")
+    load_vendor_configs.cache_clear()
+    assert get_vendor_config("amalivre_sasb_2").vendor_code == "AUXAM"
+    assert get_vendor_config("amalivre_sasb_2").validate is False
+    assert get_vendor_code("amalivre_sasb_2") == "AUXAM"
+
+
+@pytest.mark.parametrize(
+    "file_name, remote_dir", [("ADDfoo.mrc", ""), ("foo.mrc", "bakertaylor_bpl_src")]
+)
+def test_vendor_config_remote_dir(mock_vendor_creds, file_name, remote_dir):
+    assert get_vendor_config("bakertaylor_bpl").remote_dir(file_name) == remote_dir
+    assert get_vendor_config("leila").remote_dir(file_name) == "leila_src"
@@ -0,0 +1,77 @@
+import json
+import socket
+
+from vendor_file_cli.connections import (
+    ConnectionCheck,
+    check_connection,
+    check_connections,
+    format_checks,
+)
+
+
+def test_check_connection(stub_client, stub_socket, caplog):
+    check = check_connection("leila")
+    assert check.ok is True
+    assert check.name == "LEILA"
+    assert check.host == "ftp.leila.com"
+    assert check.port == 21
+    assert check.files == 1
+    assert all(
+        i is not None for i in (check.dns, check.tcp, check.handshake, check.listing)
+    )
+    assert "(LEILA) Client session closed" in caplog.text
+
+
+def test_check_connection_dns_error(mock_vendor_creds, monkeypatch, caplog):
+    def stub_getaddrinfo(*args, **kwargs):
+        raise socket.gaierror("Name or service not known")
+
+    monkeypatch.setattr("socket.getaddrinfo", stub_getaddrinfo)
+    check = check_connection("eastview")
+    assert check.ok is False
+    assert check.error == "dns: gaierror: Name or service not known"
+    assert check.tcp is None
+    assert check.files is None
+    assert "(EASTVIEW) Connection check failed at dns: gaierror" in caplog.text
+
+
+def test_check_connection_tcp_error(mock_vendor_creds, stub_socket, monkeypatch):
+    def stub_create_connection(*args, **kwargs):
+        raise ConnectionRefusedError("Connection refused")
+
+    monkeypatch.setattr("socket.create_connection", stub_create_connection)
+    check = check_connection("nsdrop")
+    assert check.port == 22
+    assert check.dns is not None
+    assert check.tcp is None
+    assert check.error == "tcp: ConnectionRefusedError: Connection refused"
+
+
+def test_check_connections(stub_client, stub_socket):
+    checks = check_connections(["NSDROP", "LEILA", "EASTVIEW"])
+    assert [i.name for i in checks] == ["NSDROP", "LEILA", "EASTVIEW"]
+    assert all(i.ok for i in checks)
+    assert check_connections([]) == []
+
+
+def test_format_checks():
+    checks = [
+        ConnectionCheck("NSDROP", "ftp.nsdrop.com", 22, 0.001, 0.0204, 0.5, 0.25, 3),
+        ConnectionCheck("LEILA", "ftp.leila.com", 21, 0.002, error="tcp: timed out"),
+    ]
+    assert format_checks(checks).splitlines() == [
+        "SERVER  HOST               DNS  TCP   HANDSHAKE  LISTING  FILES  ERROR",
+        "NSDROP  ftp.nsdrop.com:22  1ms  20ms  500ms      250ms    3",
+        "LEILA   ftp.leila.com:21   2ms  -     -          -        -      tcp: timed out",
+    ]
+    assert json.loads(json.dumps(checks[1].to_dict())) == {
+        "name": "LEILA",
+        "host": "ftp.leila.com",
+        "port": 21,
+        "dns": 0.002,
+        "tcp": None,
+        "handshake": None,
+        "listing": None,
+        "files": None,
+        "error": "tcp: timed out",
+    }
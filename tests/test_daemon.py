@@ -0,0 +1,169 @@
+import signal
+
+import pytest
+from file_retriever import FileInfo
+
+from vendor_file_cli.daemon import FetchDaemon
+from vendor_file_cli.tokens import TokenRefresher
+from vendor_file_cli.utils import load_creds
+
+
+def test_fetch_daemon_poll(stub_client, caplog):
+    daemon = FetchDaemon(vendors=["leila"], days=300)
+    assert [i.file_name for i in daemon.poll("leila")] == ["foo.mrc"]
+    assert [i.file_name for i in daemon.poll("leila")] == ["foo.mrc"]
+    assert caplog.text.count("(LEILA) Connecting to ") == 1
+    assert caplog.text.count("(NSDROP) Connecting to ") == 1
+    assert "(NSDROP) Writing foo.mrc to `NSDROP/vendor_records/leila`" in caplog.text
+    assert sorted(daemon.clients.keys()) == ["LEILA", "NSDROP"]
+    daemon.close()
+    assert daemon.clients == {}
+    assert "(LEILA) Client session closed" in caplog.text
+
+
+def test_fetch_daemon_poll_reconnect(stub_client, monkeypatch, caplog):
+    daemon = FetchDaemon(vendors=["leila"], days=300)
+    daemon.poll("leila")
+    monkeypatch.setattr(
+        daemon.clients["LEILA"], "is_active", lambda *args, **kwargs: False
+    )
+    daemon.poll("leila")
+    assert caplog.text.count("(LEILA) Connecting to ") == 2
+    assert caplog.text.count("(NSDROP) Connecting to ") == 1
+
+
+def test_fetch_daemon_poll_error(stub_client_auth_error, caplog):
+    daemon = FetchDaemon(vendors=["leila"], days=300)
+    assert daemon.poll("leila") == []
+    assert "(LEILA) Unable to poll vendor server: " in caplog.text
+    assert daemon.clients == {}
+
+
+def test_fetch_daemon_poll_copied_files(mock_vendor_creds, monkeypatch, mocker, caplog):
+    files = [
+        FileInfo(i, 1700000000, 33188, 140401, 0, 0, None)
+        for i in ["foo.mrc", "bar.mrc", "baz.mrc"]
+    ]
+
+    def stub_get_single_file(file, **kwargs):
+        if file.file_name == "bar.mrc":
+            return None
+        if file.file_name == "baz.mrc":
+            raise OSError("Connection lost")
+        return file
+
+    client = mocker.Mock()
+    client.name = "LEILA"
+    daemon = FetchDaemon(vendors=["leila"], days=300)
+    monkeypatch.setattr(daemon, "_client", lambda name: client)
+    monkeypatch.setattr(
+        "vendor_file_cli.daemon.get_vendor_file_list", lambda **kwargs: files
+    )
+    monkeypatch.setattr("vendor_file_cli.daemon.get_single_file", stub_get_single_file)
+    assert daemon.poll("leila") == files[:1]
+    assert "(LEILA) Unable to poll vendor server: Connection lost" in caplog.text
+
+
+def test_fetch_daemon_next_poll(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("LEILA_POLL_INTERVAL", "5")
+    daemon = FetchDaemon(interval=15)
+    assert daemon.next_poll("leila", 100.0) == 400.0
+    assert daemon.next_poll("eastview", 100.0) == 1000.0
+
+
+def test_fetch_daemon_token_refresher(mock_vendor_creds):
+    daemon = FetchDaemon()
+    assert isinstance(
+        daemon._token_refresher(["LEILA", "MIDWEST_NYPL"]), TokenRefresher
+    )
+    assert daemon._token_refresher(["MIDWEST_NYPL", "BAKERTAYLOR_BPL"]) is None
+
+
+@pytest.mark.parametrize(
+    "signum, stop, reload",
+    [(signal.SIGTERM, True, False), (signal.SIGINT, True, False)]
+    + ([(signal.SIGHUP, False, True)] if hasattr(signal, "SIGHUP") else []),
+)
+def test_fetch_daemon_handle_signal(mock_vendor_creds, signum, stop, reload):
+    daemon = FetchDaemon()
+    daemon._handle_signal(signum, None)
+    assert daemon._stop.is_set() is stop
+    assert daemon._reload.is_set() is reload
+
+
+def test_fetch_daemon_reload(stub_client, monkeypatch):
+    monkeypatch.setattr("vendor_file_cli.daemon.load_creds", lambda: None)
+    daemon = FetchDaemon()
+    daemon.schedule = [(100.0, "LEILA"), (200.0, "FOO")]
+    daemon.clients["LEILA"] = stub_client("leila")
+    daemon.reload()
+    scheduled = dict((vendor, due) for due, vendor in daemon.schedule)
+    assert sorted(scheduled.keys()) == sorted(
+        ["EASTVIEW", "LEILA", "MIDWEST_NYPL", "BAKERTAYLOR_BPL"]
+    )
+    assert scheduled["LEILA"] == 100.0
+    assert daemon.clients == {}
+
+
+def test_fetch_daemon_reload_removed_vendor(mock_open_file, mock_vendor_creds, mocker):
+    load_creds()
+    daemon = FetchDaemon()
+    daemon.schedule = [(100.0, "LEILA"), (200.0, "EASTVIEW")]
+    yaml_string = "\n".join(
+        i for i in mock_vendor_creds.splitlines() if not i.startswith("LEILA")
+    )
+    mocker.patch("vendor_file_cli.utils.open", mocker.mock_open(read_data=yaml_string))
+    daemon.reload()
+    scheduled = dict((vendor, due) for due, vendor in daemon.schedule)
+    assert "LEILA" not in scheduled
+    assert scheduled["EASTVIEW"] == 200.0
+
+
+def test_fetch_daemon_reload_rate_limits(stub_client, monkeypatch):
+    monkeypatch.setattr("vendor_file_cli.daemon.load_creds", lambda: None)
+    daemon = FetchDaemon()
+    assert daemon.throttle.limits() == {}
+    monkeypatch.setenv("NSDROP_BYTES_PER_SECOND", "1M")
+    daemon.reload()
+    assert daemon.throttle.limits() == {"NSDROP": (1024**2, None)}
+
+
+def test_fetch_daemon_run(stub_client, monkeypatch, caplog):
+    polled = []
+    daemon = FetchDaemon(vendors=["leila", "eastview"])
+
+    def mock_poll(vendor, pipeline=None):
+        polled.append(vendor)
+        if len(polled) == 2:
+            daemon._handle_signal(signal.SIGTERM, None)
+        return []
+
+    monkeypatch.setattr(daemon, "poll", mock_poll)
+    handler = signal.getsignal(signal.SIGTERM)
+    daemon.run()
+    assert sorted(polled) == ["EASTVIEW", "LEILA"]
+    assert signal.getsignal(signal.SIGTERM) == handler
+    assert "Polling 2 vendor(s) for new files." in caplog.text
+    assert "Stopped polling vendors." in caplog.text
+
+
+def test_fetch_daemon_next_poll_adaptive(mock_vendor_creds, monkeypatch):
+    daemon = FetchDaemon(interval=15, adaptive=True)
+    assert daemon.next_poll("leila", 100.0) == 1000.0
+    monkeypatch.setattr(daemon.scheduler, "next_delay", lambda *args: 300)
+    assert daemon.next_poll("leila", 100.0) == 400.0
+
+
+def test_fetch_daemon_run_adaptive(stub_client, monkeypatch):
+    daemon = FetchDaemon(vendors=["leila"], days=300, adaptive=True)
+
+    def mock_record(vendor, mtimes):
+        daemon._handle_signal(signal.SIGTERM, None)
+        recorded.append((vendor, mtimes))
+
+    recorded: list = []
+    monkeypatch.setattr(daemon.scheduler, "record", mock_record)
+    daemon.run()
+    assert len(recorded) == 1
+    assert recorded[0][0] == "LEILA"
+    assert len(recorded[0][1]) == 1
@@ -0,0 +1,208 @@
+import ftplib
+import socket
+import threading
+import time
+
+import pytest
+
+from vendor_file_cli.deadlines import (
+    Deadline,
+    DeadlineExceeded,
+    OperationTimeout,
+    released,
+    set_socket_timeout,
+)
+
+
+class StubClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StubClient:
+    def __init__(self, name: str = "LEILA", session: str = "session"):
+        self.name = name
+        self.session = session
+        self.closed = False
+
+    def close(self):
+        if self.closed:
+            raise OSError("already closed")
+        self.closed = True
+
+
+@pytest.fixture
+def stalled():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_deadline_timeout():
+    clock = StubClock()
+    deadline = Deadline(budget=100, timeouts={"list": 60}, clock=clock)
+    assert deadline.remaining() == 100
+    assert deadline.timeout("list") == 60
+    clock.now = 70
+    assert deadline.timeout("list") == 30
+    assert deadline.expired() is False
+    clock.now = 100
+    assert deadline.expired() is True
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout("list")
+
+
+def test_deadline_no_budget(monkeypatch):
+    monkeypatch.setenv("VENDOR_FILE_CLI_GET_TIMEOUT", "5")
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert deadline.expired() is False
+    assert deadline.timeout("get") == 5
+    assert deadline.hedge_after == deadline.timeouts["list"] / 4
+
+
+def test_deadline_call():
+    client = StubClient()
+    assert Deadline().call("list", client, lambda: ["foo.mrc"]) == ["foo.mrc"]
+    with pytest.raises(ValueError):
+        Deadline().call("list", client, lambda: int("foo"))
+    assert client.closed is False
+
+
+def test_deadline_call_timeout(stalled, caplog):
+    client = StubClient()
+    deadline = Deadline(timeouts={"list": 0.05})
+    with pytest.raises(OperationTimeout) as exc:
+        deadline.call("list", client, stalled.wait)
+    assert not isinstance(exc.value, DeadlineExceeded)
+    assert client.closed is True
+    assert "(LEILA) List timed out after 0s." in caplog.text
+
+
+@pytest.mark.parametrize(
+    "error", [socket.timeout("timed out"), ValueError(TimeoutError("timed out"))]
+)
+def test_deadline_call_stalled(error, caplog):
+    client = StubClient()
+    connection = ftplib.FTP()
+    client.session = type("Session", (), {"connection": connection})()
+    timeouts = []
+
+    def stalled_transfer():
+        timeouts.append(connection.timeout)
+        raise error
+
+    deadline = Deadline(timeouts={"get": 5})
+    with pytest.raises(OperationTimeout):
+        deadline.call("get", client, stalled_transfer)
+    assert timeouts == [5]
+    assert connection.timeout == max(deadline.timeouts.values())
+    assert client.closed is True
+    assert "(LEILA) Get timed out after 5s." in caplog.text
+
+
+def test_deadline_call_transfer_runs_on_caller_thread():
+    client = StubClient()
+    deadline = Deadline(timeouts={"put": 0.01})
+
+    def slow_transfer():
+        time.sleep(0.05)
+        return threading.current_thread()
+
+    assert deadline.call("put", client, slow_transfer) is threading.current_thread()
+    with pytest.raises(ValueError):
+        deadline.call("put", client, lambda: int("foo"))
+    assert client.closed is False
+
+
+def test_deadline_call_budget_exceeded(stalled, caplog):
+    deadline = Deadline(budget=0.05)
+    with pytest.raises(DeadlineExceeded):
+        deadline.call("list", StubClient(), stalled.wait)
+    assert "(LEILA) Run deadline exceeded during list." in caplog.text
+    with pytest.raises(DeadlineExceeded):
+        deadline.call("list", StubClient(), lambda: [])
+
+
+def test_deadline_connect_timeout(stalled):
+    client = StubClient()
+
+    def connect():
+        stalled.wait()
+        return client
+
+    with pytest.raises(OperationTimeout):
+        Deadline(timeouts={"connect": 0.05}).connect("leila", connect)
+    stalled.set()
+    for _ in range(100):
+        if client.closed:
+            break
+        time.sleep(0.01)
+    assert client.closed is True
+
+
+def test_deadline_hedge(stalled, caplog):
+    client = StubClient(session="stalled")
+    backup = StubClient(session="fresh")
+
+    def list_files(c):
+        if c.session == "stalled":
+            stalled.wait()
+        return [c.session]
+
+    deadline = Deadline(timeouts={"list": 5}, hedge_after=0.05)
+    assert deadline.hedge("list", client, list_files, lambda: backup) == ["fresh"]
+    assert client.session == "fresh"
+    assert backup.closed is False
+    assert "(LEILA) List has taken more than 0s. Retrying on a fresh connection." in (
+        caplog.text
+    )
+    assert "(LEILA) Using list result from fresh connection." in caplog.text
+
+
+def test_deadline_hedge_not_needed():
+    client = StubClient()
+    deadline = Deadline(hedge_after=0.05)
+    result = deadline.hedge(
+        "list", client, lambda c: ["foo.mrc"], lambda: pytest.fail("reconnected")
+    )
+    assert result == ["foo.mrc"]
+    assert client.closed is False
+
+
+def test_deadline_hedge_timeout(stalled):
+    client = StubClient()
+    backup = StubClient()
+    deadline = Deadline(timeouts={"list": 0.1}, hedge_after=0.02)
+    with pytest.raises(OperationTimeout):
+        deadline.hedge("list", client, lambda c: stalled.wait(), lambda: backup)
+    assert backup.closed is True
+
+
+def test_deadline_hedge_error():
+    def list_files(c):
+        raise ConnectionError("foo")
+
+    with pytest.raises(ConnectionError):
+        Deadline(hedge_after=0.05).hedge(
+            "list", StubClient(), list_files, lambda: StubClient()
+        )
+
+
+def test_released():
+    client = StubClient()
+    with released(client) as session:
+        session.close()
+    assert client.closed is True
+
+
+def test_set_socket_timeout():
+    connection = ftplib.FTP()
+    client = StubClient()
+    client.session = type("Session", (), {"connection": connection})()
+    set_socket_timeout(client, 30)
+    assert connection.timeout == 30
+    set_socket_timeout(StubClient(), 30)
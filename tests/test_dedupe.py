@@ -0,0 +1,141 @@
+import hashlib
+import io
+import json
+
+import pytest
+from file_retriever import FileInfo
+
+from vendor_file_cli.dedupe import MARKER_SUFFIX, HashIndex, hash_stream
+
+
+def stub_info(name: str = "foo.mrc", size: int = 3) -> FileInfo:
+    return FileInfo(name, 1700000000, 33188, size, 0, 0, None)
+
+
+class UnbufferedStream(io.RawIOBase):
+    def __init__(self, content: bytes) -> None:
+        self.stream = io.BytesIO(content)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.stream.seek(offset, whence)
+
+
+@pytest.mark.parametrize("stream_class", [io.BytesIO, UnbufferedStream])
+def test_hash_stream(stream_class):
+    content = b"foo" * 100_000
+    stream = stream_class(content)
+    stream.read(10)
+    assert hash_stream(stream) == hashlib.sha256(content).hexdigest()
+    assert stream.read() == content
+
+
+def read_index(state_dir) -> list[dict]:
+    with open(state_dir / "content_hashes.jsonl", "r") as fh:
+        return [json.loads(i) for i in fh]
+
+
+def test_hash_index_find_record(state_dir):
+    index = HashIndex()
+    assert index.find("abc", "NSDROP/leila/foo.mrc") is None
+    index.record("leila", stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    assert index.find("abc", "NSDROP/leila/foo.mrc") is None
+    assert index.find("abc", "NSDROP/eastview/bar.mrc") == "NSDROP/leila/foo.mrc"
+    index.record("eastview", stub_info("bar.mrc"), "NSDROP/eastview/bar.mrc", "abc")
+    assert index.hashes == {"abc": "NSDROP/leila/foo.mrc"}
+    entries = read_index(state_dir)
+    assert len(entries) == 2
+    assert entries[1] == {
+        "file": "EASTVIEW/bar.mrc",
+        "size": 3,
+        "mtime": 1700000000,
+        "digest": "abc",
+        "path": "NSDROP/eastview/bar.mrc",
+        "time": entries[1]["time"],
+    }
+
+
+def test_hash_index_check():
+    index = HashIndex()
+    index.record("leila", stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    index.record("eastview", stub_info("bar.mrc"), "NSDROP/eastview/bar.mrc", "abc")
+    assert index.check("leila", stub_info()) is None
+    assert index.check("eastview", stub_info("bar.mrc")) == "NSDROP/leila/foo.mrc"
+    assert index.check("eastview", stub_info("bar.mrc", size=4)) is None
+    assert index.check("eastview", stub_info("baz.mrc")) is None
+
+
+def test_hash_index_shared():
+    first, second = HashIndex(), HashIndex()
+    first.record("leila", stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    second.record("eastview", stub_info("bar.mrc"), "NSDROP/eastview/bar.mrc", "abc")
+    assert second.hashes == {"abc": "NSDROP/leila/foo.mrc"}
+    assert HashIndex().check("eastview", stub_info("bar.mrc")) == (
+        "NSDROP/leila/foo.mrc"
+    )
+
+
+def test_hash_index_shared_after_open():
+    first, second = HashIndex(), HashIndex()
+    first.record("leila", stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    assert second.find("abc", "NSDROP/eastview/bar.mrc") == "NSDROP/leila/foo.mrc"
+
+
+def test_hash_index_prune(state_dir):
+    now = 1700000000.0
+    index = HashIndex(max_age=100, clock=lambda: now)
+    index.record("leila", stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    now += 50
+    index.record("eastview", stub_info("bar.mrc"), "NSDROP/eastview/bar.mrc", "abc")
+    index.record("eastview", stub_info("baz.mrc"), "NSDROP/eastview/baz.mrc", "def")
+    index.record("eastview", stub_info("baz.mrc"), "NSDROP/eastview/baz.mrc", "def")
+    assert len(read_index(state_dir)) == 4
+    now += 60
+    index = HashIndex(max_age=100, clock=lambda: now)
+    assert index.hashes == {
+        "abc": "NSDROP/eastview/bar.mrc",
+        "def": "NSDROP/eastview/baz.mrc",
+    }
+    assert [i["file"] for i in read_index(state_dir)] == [
+        "EASTVIEW/bar.mrc",
+        "EASTVIEW/baz.mrc",
+    ]
+
+
+def test_hash_index_compact_keeps_originals(state_dir):
+    index = HashIndex()
+    index.record("eastview", stub_info("bar.mrc"), "NSDROP/eastview/bar.mrc", "abc")
+    index.record("leila", stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    index.record("eastview", stub_info("bar.mrc"), "NSDROP/eastview/bar.mrc", "abc")
+    index = HashIndex()
+    assert len(read_index(state_dir)) == 2
+    assert index.hashes == {"abc": "NSDROP/eastview/bar.mrc"}
+    assert HashIndex().check("leila", stub_info()) == "NSDROP/eastview/bar.mrc"
+
+
+def test_hash_index_cut_off_line(state_dir):
+    HashIndex().record("leila", stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    with open(state_dir / "content_hashes.jsonl", "a") as fh:
+        fh.write('{"file": "LEILA/')
+    index = HashIndex()
+    index.record("eastview", stub_info("bar.mrc"), "NSDROP/eastview/bar.mrc", "def")
+    assert HashIndex().hashes == {
+        "abc": "NSDROP/leila/foo.mrc",
+        "def": "NSDROP/eastview/bar.mrc",
+    }
+
+
+def test_hash_index_marker():
+    marker = HashIndex("marker").marker(stub_info(), "NSDROP/leila/foo.mrc", "abc")
+    assert marker.file_name == f"foo.mrc{MARKER_SUFFIX}"
+    assert marker.file_stream.read() == (
+        b"Same content as NSDROP/leila/foo.mrc\nsha256: abc\n"
+    )
+    assert marker.file_size == 49
+
+
+def test_hash_index_invalid_mode():
+    with pytest.raises(ValueError, match="Dedupe mode must be one of skip, marker"):
+        HashIndex("foo")
@@ -0,0 +1,127 @@
+import json
+
+from file_retriever import FileInfo
+
+from vendor_file_cli.journal import RunJournal, journal_name
+from vendor_file_cli.utils import get_state_path
+
+PARAMS = {"vendors": ["LEILA", "EASTVIEW"], "days": 30, "hours": 0, "shard": None}
+
+
+def stub_file(file_name: str) -> FileInfo:
+    return FileInfo(file_name, 1700000000, 33188, 140401, 0, 0, None)
+
+
+def read_journal() -> list[dict]:
+    with open(get_state_path(journal_name(PARAMS))) as fh:
+        return [json.loads(i) for i in fh if i.strip()]
+
+
+def interrupted_run() -> None:
+    with RunJournal(PARAMS) as journal:
+        journal.record_plan("leila", [stub_file("foo.mrc")])
+        journal.record_copied("leila", stub_file("foo.mrc"))
+        journal.record_vendor_done("leila")
+        journal.record_plan("eastview", [stub_file("foo.mrc"), stub_file("bar.mrc")])
+        journal.record_copied("eastview", stub_file("foo.mrc"))
+
+
+def test_run_journal():
+    with RunJournal(PARAMS) as journal:
+        assert journal.resumed is False
+        journal.record_plan("leila", [stub_file("foo.mrc")])
+        journal.record_copied("leila", stub_file("foo.mrc"))
+        journal.record_vendor_done("leila")
+        journal.finish()
+    assert [i["event"] for i in read_journal()] == [
+        "start",
+        "plan",
+        "copied",
+        "vendor_done",
+        "finish",
+    ]
+    assert read_journal()[1]["files"] == [
+        {"name": "foo.mrc", "size": 140401, "mtime": 1700000000, "mode": 33188}
+    ]
+
+
+def test_run_journal_resume(caplog):
+    interrupted_run()
+    with RunJournal(PARAMS, resume=True) as journal:
+        assert journal.resumed is True
+        assert journal.is_finished("LEILA") is True
+        assert journal.is_finished("eastview") is False
+        planned = journal.plan("eastview")
+        assert [i.file_name for i in planned] == ["foo.mrc", "bar.mrc"]
+        assert [i.file_name for i in journal.pending("eastview", planned)] == [
+            "bar.mrc"
+        ]
+        assert journal.plan("amalivre_sasb") is None
+    assert "1 vendor(s) finished, 2 file(s) copied" in caplog.text
+    assert read_journal()[0]["event"] == "start"
+    assert len(read_journal()) == 6
+
+
+def test_run_journal_resume_truncated_entry():
+    interrupted_run()
+    with open(get_state_path(journal_name(PARAMS)), "a") as fh:
+        fh.write('{"event": "copied", "vendor": "EASTV')
+    with RunJournal(PARAMS, resume=True) as journal:
+        assert journal.resumed is True
+        journal.record_copied("eastview", stub_file("bar.mrc"))
+    with open(get_state_path(journal_name(PARAMS))) as fh:
+        assert json.loads(fh.read().splitlines()[-1])["file"] == "bar.mrc"
+
+
+def test_run_journal_resume_finished_run(caplog):
+    with RunJournal(PARAMS) as journal:
+        journal.finish()
+    with RunJournal(PARAMS, resume=True) as journal:
+        assert journal.resumed is False
+    assert "Previous run finished. Starting a new run." in caplog.text
+
+
+def test_run_journal_resume_different_params(caplog):
+    interrupted_run()
+    with RunJournal(
+        {**PARAMS, "days": 1}, resume=True, name=journal_name(PARAMS)
+    ) as journal:
+        assert journal.resumed is False
+        assert journal.plan("eastview") is None
+    assert "Interrupted run was started with different options" in caplog.text
+    assert [i["event"] for i in read_journal()] == ["start"]
+
+
+def test_run_journal_no_resume(caplog):
+    interrupted_run()
+    with RunJournal(PARAMS) as journal:
+        assert journal.resumed is False
+        assert journal.is_finished("leila") is False
+    assert "The previous run with the same options did not finish." in caplog.text
+    assert len(read_journal()) == 1
+
+
+def test_run_journal_resume_stopped_run(caplog):
+    interrupted_run()
+    with RunJournal(PARAMS, resume=True) as journal:
+        journal.stop()
+    assert read_journal()[-1]["event"] == "stop"
+    with RunJournal(PARAMS, resume=True) as journal:
+        assert journal.resumed is True
+        assert journal.is_finished("leila") is True
+
+
+def test_run_journal_name():
+    assert journal_name(PARAMS) == journal_name(dict(reversed(PARAMS.items())))
+    assert journal_name(PARAMS) != journal_name({**PARAMS, "shard": "1/2"})
+    assert journal_name(PARAMS).startswith("run_journal_")
+    interrupted_run()
+    with RunJournal({**PARAMS, "days": 1}) as journal:
+        assert journal.resumed is False
+    assert len(read_journal()) == 6
+
+
+def test_run_journal_resume_no_journal(caplog):
+    with RunJournal(PARAMS, resume=True) as journal:
+        assert journal.resumed is False
+    assert "No interrupted run to resume. Starting a new run." in caplog.text
@@ -0,0 +1,213 @@
+import datetime
+import ftplib
+
+import pytest
+from file_retriever import FileInfo
+
+from vendor_file_cli import listing as listing_module
+from vendor_file_cli.listing import FileListing, list_directory, parse_list_line
+from vendor_file_cli.utils import connect
+
+NOW = datetime.datetime(2024, 3, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+class StubFTP(ftplib.FTP):
+    def __init__(self, features: str, mlsd_error: bool = False) -> None:
+        super().__init__()
+        self.host, self.port = "ftp.leila.com", 21
+        self.features = features
+        self.mlsd_error = mlsd_error
+        self.commands: list[str] = []
+
+    def sendcmd(self, cmd: str) -> str:
+        self.commands.append(cmd)
+        if not self.features:
+            raise ftplib.error_perm("500 Unknown command")
+        return self.features
+
+    def mlsd(self, path: str = "", facts: list = []):
+        self.commands.append(f"MLSD {path}")
+        if self.mlsd_error:
+            raise ftplib.error_perm("500 Unknown command")
+        yield ".", {"type": "cdir"}
+        yield "sub", {"type": "dir"}
+        yield "foo.mrc", {"type": "file", "size": "10", "modify": "20240301120000"}
+        yield (
+            "bar.mrc",
+            {
+                "type": "file",
+                "size": "20",
+                "modify": "20240229120000.123",
+                "unix.mode": "0600",
+            },
+        )
+
+    def retrlines(self, cmd: str, callback=None) -> str:
+        self.commands.append(cmd)
+        for line in [
+            "drwxr-xr-x   2 owner group     4096 Feb 01 10:00 sub",
+            "-rw-r--r--   1 owner group       10 Mar 01  2024 foo.mrc",
+            "-rw-r--r--   1 owner group       20 Feb 29  2024 bar baz.mrc",
+        ]:
+            callback(line)
+        return "226 Transfer complete"
+
+
+@pytest.fixture
+def stub_ftp_client(stub_client, monkeypatch):
+    monkeypatch.setattr(listing_module, "_mlsd_support", {})
+
+    def stub_ftp_client_response(ftp: ftplib.FTP):
+        client = connect("leila")
+        client.session.connection = ftp
+        return client
+
+    return stub_ftp_client_response
+
+
+def stub_files() -> list[FileInfo]:
+    return [
+        FileInfo("foo.mrc", 1700000000, 33188, 140401, 0, 0, None),
+        FileInfo("bar.mrc", 1700000100, 33188, 140401, 0, 0, None),
+    ]
+
+
+def test_file_listing_from_file_info():
+    files = stub_files()
+    listing = FileListing.from_file_info(files)
+    assert len(listing) == 2
+    assert listing.names == ["foo.mrc", "bar.mrc"]
+    assert listing.sizes.tolist() == [140401, 140401]
+    assert listing.file_info(1) is files[1]
+
+
+def test_file_listing_filter():
+    now = datetime.datetime.now(tz=datetime.timezone.utc).timestamp()
+    listing = FileListing(
+        names=["foo.mrc", "bar.mrc", "baz.mrc", "qux.mrc"],
+        mtimes=[now - 100, now - 10, now - 1, now],
+        sizes=[1, 2, 3, 4],
+    )
+    files = listing.filter(since=now - 10, exclude=["baz.mrc"])
+    assert [i.file_name for i in files] == ["bar.mrc", "qux.mrc"]
+    assert [i.file_size for i in files] == [2, 4]
+    assert files[0].file_mtime == now - 10
+
+
+def test_file_listing_filter_no_exclude():
+    files = stub_files()
+    listing = FileListing.from_file_info(files)
+    assert listing.filter(since=0) == files
+    assert listing.filter(since=1700000001) == [files[1]]
+
+
+def test_file_listing_empty():
+    listing = FileListing(names=[], mtimes=[], sizes=[])
+    assert listing.filter(since=0, exclude=["foo.mrc"]) == []
+
+
+def test_file_listing_concat():
+    files = stub_files()
+    listing = FileListing.concat(
+        [FileListing.from_file_info(files[:1]), FileListing.from_file_info(files[1:])]
+    )
+    assert listing.names == ["foo.mrc", "bar.mrc"]
+    assert listing.filter(since=0) == files
+    listing = FileListing.concat(
+        [
+            FileListing.from_file_info(files),
+            FileListing(names=["baz.mrc"], mtimes=[1], sizes=[3]),
+        ]
+    )
+    assert listing.sizes.tolist() == [140401, 140401, 3]
+    assert listing.filter(since=0)[2].file_name == "baz.mrc"
+
+
+def test_list_directory_mlsd(stub_ftp_client):
+    ftp = StubFTP(features="211-Features:\n MLST type*;size*;modify*;\n211 End")
+    listing = list_directory(stub_ftp_client(ftp), "src")
+    assert listing.names == ["foo.mrc", "bar.mrc"]
+    assert listing.sizes.tolist() == [10, 20]
+    assert listing.mtimes.tolist() == [NOW.timestamp(), NOW.timestamp() - 86400]
+    assert [oct(i) for i in listing.modes] == ["0o100644", "0o100600"]
+    list_directory(stub_ftp_client(ftp), "src")
+    assert ftp.commands == ["FEAT", "MLSD src", "MLSD src"]
+
+
+def test_list_directory_list_fallback(stub_ftp_client):
+    ftp = StubFTP(features="")
+    listing = list_directory(stub_ftp_client(ftp), "src")
+    assert listing.names == ["foo.mrc", "bar baz.mrc"]
+    assert listing.sizes.tolist() == [10, 20]
+    assert listing.mtimes.tolist() == [
+        NOW.timestamp() - 43200,
+        NOW.timestamp() - 129600,
+    ]
+    assert ftp.commands == ["FEAT", "LIST src"]
+
+
+def test_list_directory_mlsd_error(stub_ftp_client):
+    ftp = StubFTP(features=" MLST type*;size*;modify*;", mlsd_error=True)
+    listing = list_directory(stub_ftp_client(ftp), "src")
+    assert listing.names == ["foo.mrc", "bar baz.mrc"]
+    list_directory(stub_ftp_client(ftp), "src")
+    assert ftp.commands == ["FEAT", "MLSD src", "LIST src", "LIST src"]
+
+
+def test_list_directory_other_session(stub_client):
+    listing = list_directory(connect("leila"), "testdir")
+    assert listing.names == ["foo.mrc"]
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (
+            "-rw-r--r--   1 owner group   140401 Jan 05 09:30 foo.mrc",
+            ("foo.mrc", 1704447000.0, 140401, 0o100644),
+        ),
+        (
+            "-rwxr-x---   1 owner group   140401 Dec 31 23:00 foo.mrc",
+            ("foo.mrc", 1704063600.0, 140401, 0o100750),
+        ),
+        (
+            "-rw-r--r--   1 owner group   140401 Jun 01  2020 foo bar.mrc",
+            ("foo bar.mrc", 1590969600.0, 140401, 0o100644),
+        ),
+        (
+            "01-05-24  09:30AM               140401 foo.mrc",
+            ("foo.mrc", 1704447000.0, 140401, 0o100644),
+        ),
+        ("drwxr-xr-x   2 owner group     4096 Jan 05 09:30 sub", None),
+        ("lrwxrwxrwx   1 owner group       10 Jan 05 09:30 link -> foo.mrc", None),
+        ("01-05-24  09:30AM       <DIR>          sub", None),
+        ("total 12", None),
+    ],
+)
+def test_parse_list_line(line, expected):
+    assert parse_list_line(line, NOW) == expected
+
+
+def test_parse_list_line_leap_day():
+    now = datetime.datetime(2025, 3, 1, 12, tzinfo=datetime.timezone.utc)
+    line = "-rw-r--r--   1 owner group   140401 Feb 29 10:00 foo.mrc"
+    assert parse_list_line(line, now) == ("foo.mrc", 1709200800.0, 140401, 0o100644)
+    line = "-rw-r--r--   1 owner group   140401 Feb 30 10:00 foo.mrc"
+    assert parse_list_line(line, now) is None
+
+
+def test_file_listing_match():
+    listing = FileListing(
+        names=["foo.mrc", "bar.mrc", "foo.txt", "FOO.MRC"],
+        mtimes=[1, 2, 3, 4],
+        sizes=[1, 2, 3, 4],
+    )
+    matches = listing.match(["bar.mrc", "foo.*", "*.MRC", "baz.mrc", "[bf]o*"])
+    assert {k: [i.file_name for i in v] for k, v in matches.items()} == {
+        "bar.mrc": ["bar.mrc"],
+        "foo.*": ["foo.mrc", "foo.txt"],
+        "*.MRC": ["FOO.MRC"],
+        "baz.mrc": [],
+        "[bf]o*": ["foo.mrc", "foo.txt"],
+    }
+    assert matches["bar.mrc"][0].file_size == 2
@@ -0,0 +1,96 @@
+import json
+import logging
+import sys
+
+import pytest
+
+from vendor_file_cli import logs
+from vendor_file_cli.logs import JsonFormatter, configure_logging, parse_log_levels
+
+
+@pytest.fixture
+def restore_loggers(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    logs._stop_listener()
+    for name in logs.LOGGERS:
+        logger = logging.getLogger(name)
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+            handler.close()
+        logger.propagate = True
+        logger.setLevel(logging.NOTSET)
+
+
+def test_json_formatter():
+    record = logging.LogRecord(
+        "vendor_file_cli", logging.INFO, "foo.py", 10, 'Copied "%s"\n', ("bar",), None
+    )
+    out = json.loads(JsonFormatter().format(record))
+    assert out["message"] == 'Copied "bar"\n'
+    assert out["levelname"] == "INFO"
+    assert out["lineno"] == 10
+    assert out["app"] == "vendor_file_cli"
+
+
+def test_json_formatter_exc_info():
+    try:
+        raise ValueError("foo")
+    except ValueError:
+        exc_info = sys.exc_info()
+    record = logging.LogRecord(
+        "vendor_file_cli", logging.ERROR, "foo.py", 10, "bar", None, exc_info
+    )
+    out = json.loads(JsonFormatter().format(record))
+    assert "ValueError: foo" in out["exc_info"]
+
+
+@pytest.mark.parametrize(
+    "values, levels",
+    [
+        ((), {}),
+        (("info",), {"file_retriever": "INFO", "vendor_file_cli": "INFO"}),
+        (
+            ("DEBUG", "file_retriever=WARNING"),
+            {"file_retriever": "WARNING", "vendor_file_cli": "DEBUG"},
+        ),
+        (("vendor_file_cli.listing=info",), {"vendor_file_cli.listing": "INFO"}),
+    ],
+)
+def test_parse_log_levels(values, levels):
+    assert parse_log_levels(values) == levels
+
+
+def test_configure_logging_atexit(monkeypatch, mocker):
+    register = mocker.Mock()
+    monkeypatch.setattr("atexit.register", register)
+    monkeypatch.setattr("logging.config.dictConfig", lambda config: None)
+    handler = mocker.Mock()
+    monkeypatch.setattr("logging.getHandlerByName", lambda name: handler, raising=False)
+    configure_logging()
+    first = logs._listener
+    configure_logging()
+    logs._stop_listener()
+    register.assert_not_called()
+    first.start.assert_called()
+    first.stop.assert_called()
+    assert logs._listener is None
+
+
+def test_parse_log_levels_invalid():
+    with pytest.raises(ValueError) as exc:
+        parse_log_levels(("file_retriever=LOUD",))
+    assert "Invalid log level: LOUD" in str(exc.value)
+
+
+def test_configure_logging(restore_loggers):
+    configure_logging(log_format="json", levels={"file_retriever": "WARNING"})
+    assert logs._listener is not None
+    logging.getLogger("vendor_file_cli").debug('Copied "foo.mrc"')
+    logging.getLogger("file_retriever").info("filtered")
+    configure_logging()
+    logs._stop_listener()
+    with open(restore_loggers / "vendor_file_cli.log") as fh:
+        lines = fh.read().splitlines()
+    assert json.loads(lines[0])["message"] == 'Copied "foo.mrc"'
+    assert len(lines) == 1
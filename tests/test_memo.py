@@ -0,0 +1,74 @@
+import pytest
+
+from vendor_file_cli.memo import STATE_FILE, ValidationMemo, get_validation_memo
+from vendor_file_cli.utils import read_state
+
+
+def test_validation_memo_get_put():
+    memo = ValidationMemo(max_entries=10, version="1.0")
+    key = memo.key(b"foo")
+    assert memo.get(key) is None
+    memo.put(key, {"valid": True})
+    out = memo.get(key)
+    assert out == {"valid": True}
+    out["record_number"] = "1 of 1"
+    assert memo.get(key) == {"valid": True}
+    assert (memo.hits, memo.misses) == (2, 1)
+
+
+def test_validation_memo_key_version():
+    assert ValidationMemo(version="1.0").key(b"foo") != ValidationMemo(
+        version="2.0"
+    ).key(b"foo")
+    assert ValidationMemo(version="1.0").key(b"foo") == ValidationMemo(
+        version="1.0"
+    ).key(b"foo")
+
+
+def test_validation_memo_key_required_tags():
+    memo = ValidationMemo(version="1.0")
+    assert memo.key(b"foo") != memo.key(b"foo", ("001", "245"))
+    assert memo.key(b"foo", ("001", "245")) != memo.key(b"foo", ("001",))
+    assert memo.key(b"foo", ("001", "245")) == memo.key(b"foo", ["245", "001"])
+
+
+def test_validation_memo_evicts_least_recently_used():
+    memo = ValidationMemo(max_entries=2, version="1.0")
+    memo.put("a", {"valid": True})
+    memo.put("b", {"valid": True})
+    memo.get("a")
+    memo.put("c", {"valid": False})
+    assert len(memo) == 2
+    assert memo.get("b") is None
+    assert memo.get("a") == {"valid": True}
+
+
+def test_validation_memo_disabled():
+    memo = ValidationMemo(max_entries=0, version="1.0")
+    memo.put("a", {"valid": True})
+    assert memo.get("a") is None
+    assert len(memo) == 0
+
+
+@pytest.mark.parametrize("version, entries", [("1.0", 1), ("2.0", 0)])
+def test_validation_memo_persist(version, entries):
+    memo = ValidationMemo(max_entries=10, persist=True, version="1.0")
+    memo.put("a", {"valid": False, "missing_fields": ["960"]})
+    memo.save()
+    assert read_state(STATE_FILE)["version"] == "1.0"
+    loaded = ValidationMemo(max_entries=10, persist=True, version=version)
+    assert len(loaded) == entries
+
+
+def test_validation_memo_not_persisted():
+    memo = ValidationMemo(max_entries=10, persist=False, version="1.0")
+    memo.put("a", {"valid": True})
+    memo.save()
+    assert read_state(STATE_FILE) == {}
+
+
+def test_get_validation_memo(monkeypatch):
+    monkeypatch.setenv("VENDOR_FILE_CLI_MEMO_SIZE", "5")
+    memo = get_validation_memo()
+    assert memo.max_entries == 5
+    assert get_validation_memo() is memo
@@ -0,0 +1,46 @@
+import pytest
+
+from vendor_file_cli.pipeline import ValidationPipeline
+
+
+@pytest.fixture
+def sheet_rows(monkeypatch):
+    rows = []
+    monkeypatch.setattr(
+        "vendor_file_cli.pipeline.write_data_to_sheet",
+        lambda values, test: rows.append((values["file_name"], test)),
+    )
+    return rows
+
+
+def test_validation_pipeline(stub_file, sheet_rows):
+    with ValidationPipeline(test=True) as pipeline:
+        pipeline.submit(file_obj=stub_file, vendor="eastview")
+        pipeline.submit(file_obj=stub_file, vendor="leila")
+    assert sheet_rows == [(["foo.mrc"], True), (["foo.mrc"], True)]
+
+
+def test_validation_pipeline_drains_on_error(stub_file, sheet_rows):
+    with pytest.raises(ValueError):
+        with ValidationPipeline(test=False) as pipeline:
+            pipeline.submit(file_obj=stub_file, vendor="eastview")
+            raise ValueError
+    assert sheet_rows == [(["foo.mrc"], False)]
+
+
+def test_validation_pipeline_interrupted(stub_file, sheet_rows, caplog):
+    pipeline = ValidationPipeline(test=True)
+    pipeline.submit(file_obj=stub_file, vendor="eastview")
+    pipeline._cancelled.set()
+    pipeline.__enter__()
+    pipeline.close()
+    assert sheet_rows == []
+    assert "(EASTVIEW) Run interrupted. foo.mrc was not validated." in caplog.text
+
+
+def test_validation_pipeline_validation_error(stub_file, sheet_rows, caplog):
+    stub_file.file_stream = None
+    with ValidationPipeline(test=True) as pipeline:
+        pipeline.submit(file_obj=stub_file, vendor="eastview")
+    assert sheet_rows == []
+    assert "(EASTVIEW) Unable to validate foo.mrc: " in caplog.text
@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+
+from vendor_file_cli.scheduler import AdaptiveScheduler, DeliveryHistory
+from vendor_file_cli.utils import read_state
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Monday 2024-01-01 09:00 UTC
+MONDAY = datetime.datetime(2024, 1, 1, 9, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def weekly_deliveries(weeks: int = 4) -> list[float]:
+    return [MONDAY + i * 7 * DAY for i in range(weeks)]
+
+
+def test_delivery_history_add():
+    history = DeliveryHistory([3.0, 1.0], max_size=3)
+    assert history.mtimes == [1.0, 3.0]
+    assert history.add([3.0, 2.0]) == 1
+    assert history.add([4.0]) == 1
+    assert history.mtimes == [2.0, 3.0, 4.0]
+    assert len(history) == 3
+
+
+def test_delivery_history_typical_gap():
+    assert DeliveryHistory([MONDAY]).typical_gap is None
+    history = DeliveryHistory(weekly_deliveries() + [MONDAY + 30])
+    assert history.typical_gap == 7 * DAY
+
+
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (MONDAY + 30 * 60, 0),
+        (MONDAY - HOUR - 60, 60),
+        (MONDAY + HOUR + 30 * 60, 0),
+        (MONDAY + 3 * HOUR, 7 * DAY - 4 * HOUR),
+    ],
+)
+def test_delivery_history_seconds_to_window(now, expected):
+    history = DeliveryHistory([MONDAY])
+    assert history.seconds_to_window(now) == expected
+
+
+def test_delivery_history_seconds_to_window_empty():
+    assert DeliveryHistory().seconds_to_window(MONDAY) is None
+
+
+def test_adaptive_scheduler_no_history():
+    scheduler = AdaptiveScheduler()
+    assert scheduler.next_delay("leila", MONDAY, 900) == 900
+
+
+def test_adaptive_scheduler_delivery_window():
+    scheduler = AdaptiveScheduler()
+    scheduler.record("leila", weekly_deliveries())
+    assert scheduler.next_delay("leila", MONDAY + 7 * DAY * 3, 900) == 300
+    assert scheduler.next_delay("LEILA", MONDAY + 7 * DAY * 3 + HOUR, 900) == 300
+
+
+def test_adaptive_scheduler_delivery_due():
+    scheduler = AdaptiveScheduler()
+    scheduler.record("leila", [MONDAY + i * 3 * DAY for i in range(4)])
+    due = MONDAY + 12 * DAY
+    assert scheduler.next_delay("leila", due + 3 * HOUR, 900) == 300
+
+
+def test_adaptive_scheduler_backoff():
+    scheduler = AdaptiveScheduler(max_interval=3600)
+    scheduler.record("leila", weekly_deliveries())
+    now = MONDAY + 7 * DAY * 3 + 2 * DAY
+    assert scheduler.next_delay("leila", now, 900) == 900
+    scheduler.record("leila", [])
+    assert scheduler.next_delay("leila", now, 900) == 1800
+    scheduler.record("leila", [])
+    scheduler.record("leila", [])
+    assert scheduler.next_delay("leila", now, 900) == 3600
+    scheduler.record("leila", [now])
+    assert scheduler.idle_polls["LEILA"] == 0
+
+
+def test_adaptive_scheduler_backoff_until_window():
+    scheduler = AdaptiveScheduler()
+    scheduler.record("leila", weekly_deliveries())
+    now = MONDAY + 7 * DAY * 3 - 2 * HOUR
+    for _ in range(5):
+        scheduler.record("leila", [])
+    assert scheduler.next_delay("leila", now, 900) == HOUR
+
+
+def test_adaptive_scheduler_saves_history(state_dir):
+    scheduler = AdaptiveScheduler()
+    scheduler.record("leila", weekly_deliveries())
+    assert read_state("delivery_history.json") == {"LEILA": weekly_deliveries()}
+    assert AdaptiveScheduler().history("leila").mtimes == weekly_deliveries()
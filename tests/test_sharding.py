@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+from file_retriever import FileInfo
+
+from vendor_file_cli.sharding import (
+    LeaseStore,
+    LocalLeaseStore,
+    Shard,
+    claim_file,
+    open_lease_store,
+)
+
+
+def stub_file_info(file_name: str) -> FileInfo:
+    return FileInfo(file_name, 1700000000, 33188, 140401, 0, 0, None)
+
+
+@pytest.mark.parametrize("value, index, count", [("1/3", 1, 3), ("2/2", 2, 2)])
+def test_shard_parse(value, index, count):
+    shard = Shard.parse(value)
+    assert shard == Shard(index=index, count=count)
+    assert str(shard) == value
+
+
+@pytest.mark.parametrize("value", ["foo", "1", "a/b", "0/3", "4/3", "1/0"])
+def test_shard_parse_invalid(value):
+    with pytest.raises(ValueError) as exc:
+        Shard.parse(value)
+    assert "Invalid shard" in str(exc.value)
+
+
+def test_shard_owns():
+    keys = [f"LEILA/{i}.mrc" for i in range(100)]
+    shards = [Shard(i, 3) for i in range(1, 4)]
+    owners = [[s.owns(key) for s in shards].count(True) for key in keys]
+    assert owners == [1] * 100
+    assert all(len([k for k in keys if s.owns(k)]) > 10 for s in shards)
+
+
+def test_shard_vendors(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("LEILA_SHARD_BY_FILE", "true")
+    vendors = ["LEILA", "EASTVIEW", "MIDWEST_NYPL", "BAKERTAYLOR_BPL"]
+    shards = [Shard(i, 2) for i in (1, 2)]
+    assert all("LEILA" in s.vendors(vendors) for s in shards)
+    others = [v for s in shards for v in s.vendors(vendors) if v != "LEILA"]
+    assert sorted(others) == sorted(vendors[1:])
+
+
+def test_shard_files(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("LEILA_SHARD_BY_FILE", "true")
+    files = [stub_file_info(f"{i}.mrc") for i in range(20)]
+    shards = [Shard(i, 2) for i in (1, 2)]
+    assert shards[0].files("eastview", files) == files
+    split = [s.files("leila", files) for s in shards]
+    assert len(split[0]) + len(split[1]) == 20
+    assert not set(i.file_name for i in split[0]) & set(i.file_name for i in split[1])
+
+
+def test_local_lease_store(tmp_path):
+    first = LocalLeaseStore(str(tmp_path))
+    second = LocalLeaseStore(str(tmp_path))
+    assert first.acquire("LEILA/foo.mrc") is True
+    assert second.acquire("LEILA/foo.mrc") is False
+    assert os.listdir(tmp_path) == ["LEILA_foo.mrc.lease"]
+    second.release("LEILA/foo.mrc")
+    assert os.listdir(tmp_path) == ["LEILA_foo.mrc.lease"]
+    first.release("LEILA/foo.mrc")
+    assert os.listdir(tmp_path) == []
+    assert second.acquire("LEILA/foo.mrc") is True
+
+
+def test_local_lease_store_hold(tmp_path):
+    leases = LocalLeaseStore(str(tmp_path))
+    with leases.hold("LEILA/foo.mrc") as acquired:
+        assert acquired is True
+        with leases.hold("LEILA/foo.mrc") as acquired_again:
+            assert acquired_again is False
+        assert os.listdir(tmp_path) == ["LEILA_foo.mrc.lease"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_local_lease_store_expired(tmp_path, caplog):
+    (tmp_path / "LEILA_foo.mrc.lease").write_text(
+        json.dumps({"owner": "foo", "expires": time.time() - 1})
+    )
+    leases = LocalLeaseStore(str(tmp_path))
+    assert leases.acquire("LEILA/foo.mrc") is True
+    assert "Lease on LEILA/foo.mrc has expired" in caplog.text
+
+
+def test_local_lease_store_expired_taken_over(tmp_path, monkeypatch):
+    path = tmp_path / "LEILA_foo.mrc.lease"
+    path.write_text(json.dumps({"owner": "foo", "expires": time.time() - 1}))
+    first = LocalLeaseStore(str(tmp_path))
+    second = LocalLeaseStore(str(tmp_path))
+    create = first._create
+
+    def lose_race(path, data):
+        # the second worker takes over the lease after the first has read it
+        if path.endswith(".takeover"):
+            assert second.acquire("LEILA/foo.mrc") is True
+        return create(path, data)
+
+    monkeypatch.setattr(first, "_create", lose_race)
+    assert first.acquire("LEILA/foo.mrc") is False
+    assert json.loads(path.read_text())["owner"] == second.owner
+    assert os.listdir(tmp_path) == ["LEILA_foo.mrc.lease"]
+
+
+def test_local_lease_store_expired_takeover_in_progress(tmp_path):
+    path = tmp_path / "LEILA_foo.mrc.lease"
+    path.write_text(json.dumps({"owner": "foo", "expires": time.time() - 1}))
+    first = LocalLeaseStore(str(tmp_path))
+    second = LocalLeaseStore(str(tmp_path))
+    marker = first._marker(str(path), path.read_bytes())
+    assert first._create(marker, first._data()) is True
+    assert second.acquire("LEILA/foo.mrc") is False
+    assert json.loads(path.read_text())["owner"] == "foo"
+    first._remove(marker)
+    assert second.acquire("LEILA/foo.mrc") is True
+
+
+def test_local_lease_store_expired_takeover_marker(tmp_path):
+    path = tmp_path / "LEILA_foo.mrc.lease"
+    path.write_text(json.dumps({"owner": "foo", "expires": time.time() - 1}))
+    stopped = LocalLeaseStore(str(tmp_path), ttl=-1)
+    leases = LocalLeaseStore(str(tmp_path))
+    marker = leases._marker(str(path), path.read_bytes())
+    stopped._create(marker, stopped._data())
+    assert leases.acquire("LEILA/foo.mrc") is False
+    assert os.listdir(tmp_path) == ["LEILA_foo.mrc.lease"]
+    assert leases.acquire("LEILA/foo.mrc") is True
+
+
+def test_local_lease_store_renew(tmp_path, caplog):
+    first = LocalLeaseStore(str(tmp_path), ttl=60)
+    second = LocalLeaseStore(str(tmp_path), ttl=60)
+    path = tmp_path / "LEILA_foo.mrc.lease"
+    assert first.acquire("LEILA/foo.mrc") is True
+    expires = json.loads(path.read_text())["expires"]
+    time.sleep(0.01)
+    assert first.renew("LEILA/foo.mrc") is True
+    assert json.loads(path.read_text())["expires"] > expires
+    assert second.renew("LEILA/foo.mrc") is False
+    assert "Unable to renew lease on LEILA/foo.mrc" in caplog.text
+
+
+def test_local_lease_store_hold_heartbeat(tmp_path, monkeypatch):
+    leases = LocalLeaseStore(str(tmp_path), ttl=0.03)
+    renewed = threading.Event()
+    monkeypatch.setattr(leases, "renew", lambda key: renewed.set())
+    with leases.hold("LEILA/foo.mrc") as acquired:
+        assert acquired is True
+        assert renewed.wait(1)
+    leases._released.wait(1)
+    assert os.listdir(tmp_path) == []
+
+
+def test_lease_store_abstract():
+    with pytest.raises(TypeError):
+        LeaseStore("foo")
+
+
+def test_local_lease_store_unreadable(tmp_path):
+    path = tmp_path / "LEILA_foo.mrc.lease"
+    path.write_text("")
+    leases = LocalLeaseStore(str(tmp_path), ttl=60)
+    assert leases.acquire("LEILA/foo.mrc") is False
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    assert leases.acquire("LEILA/foo.mrc") is True
+
+
+def test_claim_file(stub_client, tmp_path, monkeypatch, caplog):
+    nsdrop_client = stub_client("nsdrop")
+    leases = LocalLeaseStore(str(tmp_path))
+    file = stub_file_info("foo.mrc")
+    with claim_file("leila", file, nsdrop_client, leases) as claimed:
+        assert claimed is True
+        with claim_file("leila", file, nsdrop_client, leases) as claimed_again:
+            assert claimed_again is False
+    assert "Skipping foo.mrc. File is being copied by another worker." in caplog.text
+    monkeypatch.setattr(nsdrop_client, "check_file", lambda *args, **kwargs: True)
+    with claim_file("leila", file, nsdrop_client, leases) as claimed:
+        assert claimed is False
+    assert "Skipping foo.mrc. File was copied by another worker." in caplog.text
+    assert os.listdir(tmp_path) == []
+
+
+def test_open_lease_store(stub_client, tmp_path):
+    nsdrop_client = stub_client("nsdrop")
+    leases = open_lease_store(nsdrop_client, str(tmp_path / "leases"))
+    assert isinstance(leases, LocalLeaseStore)
+    assert os.path.isdir(tmp_path / "leases")
+    with pytest.raises(ValueError) as exc:
+        open_lease_store(nsdrop_client)
+    assert "Leases can only be stored on an SFTP server" in str(exc.value)
@@ -0,0 +1,140 @@
+import pytest
+from pymarc import Field, Indicators, Record, Subfield
+
+from vendor_file_cli.structure import MarcView, prevalidate, read_record
+from vendor_file_cli.utils import get_control_number
+
+
+def test_marc_view(stub_record):
+    view = MarcView(stub_record.as_marc21())
+    assert view.tags == ["001", "852"]
+    assert view.field_count == 2
+    assert view.errors == []
+    assert view.utf8 is True
+    assert view.leader == str(Record(data=stub_record.as_marc21()).leader)
+    assert view.control_number == "on1381158740"
+
+
+def test_marc_view_fields(stub_record):
+    stub_record.add_field(
+        Field(
+            tag="245",
+            indicators=Indicators("1", "0"),
+            subfields=[Subfield("a", "Éclair :"), Subfield("b", "a history")],
+        )
+    )
+    data = stub_record.as_marc21()
+    view = MarcView(data)
+    parsed = Record(data=data)
+    assert [str(i) for i in view.fields] == [str(i) for i in parsed.fields]
+    assert view.get("245")["a"] == "Éclair :"
+    assert view.get("245").indicators == Indicators("1", "0")
+    assert view.get("500") is None
+    assert [i.tag for i in view.get_fields("001", "245")] == ["001", "245"]
+    assert view.to_record().as_marc21() == data
+
+
+def test_marc_view_marc8(stub_record):
+    stub_record.add_field(
+        Field(
+            tag="245",
+            indicators=Indicators("1", "0"),
+            subfields=[Subfield("a", "xEclair")],
+        )
+    )
+    data = stub_record.as_marc21().replace(b"xEclair", b"\xe2Eclair")
+    data = data[:9] + b" " + data[10:]
+    view = MarcView(data)
+    assert view.utf8 is False
+    assert view.get("245")["a"] == Record(data=data)["245"]["a"]
+    assert view.get("245")["a"] == "\u00c9clair"
+
+
+def test_marc_view_get_control_number(stub_record):
+    stub_record.remove_fields("001")
+    view = MarcView(stub_record.as_marc21())
+    assert view.control_number is None
+    assert get_control_number(view) == "ReCAP 23-100000"
+
+
+@pytest.mark.parametrize(
+    "corrupt, error",
+    [
+        (lambda data: data[:-1], "leader"),
+        (lambda data: b"abcde" + data[5:], "leader"),
+        (lambda data: data[:12] + b"00099" + data[17:], "leader"),
+        (lambda data: data[:48] + b"\x1d" + data[49:], "directory"),
+        (lambda data: data[:27] + b"0099" + data[31:], "directory"),
+        (lambda data: data[:27] + b"00x3" + data[31:], "directory"),
+    ],
+)
+def test_marc_view_invalid(stub_record, corrupt, error):
+    view = MarcView(corrupt(stub_record.as_marc21()))
+    assert view.errors == [error]
+
+
+def test_marc_view_missing(stub_record):
+    view = MarcView(stub_record.as_marc21())
+    assert view.missing(["001", "960", "949"]) == ["960", "949"]
+
+
+def test_prevalidate_valid(stub_record):
+    view = MarcView(stub_record.as_marc21())
+    assert prevalidate(view, ["852"]) is None
+    assert prevalidate(view) is None
+
+
+def test_prevalidate_missing_tags(stub_record):
+    stub_record.remove_fields("852")
+    assert prevalidate(MarcView(stub_record.as_marc21()), ["852", "960"]) == {
+        "valid": False,
+        "error_count": 2,
+        "missing_field_count": 2,
+        "missing_fields": ["852", "960"],
+        "extra_field_count": 0,
+        "extra_fields": [],
+        "invalid_field_count": 0,
+        "invalid_fields": [],
+        "order_item_mismatches": [],
+    }
+
+
+def test_prevalidate_invalid_structure(stub_record):
+    out = prevalidate(MarcView(stub_record.as_marc21()[:-1]), ["960"])
+    assert out["valid"] is False
+    assert out["error_count"] == 1
+    assert out["invalid_fields"] == ["leader"]
+    assert out["missing_fields"] == []
+
+
+def test_prevalidate_record(stub_record):
+    assert prevalidate(stub_record, ["001", "852"]) is None
+    assert prevalidate(stub_record, ["001", "960"])["missing_fields"] == ["960"]
+
+
+def test_read_record(stub_record):
+    data = stub_record.as_marc21()
+    assert isinstance(read_record(data), MarcView)
+
+
+def test_read_record_pymarc_fallback(stub_record):
+    data = stub_record.as_marc21()
+    data = data[:48] + b"#" + data[49:]
+    assert MarcView(data).errors == ["directory"]
+    record = read_record(data)
+    assert isinstance(record, Record)
+    assert record["001"].data == "on1381158740"
+
+
+@pytest.mark.parametrize(
+    "corrupt, error",
+    [
+        (lambda data: data[:-1], "leader"),
+        (lambda data: data[:12] + b"00099" + data[17:], "leader"),
+        (lambda data: data[:27] + b"00x3" + data[31:], "directory"),
+    ],
+)
+def test_read_record_invalid(stub_record, corrupt, error):
+    record = read_record(corrupt(stub_record.as_marc21()))
+    assert isinstance(record, MarcView)
+    assert record.errors == [error]
@@ -0,0 +1,111 @@
+import io
+
+import pytest
+
+from vendor_file_cli.config import load_vendor_configs
+from vendor_file_cli.throttle import GLOBAL, Throttle, TokenBucket
+
+
+class StubClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = StubClock()
+    bucket = TokenBucket(rate=10, clock=clock)
+    assert bucket.capacity == 10
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve(5) == 0.5
+    assert bucket.reserve(5) == 1
+    clock.now = 10
+    assert bucket.tokens == -10
+    assert bucket.reserve(0) == 0
+    assert bucket.tokens == 10
+
+
+def test_token_bucket_large_request():
+    clock = StubClock()
+    bucket = TokenBucket(rate=10, clock=clock)
+    assert bucket.reserve(100) == 9
+
+
+def test_token_bucket_set_rate():
+    clock = StubClock()
+    bucket = TokenBucket(rate=10, clock=clock)
+    bucket.reserve(20)
+    bucket.set_rate(20)
+    assert bucket.capacity == 20
+    assert bucket.reserve(0) == 0.5
+    bucket.set_rate(0.5)
+    assert bucket.capacity == 1
+
+
+def test_throttle(mock_vendor_creds, monkeypatch, caplog):
+    monkeypatch.setenv("LEILA_BYTES_PER_SECOND", "100")
+    monkeypatch.setenv("LEILA_OPS_PER_SECOND", "1")
+    monkeypatch.setenv("VENDOR_FILE_CLI_BYTES_PER_SECOND", "1K")
+    clock = StubClock()
+    throttle = Throttle(clock=clock, sleep=clock.sleep)
+    assert throttle.limits() == {"LEILA": (100, 1), GLOBAL: (1024, None)}
+    assert "(LEILA) Transfers limited to 100.0 bytes/s and 1.0 transfers/s." in (
+        caplog.text
+    )
+    assert throttle.wait("leila", size=100) == 0
+    assert throttle.wait("leila", size=50) == 1
+    assert clock.now == 1
+    assert throttle.wait("eastview", size=1024) == 0
+    assert throttle.wait("eastview", size=512) == 0.5
+
+
+def test_throttle_no_limits(mock_vendor_creds):
+    throttle = Throttle(sleep=lambda seconds: pytest.fail("throttle slept"))
+    assert throttle.limits() == {}
+    assert throttle.wait("leila", size=1024**3) == 0
+
+
+def test_throttle_set_limit(mock_vendor_creds, caplog):
+    throttle = Throttle()
+    throttle.set_limit("nsdrop", bytes_per_second=10)
+    assert throttle.limits() == {"NSDROP": (10, None)}
+    throttle.set_limit("nsdrop", ops_per_second=2)
+    assert throttle.limits() == {"NSDROP": (None, 2)}
+    throttle.set_limit("nsdrop")
+    assert throttle.limits() == {}
+    assert "(NSDROP) Transfers are not rate limited." in caplog.text
+
+
+def test_throttle_reload(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("NSDROP_BYTES_PER_SECOND", "10")
+    throttle = Throttle()
+    bucket = throttle.buckets[("NSDROP", "bytes")]
+    monkeypatch.setenv("NSDROP_BYTES_PER_SECOND", "20")
+    monkeypatch.setenv("EASTVIEW_OPS_PER_SECOND", "2")
+    load_vendor_configs.cache_clear()
+    throttle.reload()
+    assert throttle.buckets[("NSDROP", "bytes")] is bucket
+    assert throttle.limits() == {"NSDROP": (20, None), "EASTVIEW": (None, 2)}
+    monkeypatch.delenv("NSDROP_BYTES_PER_SECOND")
+    load_vendor_configs.cache_clear()
+    throttle.reload()
+    assert throttle.limits() == {"EASTVIEW": (None, 2)}
+
+
+def test_throttle_stream(mock_vendor_creds):
+    clock = StubClock()
+    throttle = Throttle(clock=clock, sleep=clock.sleep)
+    throttle.set_limit("nsdrop", bytes_per_second=10)
+    stream = throttle.stream(io.BytesIO(b"x" * 40), "nsdrop")
+    assert stream.read(10) == b"x" * 10
+    assert clock.now == 0
+    assert stream.read() == b"x" * 30
+    assert clock.now == 3
+    assert stream.tell() == 40
+    stream.seek(0)
+    assert stream.read(5) == b"x" * 5
@@ -0,0 +1,121 @@
+import datetime
+import json
+import threading
+
+from vendor_file_cli.tokens import TokenRefresher, TokenStore
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0, 0)
+
+
+def stub_store(tmp_path) -> TokenStore:
+    return TokenStore(
+        str(tmp_path / "sheet_token.json"),
+        clock=lambda: NOW.replace(tzinfo=datetime.timezone.utc).timestamp(),
+    )
+
+
+def test_token_store(tmp_path):
+    store = stub_store(tmp_path)
+    assert store.load() == {}
+    assert store.expires_in() is None
+    store.save("foo", NOW + datetime.timedelta(hours=1))
+    assert store.load() == {"token": "foo", "expiry": "2026-01-01T13:00:00Z"}
+    assert store.expires_in() == 3600
+
+
+def test_token_store_no_expiry(tmp_path):
+    store = stub_store(tmp_path)
+    store.save("foo", None)
+    store.save(None, NOW)
+    assert store.load() == {}
+
+
+def test_token_store_invalid_file(tmp_path, caplog):
+    store = stub_store(tmp_path)
+    with open(store.path, "w") as fh:
+        fh.write("{")
+    assert store.load() == {}
+    assert "Unable to read token from " in caplog.text
+
+
+def test_token_store_invalid_expiry(tmp_path, caplog):
+    store = stub_store(tmp_path)
+    with open(store.path, "w") as fh:
+        json.dump({"token": "foo", "expiry": "2026-01-01 13:00"}, fh)
+    assert store.expires_in() is None
+    assert "Unable to read token expiry from " in caplog.text
+
+
+def test_token_store_locked(tmp_path):
+    store = stub_store(tmp_path)
+    holding = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def hold():
+        with store.locked():
+            holding.set()
+            release.wait(5)
+            order.append("first")
+
+    def wait():
+        holding.wait(5)
+        with stub_store(tmp_path).locked():
+            order.append("second")
+
+    threads = [threading.Thread(target=hold), threading.Thread(target=wait)]
+    for thread in threads:
+        thread.start()
+    holding.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["first", "second"]
+
+
+def test_token_refresher(tmp_path, caplog):
+    store = stub_store(tmp_path)
+    refreshed = threading.Event()
+
+    def refresh():
+        store.save("bar", NOW + datetime.timedelta(hours=1))
+        refreshed.set()
+
+    with TokenRefresher(store, refresh=refresh):
+        assert refreshed.wait(5)
+    assert store.load()["token"] == "bar"
+    assert "Refreshed Google Sheet API token." in caplog.text
+
+
+def test_token_refresher_not_due(tmp_path):
+    store = stub_store(tmp_path)
+    store.save("foo", NOW + datetime.timedelta(hours=1))
+    refresher = TokenRefresher(store, refresh=lambda: None)
+    assert refresher._delay() == 3300
+    store.save("foo", NOW + datetime.timedelta(minutes=1))
+    assert refresher._delay() == 0
+
+
+def test_token_refresher_error(tmp_path, caplog):
+    failed = threading.Event()
+
+    def refresh():
+        failed.set()
+        raise ValueError("foo")
+
+    with TokenRefresher(stub_store(tmp_path), refresh=refresh, retry=0.01):
+        assert failed.wait(5)
+    assert "Unable to refresh Google Sheet API token: foo" in caplog.text
+
+
+def test_token_refresher_expiry_error(tmp_path, monkeypatch, caplog):
+    store = stub_store(tmp_path)
+    refreshed = threading.Event()
+
+    def stub_expires_in():
+        raise OSError("foo")
+
+    monkeypatch.setattr(store, "expires_in", stub_expires_in)
+    with TokenRefresher(store, refresh=refreshed.set, retry=0.01):
+        assert refreshed.wait(5)
+    assert "Unable to read Google Sheet API token expiry: foo" in caplog.text
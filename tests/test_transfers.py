@@ -0,0 +1,174 @@
+import datetime
+import threading
+
+import pytest
+from file_retriever import FileInfo
+
+from vendor_file_cli.concurrency import ConcurrencyController
+from vendor_file_cli.deadlines import Deadline
+from vendor_file_cli.dedupe import HashIndex
+from vendor_file_cli.transfers import (
+    TransferQueue,
+    TransferTask,
+    list_transfer_tasks,
+    plan_makespan,
+    run_transfers,
+)
+from vendor_file_cli.utils import read_state
+
+
+def stub_task(vendor: str, file_name: str, size: int) -> TransferTask:
+    return TransferTask(
+        vendor=vendor, file=FileInfo(file_name, 1700000000, 33188, size, 0, 0, None)
+    )
+
+
+def test_transfer_task_estimate():
+    task = stub_task("leila", "foo.mrc", 2048)
+    assert task.size == 2048
+    assert task.estimate(bytes_per_second=1024, overhead=0.5) == 2.5
+    assert stub_task("leila", "foo.mrc", None).size == 0
+
+
+def test_transfer_queue_longest_first(mock_vendor_creds):
+    queue = TransferQueue(
+        [stub_task("leila", f"{size}.mrc", size) for size in [5, 50, 1, 20]],
+        limits={"LEILA": 10},
+    )
+    order = [queue.pop().size for _ in range(4)]
+    assert order == [50, 20, 5, 1]
+    assert queue.pop() is None
+    assert len(queue) == 0
+
+
+def test_transfer_queue_vendor_limits(mock_vendor_creds, monkeypatch):
+    monkeypatch.setenv("LEILA_MAX_SESSIONS", "2")
+    monkeypatch.setenv("EASTVIEW_MAX_SESSIONS", "2")
+    tasks = [stub_task("leila", f"{i}.mrc", 100 + i) for i in range(4)]
+    tasks.append(stub_task("eastview", "small.mrc", 1))
+    queue = TransferQueue(tasks)
+    assert queue.limits == {"LEILA": 2, "EASTVIEW": 2}
+    first, second, third = queue.pop(), queue.pop(), queue.pop()
+    assert [first.vendor, second.vendor, third.vendor] == ["leila", "leila", "eastview"]
+    assert queue.pop() is None
+    queue.done(first)
+    assert queue.pop().vendor == "leila"
+
+
+def test_transfer_queue_fairness(mock_vendor_creds):
+    tasks = [stub_task("leila", "a.mrc", 10), stub_task("leila", "b.mrc", 10)]
+    tasks.append(stub_task("eastview", "c.mrc", 10))
+    queue = TransferQueue(tasks, limits={"LEILA": 3, "EASTVIEW": 3})
+    assert [queue.pop().vendor for _ in range(2)] == ["leila", "eastview"]
+
+
+def test_transfer_queue_get_blocks(mock_vendor_creds):
+    tasks = [stub_task("leila", "a.mrc", 10), stub_task("leila", "b.mrc", 5)]
+    queue = TransferQueue(tasks, limits={"LEILA": 1})
+    first = queue.get()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(queue.get()))
+    thread.start()
+    thread.join(timeout=0.1)
+    assert got == []
+    queue.done(first)
+    thread.join(timeout=1)
+    assert got[0].file.file_name == "b.mrc"
+    queue.done(got[0])
+    assert queue.get() is None
+
+
+def test_transfer_queue_controller(mock_vendor_creds):
+    controller = ConcurrencyController(["leila", "eastview", "nsdrop"])
+    tasks = [stub_task("leila", f"{i}.mrc", 10) for i in range(3)]
+    tasks.extend(stub_task("eastview", f"{i}.mrc", 1) for i in range(3))
+    queue = TransferQueue(tasks, controller=controller)
+    assert [queue.pop().vendor for _ in range(2)] == ["leila", "leila"]
+    assert queue.pop() is None
+    controller.hosts["NSDROP"].limit = 3
+    assert queue.pop().vendor == "eastview"
+    controller.hosts["LEILA"].limit = 3
+    controller.hosts["NSDROP"].limit = 4
+    assert queue.pop().vendor == "leila"
+
+
+@pytest.mark.parametrize(
+    "sizes, workers, makespan",
+    [([], 2, 0), ([3, 3, 2, 2, 2], 2, 7), ([1, 1, 1, 1, 4], 2, 4), ([5, 4, 3], 1, 12)],
+)
+def test_plan_makespan(mock_vendor_creds, sizes, workers, makespan):
+    tasks = [stub_task("leila", f"{i}.mrc", size) for i, size in enumerate(sizes)]
+    assert (
+        plan_makespan(
+            tasks, workers, limits={"LEILA": 10}, bytes_per_second=1, overhead=0
+        )
+        == makespan
+    )
+
+
+def test_plan_makespan_vendor_limits(mock_vendor_creds):
+    tasks = [stub_task("leila", f"{i}.mrc", 4) for i in range(4)]
+    tasks.append(stub_task("eastview", "foo.mrc", 4))
+    assert (
+        plan_makespan(
+            tasks, 4, limits={"LEILA": 1, "EASTVIEW": 1}, bytes_per_second=1, overhead=0
+        )
+        == 16
+    )
+
+
+def test_list_transfer_tasks(stub_client, caplog):
+    tasks = list_transfer_tasks(
+        vendors=["leila", "eastview"], timedelta=datetime.timedelta(days=300)
+    )
+    assert [(i.vendor, i.file.file_name) for i in tasks] == [
+        ("leila", "foo.mrc"),
+        ("eastview", "foo.mrc"),
+    ]
+    assert "(LEILA) 1 file(s) on LEILA server to copy to NSDROP" in caplog.text
+
+
+def test_run_transfers(stub_client, caplog):
+    tasks = [stub_task("leila", "foo.mrc", 10), stub_task("eastview", "bar.mrc", 20)]
+    report = run_transfers(tasks=tasks, workers=2, test=True)
+    assert sorted(i.file.file_name for i in report.copied) == ["bar.mrc", "foo.mrc"]
+    assert report.failed == []
+    assert report.predicted_makespan > 0
+    assert report.actual_makespan > 0
+    assert "Copying 2 file(s) on 2 worker(s). Predicted makespan: " in caplog.text
+    assert "(NSDROP) 1 file(s) copied to `NSDROP/vendor_records/leila`" in caplog.text
+    assert "Copied 2 file(s) in " in caplog.text
+    assert "(LEILA) Client session closed" in caplog.text
+    assert read_state("concurrency_limits.json") == {
+        "LEILA": 2,
+        "EASTVIEW": 2,
+        "NSDROP": 3,
+    }
+
+
+def test_run_transfers_dedupe(stub_client, caplog):
+    tasks = [stub_task("leila", "foo.mrc", 10), stub_task("eastview", "bar.mrc", 20)]
+    report = run_transfers(tasks=tasks, workers=1, test=True, hashes=HashIndex())
+    assert [i.file.file_name for i in report.copied] == ["bar.mrc"]
+    assert [i.file.file_name for i in report.skipped] == ["foo.mrc"]
+    assert "Copied 1 file(s) in " in caplog.text
+    assert "Skipped 1 file(s) already on NSDROP" in caplog.text
+
+
+def test_run_transfers_deadline_exceeded(stub_client, monkeypatch, caplog):
+    monkeypatch.setattr("vendor_file_cli.deadlines.Deadline.remaining", lambda self: 0)
+    tasks = [stub_task("leila", "foo.mrc", 10), stub_task("eastview", "bar.mrc", 20)]
+    report = run_transfers(tasks=tasks, workers=2, test=True, deadline=Deadline(60))
+    assert report.copied == []
+    assert len(report.not_started) == 2
+    assert "Run deadline exceeded. 2 file(s) not copied." in caplog.text
+
+
+def test_run_transfers_error(stub_client_auth_error, caplog):
+    report = run_transfers(
+        tasks=[stub_task("leila", "foo.mrc", 10)], workers=2, test=True
+    )
+    assert report.copied == []
+    assert [i.file.file_name for i in report.failed] == ["foo.mrc"]
+    assert "(LEILA) Unable to copy foo.mrc to NSDROP: " in caplog.text
+    assert read_state("concurrency_limits.json")["LEILA"] == 1
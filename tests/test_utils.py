@@ -1,18 +1,36 @@
+import datetime
+import hashlib
+import io
 import os
+import xml.etree.ElementTree as ET
 
+import paramiko
 import pytest
 from file_retriever.connect import Client
-from pymarc import Field, Subfield
+from pymarc import Field, Indicators, Subfield
 
+from vendor_file_cli.throttle import Throttle
 from vendor_file_cli.utils import (
     configure_sheet,
     connect,
+    count_marc_records,
     create_logger_dict,
+    detect_marc_format,
+    fetch_file,
     get_control_number,
+    get_state_path,
+    get_token_store,
     get_vendor_list,
     load_creds,
+    read_marc_chunks,
     read_marc_file_stream,
+    read_marc_stream,
+    read_marcxml_stream,
+    read_state,
+    spool_stream,
+    tune_session,
     write_data_to_sheet,
+    write_state,
 )
 
 
@@ -61,6 +79,49 @@ def test_configure_sheet_invalid_creds(mock_sheet_config_invalid_creds, caplog):
         configure_sheet()
 
 
+def test_configure_sheet_token_store(mock_sheet_config, monkeypatch):
+    now = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    infos = []
+    refreshes = []
+
+    class StubCreds:
+        def __init__(self, info):
+            self.token = info["token"]
+            self.refresh_token = info["refresh_token"]
+            self.expiry = datetime.datetime.strptime(
+                info["expiry"][:19], "%Y-%m-%dT%H:%M:%S"
+            )
+
+        @property
+        def expired(self):
+            return self.expiry < now
+
+        @property
+        def valid(self):
+            return not self.expired
+
+        def refresh(self, request):
+            refreshes.append(self.token)
+            self.token = f"token{len(refreshes)}"
+            self.expiry = now + datetime.timedelta(hours=1)
+
+    def stub_from_authorized_user_info(info, *args, **kwargs):
+        infos.append(info)
+        return StubCreds(info)
+
+    monkeypatch.setattr(
+        "google.oauth2.credentials.Credentials.from_authorized_user_info",
+        stub_from_authorized_user_info,
+    )
+    assert configure_sheet().token == "token1"
+    assert get_token_store().load()["token"] == "token1"
+    assert configure_sheet().token == "token1"
+    assert infos[1]["token"] == "token1"
+    assert refreshes == ["foo"]
+    assert configure_sheet(force_refresh=True).token == "token2"
+    assert get_token_store().load()["token"] == "token2"
+
+
 def test_connect(stub_client):
     client = connect("leila")
     assert client.name == "LEILA"
@@ -70,13 +131,107 @@ def test_connect(stub_client):
     assert client.session is not None
 
 
+def test_count_marc_records(stub_record):
+    stream = io.BytesIO(stub_record.as_marc21() * 3)
+    assert count_marc_records(stream) == 3
+    assert stream.tell() == 0
+
+
+def test_count_marc_records_trailing_data(stub_record, monkeypatch):
+    monkeypatch.setattr("vendor_file_cli.utils.CHUNK_SIZE", 10)
+    data = stub_record.as_marc21()
+    assert count_marc_records(io.BytesIO(data * 2 + b"\n")) == 2
+    stream = io.BytesIO(data * 2 + b"foo")
+    assert count_marc_records(stream) == 3
+    assert count_marc_records(stream) == len(list(read_marc_chunks(stream)))
+
+
+def test_count_marc_records_marcxml(stub_marcxml, monkeypatch):
+    monkeypatch.setattr("vendor_file_cli.utils.CHUNK_SIZE", 7)
+    stream = io.BytesIO(stub_marcxml)
+    assert count_marc_records(stream) == 2
+    assert stream.tell() == 0
+
+
 def test_create_logger_dict(cli_runner):
     logger_dict = create_logger_dict()
     assert sorted(list(logger_dict["formatters"].keys())) == sorted(["basic", "json"])
-    assert sorted(list(logger_dict["handlers"].keys())) == sorted(["stream", "file"])
+    assert sorted(list(logger_dict["handlers"].keys())) == sorted(
+        ["stream", "file", "queue"]
+    )
+    assert logger_dict["handlers"]["queue"]["handlers"] == ["stream", "file"]
+    assert logger_dict["handlers"]["file"]["formatter"] == "basic"
     assert sorted(list(logger_dict["loggers"].keys())) == sorted(
         ["file_retriever", "vendor_file_cli"]
     )
+    assert logger_dict["loggers"]["vendor_file_cli"]["handlers"] == ["queue"]
+
+
+def test_create_logger_dict_levels():
+    logger_dict = create_logger_dict(
+        log_format="json",
+        levels={"file_retriever": "WARNING", "vendor_file_cli.listing": "INFO"},
+    )
+    assert logger_dict["handlers"]["stream"]["formatter"] == "json"
+    assert logger_dict["loggers"]["file_retriever"]["level"] == "WARNING"
+    assert logger_dict["loggers"]["vendor_file_cli"]["level"] == "DEBUG"
+    assert logger_dict["loggers"]["vendor_file_cli.listing"] == {"level": "INFO"}
+
+
+@pytest.mark.parametrize(
+    "data, marc_format",
+    [
+        (b"00083cam a22000495i 4500", "marc21"),
+        (b'<?xml version="1.0"?><collection/>', "marcxml"),
+        (b"\xef\xbb\xbf\n  <record/>", "marcxml"),
+        (b"", "marc21"),
+    ],
+)
+def test_detect_marc_format(data, marc_format):
+    stream = io.BytesIO(data)
+    assert detect_marc_format(stream) == marc_format
+    assert stream.tell() == 0
+
+
+def test_fetch_file_not_sftp(stub_client, stub_file_info):
+    client = connect("leila")
+    digest = hashlib.sha256()
+    file = fetch_file(client, stub_file_info, "testdir", digest=digest)
+    assert file.file_name == stub_file_info.file_name
+    assert file.file_stream.getvalue() != b""
+    content = file.file_stream.getvalue()
+    assert digest.hexdigest() == hashlib.sha256(content).hexdigest()
+
+
+def test_fetch_file_sftp_throttled(stub_file_info, mocker):
+    remote_file = io.BytesIO(b"foo" * 100)
+    remote_file.prefetch = lambda *args, **kwargs: None
+    connection = mocker.MagicMock(spec=paramiko.SFTPClient)
+    connection.open.return_value.__enter__.return_value = remote_file
+    client = mocker.Mock()
+    client.name = "EASTVIEW"
+    client.session.connection = connection
+    waits = []
+    throttle = Throttle(sleep=waits.append)
+    throttle.set_limit("EASTVIEW", bytes_per_second=100)
+    mocker.patch("vendor_file_cli.utils.CHUNK_SIZE", 100)
+    digest = hashlib.sha256()
+    file = fetch_file(client, stub_file_info, "testdir", throttle, digest)
+    assert file.file_stream.read() == b"foo" * 100
+    assert digest.hexdigest() == hashlib.sha256(b"foo" * 100).hexdigest()
+    assert waits == [pytest.approx(1, abs=0.1), pytest.approx(2, abs=0.1)]
+    client.get_file.assert_not_called()
+
+
+def test_fetch_file_not_sftp_throttled(stub_client, stub_file_info):
+    client = connect("leila")
+    waits = []
+    throttle = Throttle(sleep=waits.append)
+    throttle.set_limit("LEILA", bytes_per_second=stub_file_info.file_size)
+    fetch_file(client, stub_file_info, "testdir", throttle)
+    assert waits == []
+    fetch_file(client, stub_file_info, "testdir", throttle)
+    assert waits == [pytest.approx(1, abs=0.1)]
 
 
 def test_get_control_number(stub_record):
@@ -162,6 +317,19 @@ def test_load_creds(mock_open_file):
     assert os.environ["LEILA_DST"] == "NSDROP/vendor_records/leila"
 
 
+def test_load_creds_removed_vendor(mock_open_file, mock_vendor_creds, mocker):
+    load_creds()
+    yaml_string = "\n".join(
+        i for i in mock_vendor_creds.splitlines() if not i.startswith("LEILA")
+    )
+    mocker.patch("vendor_file_cli.utils.open", mocker.mock_open(read_data=yaml_string))
+    load_creds()
+    assert "LEILA_HOST" not in os.environ
+    assert "LEILA_DST" not in os.environ
+    assert os.environ["EASTVIEW_HOST"] == "ftp.eastview.com"
+    assert os.environ["EASTVIEW_DST"] == "NSDROP/vendor_records/eastview"
+
+
 def test_load_creds_empty_yaml(mocker):
     yaml_string = ""
     m = mocker.mock_open(read_data=yaml_string)
@@ -194,6 +362,99 @@ def test_read_marc_file_stream(stub_file):
     assert len(records) == 1
 
 
+def test_read_marc_chunks(stub_record, monkeypatch):
+    monkeypatch.setattr("vendor_file_cli.utils.CHUNK_SIZE", 10)
+    data = stub_record.as_marc21()
+    chunks = list(read_marc_chunks(io.BytesIO(data * 2 + b"\n")))
+    assert chunks == [data, data]
+    assert list(read_marc_chunks(io.BytesIO(data + b"foo"))) == [data, b"foo"]
+
+
+def test_read_marc_chunks_marcxml(stub_record, stub_marcxml):
+    chunks = list(read_marc_chunks(io.BytesIO(stub_marcxml)))
+    assert len(chunks) == 2
+    assert chunks[0] == stub_record.as_marc21()
+
+
+def test_read_marc_stream(stub_record):
+    stream = io.BytesIO(stub_record.as_marc21() * 2)
+    stream.seek(0, 2)
+    records = [i for i in read_marc_stream(stream)]
+    assert len(records) == 2
+    assert records[1].get_fields("001")[0].data == "on1381158740"
+
+
+def test_read_marc_stream_marcxml(stub_marcxml):
+    records = list(read_marc_stream(io.BytesIO(stub_marcxml)))
+    assert len(records) == 2
+    assert records[1]["001"].data == "on1381158740"
+
+
+def test_read_marcxml_stream():
+    stream = io.BytesIO(
+        b"<record><leader>00000nam a2200000 a 4500</leader>"
+        b'<controlfield tag="001">foo</controlfield>'
+        b'<datafield tag="245" ind1="1" ind2="0">'
+        b'<subfield code="a">Bar</subfield></datafield></record>'
+    )
+    records = list(read_marcxml_stream(stream))
+    assert len(records) == 1
+    assert str(records[0].leader) == "00000nam a2200000 a 4500"
+    assert records[0]["001"].data == "foo"
+    assert records[0]["245"].indicators == Indicators("1", "0")
+    assert records[0]["245"]["a"] == "Bar"
+
+
+def test_read_marcxml_stream_invalid(caplog):
+    stream = io.BytesIO(b"<collection><record><leader>foo</leader></record><record>")
+    records = read_marcxml_stream(stream)
+    assert str(next(records).leader).strip() == "foo"
+    with pytest.raises(ET.ParseError):
+        next(records)
+    assert "Unable to parse MARCXML: " in caplog.text
+
+
+def test_read_state_missing(state_dir):
+    assert read_state("foo.json") == {}
+
+
+def test_read_state_invalid(state_dir):
+    state_dir.mkdir()
+    (state_dir / "foo.json").write_text("{not json")
+    assert read_state("foo.json") == {}
+
+
+def test_spool_stream_seekable(stub_file):
+    assert spool_stream(stub_file.file_stream) is stub_file.file_stream
+
+
+def test_spool_stream_unseekable(stub_record):
+    data = stub_record.as_marc21()
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, data)
+    os.close(write_fd)
+    with open(read_fd, "rb") as pipe:
+        spooled = spool_stream(pipe)
+        assert spooled.seekable() is True
+        assert spooled.read() == data
+
+
+def test_write_state(state_dir):
+    write_state("foo.json", {"LEILA": [1.0, 2.0]})
+    assert get_state_path("foo.json") == str(state_dir / "foo.json")
+    assert read_state("foo.json") == {"LEILA": [1.0, 2.0]}
+    write_state("foo.json", {"LEILA": [3.0]})
+    assert read_state("foo.json") == {"LEILA": [3.0]}
+    assert os.listdir(state_dir) == ["foo.json"]
+
+
+def test_tune_session_not_sftp(stub_client):
+    client = connect("leila")
+    session = client.session
+    tune_session(client, compression=True)
+    assert client.session is session
+
+
 def test_write_data_to_sheet(mock_sheet_config):
     data = write_data_to_sheet(
         {"file_name": ["foo.mrc"], "vendor_code": ["FOO"]}, test=False
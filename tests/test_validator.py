@@ -1,5 +1,13 @@
 import datetime
+import io
+import socket
+
 import pytest
+from vendor_file_cli.config import get_required_tags, load_vendor_configs
+from vendor_file_cli.deadlines import Deadline, OperationTimeout
+from vendor_file_cli.dedupe import HashIndex
+from vendor_file_cli.memo import ValidationMemo
+from vendor_file_cli.throttle import Throttle
 from vendor_file_cli.validator import (
     get_single_file,
     get_vendor_file_list,
@@ -68,6 +76,99 @@ def test_get_single_file_bakertaylor_bpl_root(stub_client, stub_file_info, caplo
     )
 
 
+def test_get_single_file_throttled(stub_client, stub_file_info, monkeypatch):
+    monkeypatch.setenv("EASTVIEW_OPS_PER_SECOND", "1")
+    monkeypatch.setenv("NSDROP_BYTES_PER_SECOND", "100")
+    waits = []
+    throttle = Throttle(sleep=waits.append)
+    get_single_file(
+        vendor="eastview",
+        file=stub_file_info,
+        vendor_client=stub_client("eastview"),
+        nsdrop_client=stub_client("nsdrop"),
+        test=True,
+        throttle=throttle,
+    )
+    assert waits == []
+    get_single_file(
+        vendor="eastview",
+        file=stub_file_info,
+        vendor_client=stub_client("eastview"),
+        nsdrop_client=stub_client("nsdrop"),
+        test=True,
+        throttle=throttle,
+    )
+    assert waits and waits[0] == pytest.approx(1, abs=0.1)
+
+
+def test_get_single_file_dedupe_skip(stub_client, stub_file_info, caplog):
+    hashes = HashIndex()
+    copied = []
+    for file_name in ["foo.mrc", "bar.mrc", "bar.mrc"]:
+        stub_file_info.file_name = file_name
+        copied_file = get_single_file(
+            vendor="eastview",
+            file=stub_file_info,
+            vendor_client=stub_client("eastview"),
+            nsdrop_client=stub_client("nsdrop"),
+            test=True,
+            hashes=hashes,
+        )
+        copied.append(copied_file is not None)
+    assert copied == [True, False, False]
+    assert "(NSDROP) Writing foo.mrc to `NSDROP/vendor_records/eastview`" in caplog.text
+    assert "Writing bar.mrc" not in caplog.text
+    assert "Validating eastview file: bar.mrc" not in caplog.text
+    assert (
+        "(EASTVIEW) bar.mrc has the same content as "
+        "NSDROP/vendor_records/eastview/foo.mrc. Not copying to NSDROP."
+    ) in caplog.text
+    assert (
+        "(EASTVIEW) Skipping bar.mrc: same content as "
+        "NSDROP/vendor_records/eastview/foo.mrc"
+    ) in caplog.text
+
+
+def test_get_single_file_dedupe_marker(stub_client, stub_file_info, caplog):
+    hashes = HashIndex("marker")
+    for vendor, file_name in [("leila", "foo.mrc"), ("eastview", "bar.mrc")]:
+        stub_file_info.file_name = file_name
+        get_single_file(
+            vendor=vendor,
+            file=stub_file_info,
+            vendor_client=stub_client(vendor),
+            nsdrop_client=stub_client("nsdrop"),
+            test=True,
+            hashes=hashes,
+        )
+    assert (
+        "(NSDROP) Writing bar.mrc.duplicate to `NSDROP/vendor_records/eastview`"
+        in caplog.text
+    )
+    assert "Writing bar.mrc to" not in caplog.text
+
+
+def test_get_single_file_timeout(stub_client, stub_file_info, monkeypatch, caplog):
+    vendor_client = stub_client("eastview")
+
+    def stalled_get_file(**kwargs):
+        raise socket.timeout("timed out")
+
+    monkeypatch.setattr(vendor_client, "get_file", stalled_get_file)
+    with pytest.raises(OperationTimeout):
+        get_single_file(
+            vendor="eastview",
+            file=stub_file_info,
+            vendor_client=vendor_client,
+            nsdrop_client=stub_client("nsdrop"),
+            test=True,
+            deadline=Deadline(timeouts={"get": 5}),
+        )
+    assert "(EASTVIEW) Get timed out after 5s." in caplog.text
+    assert "(EASTVIEW) Client session closed" in caplog.text
+    assert "Writing foo.mrc" not in caplog.text
+
+
 @pytest.mark.parametrize("vendor", ["midwest_nypl", "bakertaylor_bpl"])
 def test_get_vendor_file_list(stub_client, vendor, caplog):
     file_list = []
@@ -100,9 +201,10 @@ def test_get_vendor_file_list(stub_client, vendor, caplog):
         ("midwest_nypl", "MIDWEST_NYPL"),
     ],
 )
-def test_validate_file(stub_file, vendor, vendor_code, mock_sheet_config):
-    out_dict = validate_file(stub_file, vendor, test=True)
-    assert sorted([i for i in out_dict.keys()]) == sorted(
+def test_validate_file(stub_file, vendor, vendor_code, sheet_rows):
+    out = validate_file(stub_file, vendor, test=True)
+    assert out == {"file_name": "foo.mrc", "record_count": 1, "invalid_count": 0}
+    assert sorted([i for i in sheet_rows.keys()]) == sorted(
         [
             "valid",
             "record_number",
@@ -120,7 +222,115 @@ def test_validate_file(stub_file, vendor, vendor_code, mock_sheet_config):
             "order_item_mismatches",
         ]
     )
-    assert out_dict["vendor_code"] == [vendor_code]
+    assert sheet_rows["vendor_code"] == [vendor_code]
+
+
+def test_validate_file_batches(stub_file, stub_record, monkeypatch):
+    stub_file.file_stream = io.BytesIO(stub_record.as_marc21() * 5)
+    batches = []
+    monkeypatch.setattr(
+        "vendor_file_cli.validator.write_data_to_sheet",
+        lambda values, test: batches.append(values["record_number"]),
+    )
+    out = validate_file(stub_file, "eastview", test=True, batch_size=2)
+    assert batches == [["1 of 5", "2 of 5"], ["3 of 5", "4 of 5"], ["5 of 5"]]
+    assert out["record_count"] == 5
+
+
+def test_validate_file_marcxml(stub_file, stub_marcxml, sheet_rows):
+    stub_file.file_stream = io.BytesIO(stub_marcxml)
+    validate_file(stub_file, "eastview", test=True)
+    assert sheet_rows["record_number"] == ["1 of 2", "2 of 2"]
+    assert sheet_rows["valid"] == ["True", "True"]
+    assert sheet_rows["control_number"] == ["on1381158740", "on1381158740"]
+
+
+def test_validate_file_marcxml_invalid(stub_file, stub_marcxml, sheet_rows, caplog):
+    stub_file.file_stream = io.BytesIO(stub_marcxml[:-30])
+    out = validate_file(stub_file, "eastview", test=True)
+    assert out == {"file_name": "foo.mrc", "record_count": 2, "invalid_count": 1}
+    assert sheet_rows["record_number"] == ["1 of 2", "2 of 2"]
+    assert sheet_rows["valid"] == ["True", "False"]
+    assert sheet_rows["invalid_fields"] == ["", "['marcxml']"]
+    assert sheet_rows["control_number"] == ["on1381158740", "None"]
+    assert "Unable to parse MARCXML: " in caplog.text
+
+
+def test_validate_file_memo(stub_file, stub_record, monkeypatch, sheet_rows):
+    stub_file.file_stream = io.BytesIO(stub_record.as_marc21() * 3)
+    calls = []
+    monkeypatch.setattr(
+        "vendor_file_cli.validator.RecordModel", lambda **kwargs: calls.append(1)
+    )
+    memo = ValidationMemo(max_entries=10, version="1.0")
+    validate_file(stub_file, "eastview", test=True, memo=memo)
+    assert len(calls) == 1
+    assert (memo.hits, memo.misses) == (2, 1)
+    assert sheet_rows["record_number"] == ["1 of 3", "2 of 3", "3 of 3"]
+    assert sheet_rows["valid"] == ["True", "True", "True"]
+    key = memo.key(stub_record.as_marc21(), get_required_tags("eastview"))
+    assert "record_number" not in memo.get(key)
+
+
+def test_validate_file_malformed_record(stub_file, stub_record, sheet_rows):
+    data = stub_record.as_marc21()
+    stub_file.file_stream = io.BytesIO(data[:12] + b"00099" + data[17:] + data)
+    out = validate_file(stub_file, "eastview", test=True)
+    assert out["invalid_count"] == 1
+    assert sheet_rows["valid"] == ["False", "True"]
+    assert sheet_rows["invalid_fields"] == ["['leader']", ""]
+    assert sheet_rows["control_number"] == ["None", "on1381158740"]
+
+
+def test_validate_file_pymarc_fallback(stub_file, stub_record, sheet_rows):
+    data = stub_record.as_marc21()
+    stub_file.file_stream = io.BytesIO(data[:48] + b"#" + data[49:])
+    out = validate_file(stub_file, "eastview", test=True)
+    assert out["invalid_count"] == 0
+    assert sheet_rows["valid"] == ["True"]
+    assert sheet_rows["control_number"] == ["on1381158740"]
+
+
+def test_validate_file_required_tags(
+    stub_file, monkeypatch, mock_vendor_creds, sheet_rows
+):
+    monkeypatch.setenv("EASTVIEW_REQUIRED_TAGS", "001,960")
+    monkeypatch.setattr(
+        "vendor_file_cli.validator.validate_single_record",
+        lambda record: pytest.fail("record should not reach the RecordModel"),
+    )
+    validate_file(stub_file, "eastview", test=True)
+    assert sheet_rows["valid"] == ["False"]
+    assert sheet_rows["missing_fields"] == ["['960']"]
+    assert sheet_rows["control_number"] == ["on1381158740"]
+
+
+def test_validate_file_default_required_tags(
+    stub_file, stub_record, monkeypatch, mock_vendor_creds, sheet_rows
+):
+    monkeypatch.setattr(
+        "vendor_file_cli.validator.validate_single_record",
+        lambda record: pytest.fail("record should not reach the RecordModel"),
+    )
+    stub_record.remove_fields("852")
+    stub_file.file_stream = io.BytesIO(stub_record.as_marc21())
+    validate_file(stub_file, "eastview", test=True)
+    assert sheet_rows["valid"] == ["False"]
+    assert sheet_rows["missing_fields"] == ["['852']"]
+
+
+def test_validate_file_memo_required_tags(
+    stub_file, stub_record, monkeypatch, mock_vendor_creds, sheet_rows
+):
+    memo = ValidationMemo(max_entries=10, version="1.0")
+    validate_file(stub_file, "eastview", test=True, memo=memo)
+    monkeypatch.setenv("EASTVIEW_REQUIRED_TAGS", "001,960")
+    load_vendor_configs.cache_clear()
+    stub_file.file_stream = io.BytesIO(stub_record.as_marc21())
+    validate_file(stub_file, "eastview", test=True, memo=memo)
+    assert memo.hits == 0
+    assert sheet_rows["valid"] == ["True", "False"]
+    assert sheet_rows["missing_fields"] == ["", "['960']"]
 
 
 def test_validate_single_record(mock_valid_record):
@@ -1,26 +1,109 @@
+import json
 import logging
-import logging.config
 import os
+from typing import Optional
 
 import click
 
 from vendor_file_cli.commands import get_vendor_files, validate_files
-from vendor_file_cli.utils import create_logger_dict, get_vendor_list, load_creds
+from vendor_file_cli.config import load_vendor_configs
+from vendor_file_cli.connections import check_connections, format_checks
+from vendor_file_cli.daemon import FetchDaemon
+from vendor_file_cli.dedupe import DEDUPE_MODES
+from vendor_file_cli.logs import LOG_FORMATS, configure_logging, parse_log_levels
+from vendor_file_cli.sharding import Shard
+from vendor_file_cli.utils import get_vendor_list, load_creds
 
 logger = logging.getLogger("vendor_file_cli")
 
 
+def _parse_log_levels(
+    ctx: click.Context, param: click.Parameter, value: tuple[str, ...]
+) -> dict[str, str]:
+    try:
+        return parse_log_levels(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def _parse_shard(
+    ctx: click.Context, param: click.Parameter, value: Optional[str]
+) -> Optional[Shard]:
+    if value is None:
+        return None
+    try:
+        return Shard.parse(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+shard_option = click.option(
+    "--shard",
+    "shard",
+    callback=_parse_shard,
+    help="Only copy files assigned to shard K of N workers (eg. 1/3).",
+)
+workers_option = click.option(
+    "--workers",
+    "-w",
+    "workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of files to copy at the same time.",
+)
+deadline_option = click.option(
+    "--deadline",
+    "deadline",
+    type=click.IntRange(min=1),
+    help="Stop copying files after this many minutes.",
+)
+dedupe_option = click.option(
+    "--dedupe",
+    "dedupe",
+    type=click.Choice(DEDUPE_MODES),
+    help="Skip files whose content is already on NSDROP or copy a marker instead.",
+)
+lease_dir_option = click.option(
+    "--lease-dir",
+    "lease_dir",
+    type=click.Path(file_okay=False),
+    help="Local directory to store leases in for a sharded run.",
+)
+resume_option = click.option(
+    "--resume",
+    is_flag=True,
+    help="Resume the previous run if it was interrupted.",
+)
+cache_option = click.option(
+    "--cache",
+    is_flag=True,
+    help="Keep a local copy of files on NSDROP to validate them again later.",
+)
+
+
 @click.group
-def vendor_file_cli() -> None:
+@click.option(
+    "--log-format",
+    "log_format",
+    type=click.Choice(LOG_FORMATS),
+    default="text",
+    help="Format of log output.",
+)
+@click.option(
+    "--log-level",
+    "log_levels",
+    multiple=True,
+    callback=_parse_log_levels,
+    help="Log level for all loggers (eg. INFO) or one (eg. file_retriever=WARNING).",
+)
+def vendor_file_cli(log_format: str, log_levels: dict[str, str]) -> None:
     """CLI for retrieving and validating files from vendor FTP/SFTP servers."""
     if any("NSDROP" in i for i in os.environ.keys()) is False:
         logger.debug(
             "Vendor credentials not in environment variables. Loading from file."
         )
         load_creds()
-    logger_dict = create_logger_dict()
-    logging.config.dictConfig(logger_dict)
-    pass
+    configure_logging(log_format=log_format, levels=log_levels)
 
 
 @vendor_file_cli.command(
@@ -28,7 +111,29 @@ def vendor_file_cli() -> None:
     short_help="Retrieve and validate files that are not in NSDROP.",
 )
 @click.option("--test", is_flag=True, help="Run in test mode.")
-def get_all_vendor_files(test) -> None:
+@click.option(
+    "--pipeline",
+    is_flag=True,
+    help="Validate files in the background while the next file is copied.",
+)
+@shard_option
+@lease_dir_option
+@workers_option
+@deadline_option
+@dedupe_option
+@resume_option
+@cache_option
+def get_all_vendor_files(
+    test: bool,
+    pipeline: bool,
+    shard: Optional[Shard],
+    lease_dir: Optional[str],
+    workers: int,
+    deadline: Optional[int],
+    dedupe: Optional[str],
+    resume: bool,
+    cache: bool,
+) -> None:
     """
     Retrieve files from vendor server which were created in last year and are not
     present in vendor's NSDROP directory. Creates list of files on vendor server
@@ -38,9 +143,27 @@ def get_all_vendor_files(test) -> None:
     to google sheet. Files are copied to NSDROP/vendor_records/{vendor_name}.
 
     If test flag is passed, the output of any validation is written to a test sheet.
+    If pipeline flag is passed, files are validated and the output is written to the
+    google sheet while the next file is being copied. If a shard is passed, only the
+    vendors and files assigned to that shard are copied. If more than one worker
+    is passed, files are copied in parallel, largest files first. If a deadline
+    is passed, the run stops after that many minutes. If dedupe is passed, files
+    whose content is already on NSDROP are skipped or replaced with a marker.
+    If resume is passed and the previous run was interrupted, vendors and files
+    it finished are skipped. Otherwise a new run is started, with a warning if
+    the previous run was interrupted. If cache is passed, copied files are kept
+    in the local content cache.
 
     Args:
         test: flag to run in test mode
+        pipeline: flag to validate files concurrently with transfers
+        shard: shard of the run to copy files for
+        lease_dir: local directory to store leases in for a sharded run
+        workers: number of files to copy at the same time
+        deadline: number of minutes the run may take
+        dedupe: what to do with files whose content is already on NSDROP
+        resume: flag to resume the previous run if it was interrupted
+        cache: flag to keep copied files in the local content cache
 
     Returns:
         None
@@ -50,7 +173,19 @@ def get_all_vendor_files(test) -> None:
         logger.info("Running in test mode.")
 
     vendor_list = get_vendor_list()
-    get_vendor_files(vendors=vendor_list, days=30, test=test)
+    get_vendor_files(
+        vendors=vendor_list,
+        days=30,
+        test=test,
+        pipeline=pipeline,
+        shard=shard,
+        lease_dir=lease_dir,
+        workers=workers,
+        deadline=deadline,
+        dedupe=dedupe,
+        resume=resume,
+        cache=cache,
+    )
 
 
 @vendor_file_cli.command("available-vendors", short_help="List all configured vendors.")
@@ -60,6 +195,34 @@ def get_available_vendors() -> None:
     click.echo(f"Available vendors: {vendor_list}")
 
 
+@vendor_file_cli.command(
+    "check-connections",
+    short_help="Time connections to NSDROP and all vendor servers.",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the results as JSON.")
+def check_vendor_connections(as_json: bool) -> None:
+    """
+    Connect to NSDROP and every vendor's server at the same time and print how
+    long each server took to resolve its hostname, accept a TCP connection,
+    open an authenticated session and list its `_SRC` directory. Exits with
+    status 1 if any server could not be reached.
+
+    Args:
+        as_json: flag to print the results as JSON rather than a table
+
+    Returns:
+        None
+
+    """
+    checks = check_connections(["NSDROP", *get_vendor_list()])
+    if as_json:
+        click.echo(json.dumps([i.to_dict() for i in checks], indent=2))
+    else:
+        click.echo(format_checks(checks))
+    if not all(i.ok for i in checks):
+        raise SystemExit(1)
+
+
 @vendor_file_cli.command(
     "validate-file",
     short_help="Validate vendor file on NSDROP.",
@@ -73,11 +236,15 @@ def get_available_vendors() -> None:
 @click.option(
     "--file",
     "-f",
-    "file",
-    help="The file you would like to validate.",
+    "files",
+    multiple=True,
+    help="The file you would like to validate. Accepts glob patterns (eg. *.mrc).",
 )
 @click.option("--test", is_flag=True, help="Run in test mode.")
-def validate_vendor_files(vendor: str, file: str, test: bool) -> None:
+@cache_option
+def validate_vendor_files(
+    vendor: str, files: tuple[str, ...], test: bool, cache: bool
+) -> None:
     """
     Validate files for a specific vendor.
 
@@ -85,12 +252,18 @@ def validate_vendor_files(vendor: str, file: str, test: bool) -> None:
         vendor:
             name of vendor to validate files for. files will be validated for
             the specified vendor
-        file:
-            name of file to validate
+        files:
+            names of files or glob patterns to validate. if none are passed,
+            all of the vendor's files on NSDROP are validated
+        test:
+            flag to run in test mode
+        cache:
+            flag to read files from and add them to the local content cache
     Returns:
         None
     """
-    if vendor.upper() not in ["EASTVIEW", "LEILA", "AMALIVRE_SASB"]:
+    config = load_vendor_configs().get(vendor.upper())
+    if config is None or not config.validate:
         click.echo(
             "Vendor not supported for validation."
             "Only EASTVIEW, LEILA, and AMALIVRE_SASB supported."
@@ -98,7 +271,7 @@ def validate_vendor_files(vendor: str, file: str, test: bool) -> None:
         return
     if test:
         logger.info("Running in test mode.")
-    validate_files(vendor=vendor, files=[file], test=test)
+    validate_files(vendor=vendor, files=list(files) or None, test=test, cache=cache)
 
 
 @vendor_file_cli.command(
@@ -129,7 +302,31 @@ def validate_vendor_files(vendor: str, file: str, test: bool) -> None:
     type=int,
     help="How many hours back to retrieve files.",
 )
-def get_recent_vendor_files(vendor: str, days: int, hours: int) -> None:
+@click.option(
+    "--pipeline",
+    is_flag=True,
+    help="Validate files in the background while the next file is copied.",
+)
+@shard_option
+@lease_dir_option
+@workers_option
+@deadline_option
+@dedupe_option
+@resume_option
+@cache_option
+def get_recent_vendor_files(
+    vendor: str,
+    days: int,
+    hours: int,
+    pipeline: bool,
+    shard: Optional[Shard],
+    lease_dir: Optional[str],
+    workers: int,
+    deadline: Optional[int],
+    dedupe: Optional[str],
+    resume: bool,
+    cache: bool,
+) -> None:
     """
     Retrieve files from remote server for specified vendor(s).
 
@@ -143,6 +340,22 @@ def get_recent_vendor_files(vendor: str, days: int, hours: int) -> None:
             number of days to go back and retrieve files from
         hours:
             number of hours to go back and retrieve files from
+        pipeline:
+            whether to validate files concurrently with transfers
+        shard:
+            shard of the run to copy files for
+        lease_dir:
+            local directory to store leases in for a sharded run
+        workers:
+            number of files to copy at the same time
+        deadline:
+            number of minutes the run may take
+        dedupe:
+            what to do with files whose content is already on NSDROP
+        resume:
+            whether to resume the previous run if it was interrupted
+        cache:
+            whether to keep copied files in the local content cache
 
     Returns:
         None
@@ -153,7 +366,114 @@ def get_recent_vendor_files(vendor: str, days: int, hours: int) -> None:
         vendor_list = all_available_vendors
     else:
         vendor_list = [i.upper() for i in vendor]
-    get_vendor_files(vendors=vendor_list, days=days, hours=hours)
+    get_vendor_files(
+        vendors=vendor_list,
+        days=days,
+        hours=hours,
+        pipeline=pipeline,
+        shard=shard,
+        lease_dir=lease_dir,
+        workers=workers,
+        deadline=deadline,
+        dedupe=dedupe,
+        resume=resume,
+        cache=cache,
+    )
+
+
+@vendor_file_cli.command(
+    "serve", short_help="Poll vendor servers and copy new files to NSDROP."
+)
+@click.option(
+    "--vendor",
+    "-v",
+    "vendor",
+    type=str,
+    multiple=True,
+    help="Vendor to poll. All vendors are polled if not provided.",
+)
+@click.option(
+    "--interval",
+    "-i",
+    "interval",
+    default=15,
+    type=int,
+    help="Default number of minutes between polls of each vendor.",
+)
+@click.option(
+    "--days",
+    "-d",
+    "days",
+    default=30,
+    type=int,
+    help="How many days back to retrieve files.",
+)
+@click.option("--test", is_flag=True, help="Run in test mode.")
+@click.option(
+    "--pipeline",
+    is_flag=True,
+    help="Validate files in the background while the next file is copied.",
+)
+@click.option(
+    "--adaptive",
+    is_flag=True,
+    help="Poll vendors more often around their usual delivery times.",
+)
+@dedupe_option
+@cache_option
+def serve(
+    vendor: tuple[str, ...],
+    interval: int,
+    days: int,
+    test: bool,
+    pipeline: bool,
+    adaptive: bool,
+    dedupe: Optional[str],
+    cache: bool,
+) -> None:
+    """
+    Run until stopped, polling each vendor's server on its own interval and
+    copying new files to NSDROP. Sessions are kept open between polls. Send
+    SIGINT or SIGTERM to stop after the current poll and SIGHUP to reload
+    vendor credentials.
+
+    Args:
+        vendor:
+            name of vendor to poll. multiple values can be passed. if none are
+            passed all vendors are polled
+        interval:
+            number of minutes between polls of vendors that do not have a
+            `{VENDOR}_POLL_INTERVAL` configured
+        days:
+            number of days to go back and retrieve files from
+        test:
+            flag to run in test mode
+        pipeline:
+            flag to validate files concurrently with transfers
+        adaptive:
+            flag to adapt each vendor's polling interval to its delivery history
+        dedupe:
+            what to do with files whose content is already on NSDROP
+        cache:
+            flag to keep copied files in the local content cache
+
+    Returns:
+        None
+
+    """
+    if test:
+        logger.info("Running in test mode.")
+    daemon = FetchDaemon(
+        vendors=list(vendor),
+        interval=interval,
+        days=days,
+        test=test,
+        pipeline=pipeline,
+        adaptive=adaptive,
+        dedupe=dedupe,
+        cache=cache,
+    )
+    daemon.run()
 
 
 def main():
@@ -0,0 +1,241 @@
+"""Size-bounded local cache of the contents of files copied to NSDROP."""
+
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+from file_retriever import File, FileInfo
+
+from vendor_file_cli.config import get_cache_size
+from vendor_file_cli.utils import CHUNK_SIZE, file_lock, get_state_path
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+
+class MappedStream(io.RawIOBase):
+    """
+    Read-only stream over a memory-mapped file. Reads are served from the
+    operating system's page cache, and `getbuffer` returns a view of the whole
+    file without copying it.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path: path to the file to map
+        """
+        super().__init__()
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        if not self.closed:
+            with contextlib.suppress(BufferError):
+                self._map.close()
+        super().close()
+
+    def getbuffer(self) -> memoryview:
+        """Return a read-only view of the contents of the file."""
+        return memoryview(self._map)
+
+    def getvalue(self) -> bytes:
+        """Return the contents of the file."""
+        return self._map[:]
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            return self._map.read()
+        return self._map.read(size)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        start = self._map.tell()
+        data = self.getbuffer()[start : start + len(buffer)]
+        buffer[: len(data)] = data
+        self._map.seek(start + len(data))
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._map.seek(offset, whence)
+        return self._map.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._map.tell()
+
+
+class ContentCache:
+    """
+    Cache of the contents of files on NSDROP, stored in a local directory and
+    evicted least recently used first once the cache holds more than
+    `max_bytes`. Entries are keyed by the file's path on NSDROP and are only
+    used if the size and modification time of the file have not changed.
+
+    The index of entries is stored as JSON in the cache directory. It is read,
+    changed and written back while holding a lock file next to it, so the cache
+    can be shared by several processes.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Args:
+            directory:
+                directory to store cached files in (default None). if None, the
+                `cache` directory in the state directory is used
+            max_bytes:
+                maximum number of bytes to cache (default None). if None, the
+                size from `get_cache_size` is used. if 0, nothing is cached
+            clock: function returning the current time in seconds
+        """
+        self.directory = directory or get_state_path("cache")
+        self.max_bytes = max_bytes if max_bytes is not None else get_cache_size()
+        self._clock = clock
+        self.lock_path = os.path.join(self.directory, f"{INDEX_FILE}.lock")
+        self._lock = threading.Lock()
+        if self.max_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), "r") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read content cache index: {e}")
+            return {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def _save(self, index: dict[str, dict]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump(index, fh)
+            os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+        except OSError as e:
+            logger.warning(f"Unable to write content cache index: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+
+    def evict(self, index: dict[str, dict]) -> None:
+        """
+        Remove the least recently used entries from `index` and delete their
+        files until the entries take up no more than `max_bytes`.
+        """
+        total = sum(i["size"] for i in index.values())
+        for key in sorted(index, key=lambda k: index[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= index.pop(key)["size"]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Unable to remove {key} from content cache: {e}")
+                continue
+            logger.debug(f"Evicted {key} from content cache")
+
+    def get(self, remote_dir: str, file: FileInfo) -> Optional[File]:
+        """
+        Return a cached copy of a file on NSDROP if its size and modification
+        time match `file`. The copy is opened as a `MappedStream`.
+
+        Args:
+            remote_dir: directory on NSDROP containing the file
+            file: `FileInfo` object for the file on NSDROP
+
+        Returns:
+            `File` object read from the cache or None if the file is not cached
+            or has changed
+        """
+        if not self.max_bytes:
+            return None
+        key = posixpath.join(remote_dir, file.file_name)
+        with self._lock, file_lock(self.lock_path):
+            index = self._load()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            mtime = int(file.file_mtime or 0)
+            if entry["size"] != file.file_size or int(entry["mtime"]) != mtime:
+                logger.debug(f"Cached copy of {key} is out of date")
+                return None
+            try:
+                stream = MappedStream(self._path(key))
+            except (OSError, ValueError):
+                index.pop(key)
+                self._save(index)
+                return None
+            entry["used"] = self._clock()
+            self._save(index)
+        logger.debug(f"Reading {key} from content cache")
+        return File.from_fileinfo(file, stream)
+
+    def put(self, remote_dir: str, file: File, info: Optional[FileInfo] = None) -> None:
+        """
+        Add the contents of a file on NSDROP to the cache. The file's stream is
+        read from the start and rewound afterwards. Files larger than
+        `max_bytes`, empty files and files whose contents do not match the size
+        in `info` are not cached.
+
+        Args:
+            remote_dir: directory on NSDROP containing the file
+            file: `File` object with the contents of the file
+            info:
+                `FileInfo` object for the copy of the file on NSDROP (default
+                None). if None, the size and modification time of `file` are used
+        """
+        info = info or file
+        if not self.max_bytes or not info.file_size or info.file_size > self.max_bytes:
+            return
+        key = posixpath.join(remote_dir, file.file_name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            file.file_stream.seek(0)
+            with os.fdopen(fd, "wb") as fh:
+                shutil.copyfileobj(file.file_stream, fh, CHUNK_SIZE)
+                size = fh.tell()
+            file.file_stream.seek(0)
+            if size != info.file_size:
+                logger.debug(f"Not caching {key}: size does not match NSDROP")
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Unable to cache {key}: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return
+        with self._lock, file_lock(self.lock_path):
+            index = self._load()
+            index[key] = {
+                "size": info.file_size,
+                "mtime": info.file_mtime,
+                "used": self._clock(),
+            }
+            self.evict(index)
+            self._save(index)
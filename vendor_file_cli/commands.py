@@ -1,26 +1,71 @@
 """This module contains functions in CLI commands."""
 
+import contextlib
 import logging
 import logging.handlers
 import datetime
-import os
+from typing import Optional
+from file_retriever import FileInfo
 from file_retriever.errors import FileRetrieverError
+from vendor_file_cli.cache import ContentCache
+from vendor_file_cli.config import get_vendor_config
+from vendor_file_cli.deadlines import (
+    Deadline,
+    DeadlineExceeded,
+    OperationTimeout,
+    released,
+)
+from vendor_file_cli.dedupe import MARKER_SUFFIX, HashIndex
+from vendor_file_cli.journal import RunJournal
+from vendor_file_cli.listing import list_directory
+from vendor_file_cli.pipeline import ValidationPipeline
+from vendor_file_cli.sharding import Shard, claim_file, open_lease_store
+from vendor_file_cli.throttle import Throttle
+from vendor_file_cli.transfers import list_transfer_tasks, run_transfers
 from vendor_file_cli.validator import (
     validate_file,
     get_single_file,
     get_vendor_file_list,
 )
-from vendor_file_cli.utils import connect
+from vendor_file_cli.utils import connect, fetch_file
 
 
 logger = logging.getLogger(__name__)
 
 
+def _finish_run(
+    journal: RunJournal, vendors: list[str], deadline: Optional[Deadline]
+) -> None:
+    # vendors are finished once every file listed for them has been copied and
+    # the run once it has not been cut short by its deadline. a run that was cut
+    # short is still closed so that its journal records why it ended
+    for vendor in vendors:
+        planned = journal.plan(vendor)
+        if (
+            planned is not None
+            and not journal.is_finished(vendor)
+            and not journal.pending(vendor, planned)
+        ):
+            journal.record_vendor_done(vendor)
+    if deadline is not None and deadline.expired():
+        journal.stop()
+    else:
+        journal.finish()
+
+
 def get_vendor_files(
     vendors: list[str],
     days: int = 0,
     hours: int = 0,
     test: bool = False,
+    pipeline: bool = False,
+    shard: Optional[Shard] = None,
+    lease_dir: Optional[str] = None,
+    workers: int = 1,
+    deadline: Optional[int] = None,
+    dedupe: Optional[str] = None,
+    resume: bool = False,
+    cache: bool = False,
 ) -> None:
     """
     Retrieve files from remote server for vendors in `vendor_list`. Forms timedelta
@@ -31,74 +76,229 @@ def get_vendor_files(
     the files that are not already present in the NSDROP directory. Will validate files
     before copying if validate is True.
 
+    If `pipeline` is True, files are validated and validation output is written to
+    the google sheet on background threads while the next file is being copied.
+
+    If a `shard` is provided, only the vendors and files assigned to that shard are
+    copied. Each file is copied while holding a lease in `lease_dir` (or on NSDROP
+    if `lease_dir` is None) so that workers running other shards never copy the
+    same file.
+
+    If `workers` is more than 1, the files for all vendors are listed first and
+    then copied on `workers` threads, largest files first. The number of
+    concurrent transfers to each host is tuned from observed throughput and
+    never goes above the host's `max_sessions`.
+
+    Transfers are rate limited by the bytes and transfers per second allowed for
+    each server in its `VendorConfig` and by the global rate limits. If `cache`
+    is True, copied files are added to the local `ContentCache`.
+
+    If `dedupe` is `skip` or `marker`, files whose content has already been
+    copied to NSDROP from any vendor are not copied again (see `HashIndex`).
+
+    A read from a server that stops responding fails after the longest of the
+    timeouts from `get_operation_timeouts`. If a `deadline` is provided, each
+    connection and listing is also limited by its own timeout, downloads and
+    uploads time out once they stop making progress and a vendor is skipped if
+    any of them time out. The run stops once it has taken that many minutes and
+    any vendors or files that have not been copied yet are skipped.
+
+    The run is recorded in a `RunJournal`. If `resume` is True and the previous
+    run with the same vendors, timeframe and shard did not finish, vendors it
+    finished are skipped, vendors it listed are not listed again and files it
+    copied are not copied again. If that run did not finish and `resume` is
+    False, a warning is logged and a new run is started.
+
     Args:
         vendors: list of vendor names
         days: number of days to retrieve files from (default 0)
         hours: number of hours to retrieve files from (default 0)
+        test: whether to write validation output to the test sheet (default False)
+        pipeline: whether to validate files concurrently with transfers
+        shard: `Shard` to copy files for (default None)
+        lease_dir: local directory to store leases in for a sharded run
+        workers: number of files to copy at the same time (default 1)
+        deadline: number of minutes the run may take (default None)
+        dedupe:
+            what to do with files whose content is already on NSDROP: `skip`
+            or `marker` (default None). if None, content is not checked
+        resume: whether to resume the previous run if it did not finish
+        cache: whether to add copied files to the local `ContentCache`
 
     Returns:
         None
 
     """
-    for vendor in vendors:
-        vendor_dst = os.environ[f"{vendor.upper()}_DST"]
-        try:
-            with connect("nsdrop") as nsdrop_client:
-                with connect(vendor) as vendor_client:
-                    files = get_vendor_file_list(
-                        vendor=vendor,
-                        timedelta=datetime.timedelta(days=days, hours=hours),
-                        nsdrop_client=nsdrop_client,
-                        vendor_client=vendor_client,
-                    )
-                    logger.info(
-                        f"({vendor_client.name}) {len(files)} file(s) on "
-                        f"{vendor_client.name} server to copy to NSDROP"
-                    )
-                    for file in files:
-                        get_single_file(
-                            vendor=vendor,
-                            file=file,
-                            vendor_client=vendor_client,
-                            nsdrop_client=nsdrop_client,
-                            test=test,
-                        )
-                    if len(files) > 0:
+    if shard is not None:
+        vendors = shard.vendors(vendors)
+        logger.info(f"Running shard {shard}: {len(vendors)} vendor(s) to check.")
+    throttle = Throttle()
+    content_cache = ContentCache() if cache else None
+    hashes = HashIndex(dedupe) if dedupe else None
+    run_deadline = Deadline(budget=deadline * 60) if deadline else None
+    journal = RunJournal(
+        {
+            "vendors": [i.upper() for i in vendors],
+            "days": days,
+            "hours": hours,
+            "shard": str(shard) if shard is not None else None,
+        },
+        resume=resume,
+    )
+    with (
+        journal,
+        ValidationPipeline(test=test)
+        if pipeline
+        else contextlib.nullcontext() as validation_pipeline,
+    ):
+        if workers > 1:
+            tasks = list_transfer_tasks(
+                vendors=vendors,
+                timedelta=datetime.timedelta(days=days, hours=hours),
+                shard=shard,
+                deadline=run_deadline,
+                journal=journal,
+            )
+            run_transfers(
+                tasks=tasks,
+                workers=workers,
+                test=test,
+                pipeline=validation_pipeline,
+                leases=shard is not None,
+                lease_dir=lease_dir,
+                throttle=throttle,
+                deadline=run_deadline,
+                cache=content_cache,
+                hashes=hashes,
+                journal=journal,
+            )
+            _finish_run(journal, vendors, run_deadline)
+            return
+        for i, vendor in enumerate(vendors):
+            vendor_dst = get_vendor_config(vendor).dst
+            if journal.is_finished(vendor):
+                logger.info(
+                    f"({vendor.upper()}) Finished in interrupted run. Skipping."
+                )
+                continue
+            planned = journal.plan(vendor)
+            if planned is not None and not journal.pending(vendor, planned):
+                journal.record_vendor_done(vendor)
+                continue
+            try:
+                with released(connect("nsdrop", run_deadline)) as nsdrop_client:
+                    with released(connect(vendor, run_deadline)) as vendor_client:
+                        if planned is None:
+                            files = get_vendor_file_list(
+                                vendor=vendor,
+                                timedelta=datetime.timedelta(days=days, hours=hours),
+                                nsdrop_client=nsdrop_client,
+                                vendor_client=vendor_client,
+                                deadline=run_deadline,
+                            )
+                            if shard is not None:
+                                files = shard.files(vendor, files)
+                            journal.record_plan(vendor, files)
+                        else:
+                            files = journal.pending(vendor, planned)
+                        leases = None
+                        if shard is not None:
+                            leases = open_lease_store(nsdrop_client, lease_dir)
                         logger.info(
-                            f"({nsdrop_client.name}) {len(files)} file(s) "
-                            f"copied to `{vendor_dst}`"
+                            f"({vendor_client.name}) {len(files)} file(s) on "
+                            f"{vendor_client.name} server to copy to NSDROP"
                         )
-        except FileRetrieverError:
-            continue
+                        copied = 0
+                        for file in files:
+                            with (
+                                claim_file(vendor, file, nsdrop_client, leases)
+                                if leases is not None
+                                else contextlib.nullcontext(True)
+                            ) as claimed:
+                                if not claimed:
+                                    continue
+                                copied_file = get_single_file(
+                                    vendor=vendor,
+                                    file=file,
+                                    vendor_client=vendor_client,
+                                    nsdrop_client=nsdrop_client,
+                                    test=test,
+                                    pipeline=validation_pipeline,
+                                    throttle=throttle,
+                                    deadline=run_deadline,
+                                    cache=content_cache,
+                                    hashes=hashes,
+                                )
+                                if copied_file is not None:
+                                    journal.record_copied(vendor, file)
+                                    copied += 1
+                        if copied > 0:
+                            logger.info(
+                                f"({nsdrop_client.name}) {copied} file(s) "
+                                f"copied to `{vendor_dst}`"
+                            )
+            except DeadlineExceeded:
+                logger.error(
+                    f"Run deadline exceeded. {len(vendors) - i} vendor(s) not "
+                    "finished."
+                )
+                break
+            except (FileRetrieverError, OperationTimeout):
+                continue
+        _finish_run(journal, vendors, run_deadline)
 
 
-def validate_files(vendor: str, files: list | None, test: bool) -> None:
+def validate_files(
+    vendor: str, files: list | None, test: bool, cache: bool = False
+) -> None:
     """
-    Validate files on NSDROP for a specific vendor.
+    Validate files on NSDROP for a specific vendor. The vendor's directory on
+    NSDROP is listed once and the requested file names are matched against the
+    listing, so names may also be glob patterns (eg. `*.mrc`). Files are
+    downloaded one after another over the same session. If `cache` is True,
+    files in the local `ContentCache` whose size and modification time match the
+    listing are read from the cache and the rest are added to the cache.
 
     Args:
         vendor:
             name of vendor
         files:
-            list of file names to validate (default None). If None, all
-            files in the vendor's directory on NSDROP will be validated.
+            list of file names or glob patterns to validate (default None). If
+            None, all files in the vendor's directory on NSDROP except
+            dedupe markers will be validated.
+        test:
+            whether to write validation output to the test sheet
+        cache:
+            whether to read and add files to the local `ContentCache`
 
     Returns:
         None
     """
-    file_dir = os.environ[f"{vendor.upper()}_DST"]
-    vendor_file_list = []
+    file_dir = get_vendor_config(vendor).dst
+    content_cache = ContentCache() if cache else None
     with connect("nsdrop") as nsdrop_client:
-        if files and files is not None:
-            for file in files:
-                vendor_file_list.append(
-                    nsdrop_client.get_file_info(file_name=file, remote_dir=file_dir)
+        listing = list_directory(nsdrop_client, file_dir)
+        vendor_file_list: dict[str, FileInfo] = {}
+        for pattern, matches in listing.match(files or ["*"]).items():
+            if not matches:
+                logger.warning(
+                    f"({nsdrop_client.name}) No files matching {pattern} in "
+                    f"`{file_dir}`"
+                )
+            for file in matches:
+                if files or not file.file_name.endswith(MARKER_SUFFIX):
+                    vendor_file_list.setdefault(file.file_name, file)
+        for file in vendor_file_list.values():
+            file_obj = None
+            if content_cache is not None:
+                file_obj = content_cache.get(file_dir, file)
+            if file_obj is None:
+                file_obj = fetch_file(nsdrop_client, file, file_dir)
+                if content_cache is not None:
+                    content_cache.put(file_dir, file_obj, file)
+            with contextlib.closing(file_obj.file_stream):
+                logger.debug(
+                    f"({nsdrop_client.name}) Validating {vendor} file: "
+                    f"{file_obj.file_name}"
                 )
-        else:
-            vendor_file_list.extend(nsdrop_client.list_file_info(remote_dir=file_dir))
-    for file in vendor_file_list:
-        client = connect("nsdrop")
-        file_obj = client.get_file(file=file, remote_dir=file_dir)
-        logger.debug(f"({client.name}) Validating {vendor} file: {file_obj.file_name}")
-        validate_file(file_obj=file_obj, vendor=vendor, test=test)
-        client.close()
+                validate_file(file_obj=file_obj, vendor=vendor, test=test)
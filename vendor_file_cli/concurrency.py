@@ -0,0 +1,141 @@
+"""Tune the number of concurrent transfers to each host from observed throughput."""
+
+import logging
+import threading
+from typing import Iterable, Optional
+
+from vendor_file_cli.config import load_vendor_configs
+from vendor_file_cli.utils import read_state, write_state
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INITIAL_LIMIT = 2
+
+
+class AIMDLimit:
+    """
+    Concurrency limit for a single host using additive increase/multiplicative
+    decrease. Completed transfers are grouped into windows of `limit`
+    transfers. At the end of each window the throughput of the window (bytes
+    copied divided by the time from the first transfer starting to the last one
+    finishing) is compared to that of the previous window. The limit is raised
+    by one if throughput improved by more than `tolerance` and lowered by one if
+    it got worse by more than `tolerance`. A failed transfer halves the limit,
+    unless the transfer started before the limit was last lowered.
+    """
+
+    def __init__(
+        self, name: str, limit: int, ceiling: int, tolerance: float = 0.05
+    ) -> None:
+        """
+        Args:
+            name: name of host (eg. EASTVIEW, NSDROP)
+            limit: starting limit
+            ceiling: maximum limit
+            tolerance: relative change in throughput that is ignored
+        """
+        self.name = name
+        self.ceiling = max(1, ceiling)
+        self.limit = min(max(1, limit), self.ceiling)
+        self.tolerance = tolerance
+        self._last_decrease = float("-inf")
+        self._previous: Optional[float] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._bytes = 0
+        self._count = 0
+        self._start = float("inf")
+        self._end = float("-inf")
+
+    def _set(self, limit: int) -> None:
+        limit = min(max(1, limit), self.ceiling)
+        if limit != self.limit:
+            change = "raised" if limit > self.limit else "lowered"
+            logger.info(f"({self.name}) Concurrency limit {change} to {limit}.")
+        self.limit = limit
+
+    def record(self, size: int, started: float, finished: float, ok: bool) -> None:
+        """
+        Record a completed transfer.
+
+        Args:
+            size: number of bytes transferred
+            started: time the transfer started as returned by `time.monotonic`
+            finished: time the transfer ended as returned by `time.monotonic`
+            ok: whether the transfer succeeded
+        """
+        if not ok:
+            if started >= self._last_decrease:
+                self._last_decrease = finished
+                self._previous = None
+                self._reset()
+                self._set(self.limit // 2)
+            return
+        self._bytes += size
+        self._count += 1
+        self._start = min(self._start, started)
+        self._end = max(self._end, finished)
+        if self._count < self.limit:
+            return
+        throughput = self._bytes / max(self._end - self._start, 1e-6)
+        previous = self._previous
+        self._previous = throughput
+        self._reset()
+        if previous is None or throughput > previous * (1 + self.tolerance):
+            self._set(self.limit + 1)
+        elif throughput < previous * (1 - self.tolerance):
+            self._set(self.limit - 1)
+
+
+class ConcurrencyController:
+    """
+    `AIMDLimit` for each host taking part in a run. Each host starts at the
+    limit it reached in the previous run (or `DEFAULT_INITIAL_LIMIT`) and can
+    not go above the `max_sessions` in its `VendorConfig`. The learned limits
+    are saved to `concurrency_limits.json` in the state directory.
+    """
+
+    state_file = "concurrency_limits.json"
+
+    def __init__(self, names: Iterable[str]) -> None:
+        """
+        Args:
+            names: names of hosts (eg. EASTVIEW, NSDROP)
+        """
+        learned = read_state(self.state_file)
+        configs = load_vendor_configs()
+        self.hosts: dict[str, AIMDLimit] = {}
+        for name in {i.upper() for i in names}:
+            config = configs.get(name)
+            self.hosts[name] = AIMDLimit(
+                name=name,
+                limit=int(learned.get(name, DEFAULT_INITIAL_LIMIT)),
+                ceiling=config.max_sessions if config else DEFAULT_INITIAL_LIMIT,
+            )
+        self._lock = threading.Lock()
+
+    def limit(self, name: str) -> int:
+        """Return the current concurrency limit for a host."""
+        host = self.hosts.get(name.upper())
+        return host.limit if host is not None else DEFAULT_INITIAL_LIMIT
+
+    def limits(self) -> dict[str, int]:
+        """Return the current concurrency limit for each host."""
+        return {name: host.limit for name, host in self.hosts.items()}
+
+    def record(
+        self, name: str, size: int, started: float, finished: float, ok: bool
+    ) -> None:
+        """Record a completed transfer to or from a host. See `AIMDLimit.record`."""
+        host = self.hosts.get(name.upper())
+        if host is None:
+            return
+        with self._lock:
+            host.record(size=size, started=started, finished=finished, ok=ok)
+
+    def save(self) -> None:
+        """Save the current limits to the state directory."""
+        state = read_state(self.state_file)
+        state.update(self.limits())
+        write_state(self.state_file, state)
@@ -0,0 +1,359 @@
+"""Vendor configuration built from credentials loaded into environment variables."""
+
+import functools
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+DEFAULT_MAX_SESSIONS = 16
+
+# Maximum number of bytes of file contents kept in the local content cache.
+DEFAULT_CACHE_SIZE = 1024**3
+
+# Maximum number of records whose validation output is remembered.
+DEFAULT_MEMO_SIZE = 10_000
+
+# Seconds each kind of operation on a server may take before it is cancelled.
+# Transfers (get and put) are cancelled after this many seconds without progress.
+DEFAULT_TIMEOUTS = {
+    "connect": 30.0,
+    "list": 120.0,
+    "get": 120.0,
+    "put": 120.0,
+    "sheet": 60.0,
+}
+
+# Suffixes accepted in rate limits, eg. "512K" or "1.5M" bytes per second.
+RATE_SUFFIXES = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+# Vendors whose files are validated and the code used for them in the google sheet.
+VALIDATION_CODES = {"AMALIVRE_SASB": "AUXAM", "EASTVIEW": "EVP", "LEILA": "LEILA"}
+
+# Codes used in the google sheet for vendors whose names contain these strings
+# (eg. AMALIVRE_SASB_2) when no code is set for the vendor itself.
+VENDOR_CODE_NAMES = {"AMALIVRE": "AUXAM", "EASTVIEW": "EVP", "LEILA": "LEILA"}
+
+# Tags of fields every record from these vendors must contain. Records missing one
+# are reported as invalid without being validated against the `RecordModel`.
+REQUIRED_TAGS = {
+    "AMALIVRE_SASB": ("001", "852"),
+    "EASTVIEW": ("001", "852"),
+    "LEILA": ("001", "852"),
+}
+
+# Additional directories on a vendor's server that contain files to copy to NSDROP.
+EXTRA_DIRS = {"BAKERTAYLOR_BPL": ("",)}
+
+# Prefixes of files that are stored in the root directory of a vendor's server
+# rather than in the vendor's `_SRC` directory.
+ROOT_PREFIXES = {"BAKERTAYLOR_BPL": ("ADD", "NEW")}
+
+
+class ConfigError(KeyError):
+    """A setting required for a server has not been loaded into the environment."""
+
+    def __str__(self) -> str:
+        return str(self.args[0])
+
+
+@dataclass(frozen=True)
+class VendorConfig:
+    """
+    Connection and processing settings for a vendor's server or NSDROP.
+
+    Attributes:
+        name: name of server (eg. EASTVIEW, NSDROP)
+        host: server's hostname
+        port: server's port
+        user: username for server
+        password: password for server
+        src_dir:
+            directory on the server containing the vendor's files or None if
+            {NAME}_SRC is not set. read it with `src`
+        dst_dir:
+            directory on NSDROP the vendor's files are copied to or None if
+            {NAME}_DST is not set. read it with `dst`
+        extra_dirs: other directories on the server to check for files
+        root_prefixes: prefixes of files stored in the root directory of the server
+        validation_code:
+            vendor code used when writing validation output to the google sheet.
+            files are only validated for vendors with a validation code
+        max_sessions:
+            maximum number of concurrent sessions to open to the server. the
+            number of sessions used in a parallel run is tuned up to this limit
+        poll_interval: minutes between polls of the server in daemon mode
+        shard_by_file:
+            whether a sharded run splits the vendor's files between workers
+            rather than assigning the whole vendor to one worker
+        bytes_per_second: maximum rate of transfers to or from the server
+        ops_per_second: maximum number of transfers per second to or from the server
+        compression: whether to compress the SSH transport to an SFTP server
+        required_tags:
+            tags of fields every record from the vendor must contain. records
+            missing one of them are reported as invalid without being
+            validated against the `RecordModel`
+    """
+
+    name: str
+    host: str
+    port: str
+    user: str
+    password: str = field(repr=False)
+    src_dir: Optional[str]
+    dst_dir: Optional[str]
+    extra_dirs: tuple[str, ...] = ()
+    root_prefixes: tuple[str, ...] = ()
+    validation_code: Optional[str] = None
+    max_sessions: int = DEFAULT_MAX_SESSIONS
+    poll_interval: Optional[int] = None
+    shard_by_file: bool = False
+    bytes_per_second: Optional[float] = None
+    ops_per_second: Optional[float] = None
+    compression: bool = False
+    required_tags: tuple[str, ...] = ()
+
+    @property
+    def dst(self) -> str:
+        """
+        Directory on NSDROP the vendor's files are copied to.
+
+        Raises:
+            ConfigError: if {NAME}_DST is not set
+        """
+        return _required(self.name, "DST", self.dst_dir)
+
+    @property
+    def src(self) -> str:
+        """
+        Directory on the server containing the vendor's files.
+
+        Raises:
+            ConfigError: if {NAME}_SRC is not set
+        """
+        return _required(self.name, "SRC", self.src_dir)
+
+    @property
+    def validate(self) -> bool:
+        """Whether files from this vendor should be validated."""
+        return self.validation_code is not None
+
+    @property
+    def vendor_code(self) -> str:
+        """Vendor code used when writing validation output to the google sheet."""
+        return self.validation_code or _vendor_code(self.name)
+
+    def remote_dir(self, file_name: str) -> str:
+        """Return the directory on the vendor's server that contains `file_name`."""
+        if self.root_prefixes and file_name.startswith(self.root_prefixes):
+            return ""
+        return self.src
+
+
+def _bool(value: Optional[str]) -> bool:
+    return value is not None and value.strip().lower() in ("1", "true", "yes")
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    return int(value)
+
+
+def _rate(value: Optional[str]) -> Optional[float]:
+    if value is None or not value.strip():
+        return None
+    value = value.strip().upper()
+    multiplier = RATE_SUFFIXES.get(value[-1], 1)
+    if value[-1] in RATE_SUFFIXES:
+        value = value[:-1]
+    rate = float(value) * multiplier
+    return rate if rate > 0 else None
+
+
+def _required(name: str, setting: str, value: Optional[str]) -> str:
+    if value is None:
+        raise ConfigError(
+            f"{name}_{setting} is not set. Add it to the credentials for {name}."
+        )
+    return value
+
+
+def _split(value: Optional[str]) -> Optional[tuple[str, ...]]:
+    if value is None:
+        return None
+    return tuple(i.strip() for i in value.split(","))
+
+
+def _tags(value: Optional[str], default: tuple[str, ...]) -> tuple[str, ...]:
+    if value is None:
+        return default
+    return tuple(i.strip() for i in value.split(",") if i.strip())
+
+
+def _vendor_code(name: str) -> str:
+    for vendor_name, code in VENDOR_CODE_NAMES.items():
+        if vendor_name in name:
+            return code
+    return name
+
+
+def get_cache_size() -> int:
+    """
+    Return the maximum number of bytes the local content cache may hold. The
+    size is read from the VENDOR_FILE_CLI_CACHE_SIZE environment variable,
+    which accepts the same suffixes as rate limits (eg. 512M, 2G), and defaults
+    to `DEFAULT_CACHE_SIZE`. A size of 0 disables the cache.
+
+    Returns:
+        maximum size of the cache in bytes
+    """
+    value = os.environ.get("VENDOR_FILE_CLI_CACHE_SIZE")
+    if value is None or not value.strip():
+        return DEFAULT_CACHE_SIZE
+    return int(_rate(value) or 0)
+
+
+def get_global_rate_limits() -> tuple[Optional[float], Optional[float]]:
+    """
+    Return the rate limits shared by transfers to and from all servers. The
+    limits are read from the VENDOR_FILE_CLI_BYTES_PER_SECOND and
+    VENDOR_FILE_CLI_OPS_PER_SECOND environment variables.
+
+    Returns:
+        tuple of the maximum bytes and transfers per second, either of which is
+        None if there is no limit
+    """
+    return (
+        _rate(os.environ.get("VENDOR_FILE_CLI_BYTES_PER_SECOND")),
+        _rate(os.environ.get("VENDOR_FILE_CLI_OPS_PER_SECOND")),
+    )
+
+
+def get_operation_timeouts() -> dict[str, float]:
+    """
+    Return the number of seconds each kind of operation (connect, list, get,
+    put and sheet) may take before it is cancelled. The timeouts for get and
+    put are the number of seconds a transfer may go without progress. The
+    defaults in
+    `DEFAULT_TIMEOUTS` can be overridden with VENDOR_FILE_CLI_{OPERATION}_TIMEOUT
+    environment variables (eg. VENDOR_FILE_CLI_LIST_TIMEOUT).
+
+    Returns:
+        dictionary of timeouts in seconds keyed by operation
+    """
+    timeouts = dict(DEFAULT_TIMEOUTS)
+    for operation in timeouts:
+        value = os.environ.get(f"VENDOR_FILE_CLI_{operation.upper()}_TIMEOUT")
+        if value is not None and value.strip():
+            timeouts[operation] = float(value)
+    return timeouts
+
+
+def get_required_tags(vendor: str) -> tuple[str, ...]:
+    """Return the tags of fields every record from `vendor` must contain."""
+    config = load_vendor_configs().get(vendor.upper())
+    return config.required_tags if config is not None else ()
+
+
+def get_validation_memo_settings() -> tuple[int, bool]:
+    """
+    Return the settings for the memo of record validation output. The number
+    of records to remember is read from the VENDOR_FILE_CLI_MEMO_SIZE
+    environment variable and defaults to `DEFAULT_MEMO_SIZE`. A size of 0
+    disables the memo. VENDOR_FILE_CLI_MEMO_PERSIST set to `true` keeps the
+    memo in the state directory between runs.
+
+    Returns:
+        tuple of the maximum number of records and whether to persist the memo
+    """
+    size = _int(os.environ.get("VENDOR_FILE_CLI_MEMO_SIZE"))
+    return (
+        size if size is not None else DEFAULT_MEMO_SIZE,
+        _bool(os.environ.get("VENDOR_FILE_CLI_MEMO_PERSIST")),
+    )
+
+
+def get_vendor_code(vendor: str) -> str:
+    """Return the code used for `vendor` when writing validation output."""
+    config = load_vendor_configs().get(vendor.upper())
+    if config is not None:
+        return config.vendor_code
+    return VALIDATION_CODES.get(vendor.upper()) or _vendor_code(vendor.upper())
+
+
+def get_vendor_config(name: str) -> VendorConfig:
+    """
+    Return the `VendorConfig` for a vendor or NSDROP.
+
+    Args:
+        name: name of server (eg. EASTVIEW, NSDROP)
+
+    Returns:
+        `VendorConfig` object for the server
+
+    Raises:
+        KeyError: if no credentials for the server have been loaded
+    """
+    try:
+        return load_vendor_configs()[name.upper()]
+    except KeyError:
+        raise KeyError(f"No credentials found for {name.upper()}.")
+
+
+@functools.cache
+def load_vendor_configs() -> dict[str, VendorConfig]:
+    """
+    Build a `VendorConfig` for each server whose credentials have been loaded
+    into environment variables. The environment is only read the first time
+    this function is called and the result is cached for the rest of the
+    process. Call `load_vendor_configs.cache_clear()` after changing the
+    credentials in the environment.
+
+    Optional settings for each server can be provided with the following
+    variables, where {NAME} is the name of the server:
+        {NAME}_EXTRA_DIRS: comma-separated directories to check for files
+        {NAME}_ROOT_PREFIXES: comma-separated prefixes of files in the root dir
+        {NAME}_VALIDATION_CODE: vendor code to use when validating files
+        {NAME}_MAX_SESSIONS: maximum number of concurrent sessions
+        {NAME}_POLL_INTERVAL: minutes between polls in daemon mode
+        {NAME}_SHARD_BY_FILE: "true" to split the server's files between shards
+        {NAME}_BYTES_PER_SECOND: maximum transfer rate (eg. 512K, 2M)
+        {NAME}_OPS_PER_SECOND: maximum number of transfers per second
+        {NAME}_COMPRESSION: "true" to compress the SSH transport to an SFTP server
+        {NAME}_REQUIRED_TAGS:
+            comma-separated tags every record must contain. defaults to the
+            vendor's tags in `REQUIRED_TAGS`. an empty value requires no tags
+
+    Returns:
+        dictionary of `VendorConfig` objects keyed by server name in the order
+        their credentials were loaded
+    """
+    env = dict(os.environ)
+    names = [k.removesuffix("_HOST") for k in env if k.endswith("_HOST")]
+    configs = {}
+    for name in names:
+        configs[name] = VendorConfig(
+            name=name,
+            host=env[f"{name}_HOST"],
+            port=env.get(f"{name}_PORT", ""),
+            user=env.get(f"{name}_USER", ""),
+            password=env.get(f"{name}_PASSWORD", ""),
+            src_dir=env.get(f"{name}_SRC"),
+            dst_dir=env.get(f"{name}_DST"),
+            extra_dirs=_split(env.get(f"{name}_EXTRA_DIRS"))
+            or EXTRA_DIRS.get(name, ()),
+            root_prefixes=_split(env.get(f"{name}_ROOT_PREFIXES"))
+            or ROOT_PREFIXES.get(name, ()),
+            validation_code=env.get(f"{name}_VALIDATION_CODE")
+            or VALIDATION_CODES.get(name),
+            max_sessions=int(env.get(f"{name}_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+            poll_interval=_int(env.get(f"{name}_POLL_INTERVAL")),
+            shard_by_file=_bool(env.get(f"{name}_SHARD_BY_FILE")),
+            bytes_per_second=_rate(env.get(f"{name}_BYTES_PER_SECOND")),
+            ops_per_second=_rate(env.get(f"{name}_OPS_PER_SECOND")),
+            compression=_bool(env.get(f"{name}_COMPRESSION")),
+            required_tags=_tags(
+                env.get(f"{name}_REQUIRED_TAGS"), REQUIRED_TAGS.get(name, ())
+            ),
+        )
+    return configs
@@ -0,0 +1,165 @@
+"""Check connectivity and latency to vendor servers and NSDROP."""
+
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+from vendor_file_cli.config import get_vendor_config
+from vendor_file_cli.deadlines import Deadline, released
+from vendor_file_cli.listing import list_directory
+from vendor_file_cli.utils import connect
+
+logger = logging.getLogger(__name__)
+
+# Stages of a connection check, in the order they are run.
+STAGES = ("dns", "tcp", "handshake", "listing")
+
+
+@dataclass
+class ConnectionCheck:
+    """
+    Seconds taken by each stage of connecting to a server. Stages after the
+    first one that fails are not run and are left as None.
+
+    Attributes:
+        name: name of server (eg. EASTVIEW, NSDROP)
+        host: server's hostname
+        port: server's port
+        dns: seconds taken to resolve the server's hostname
+        tcp: seconds taken to open a TCP connection to the server
+        handshake:
+            seconds taken to open an authenticated session, including its own
+            TCP connection and the FTP or SSH handshake
+        listing: seconds taken to list the server's `_SRC` (or `_DST`) directory
+        files: number of files in the listed directory
+        error: stage that failed and the error it raised, if any
+    """
+
+    name: str
+    host: str
+    port: int
+    dns: Optional[float] = None
+    tcp: Optional[float] = None
+    handshake: Optional[float] = None
+    listing: Optional[float] = None
+    files: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether every stage of the check succeeded."""
+        return self.error is None
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the check as a JSON-serializable dictionary."""
+        return asdict(self)
+
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds is not None else "-"
+
+
+def check_connection(name: str, deadline: Optional[Deadline] = None) -> ConnectionCheck:
+    """
+    Time resolving a server's hostname, opening a TCP connection to it,
+    opening an authenticated session and listing the server's `_SRC`
+    directory (or `_DST` if it has no `_SRC`). Each stage is limited by the
+    connect or list timeout of `deadline`. Errors are recorded on the
+    returned `ConnectionCheck` rather than raised.
+
+    Args:
+        name: name of server (eg. EASTVIEW, NSDROP)
+        deadline: `Deadline` to limit the time taken by each stage (default None)
+
+    Returns:
+        `ConnectionCheck` object for the server
+    """
+    deadline = deadline or Deadline()
+    config = get_vendor_config(name)
+    check = ConnectionCheck(
+        name=config.name, host=config.host, port=int(config.port or 21)
+    )
+    stage = "dns"
+    try:
+        start = time.perf_counter()
+        addresses = socket.getaddrinfo(check.host, check.port, type=socket.SOCK_STREAM)
+        check.dns = time.perf_counter() - start
+
+        stage = "tcp"
+        start = time.perf_counter()
+        address = addresses[0][4][:2]
+        with socket.create_connection(address, timeout=deadline.timeout("connect")):
+            check.tcp = time.perf_counter() - start
+
+        stage = "handshake"
+        start = time.perf_counter()
+        with released(connect(name, deadline)) as client:
+            check.handshake = time.perf_counter() - start
+
+            stage = "listing"
+            remote_dir = config.src_dir or config.dst
+            start = time.perf_counter()
+            listing = deadline.call(
+                "list", client, lambda: list_directory(client, remote_dir)
+            )
+            check.listing = time.perf_counter() - start
+            check.files = len(listing)
+    except Exception as e:
+        check.error = f"{stage}: {e.__class__.__name__}: {e}".rstrip(": ")
+        logger.error(f"({check.name}) Connection check failed at {check.error}")
+    return check
+
+
+def check_connections(
+    names: list[str], deadline: Optional[Deadline] = None
+) -> list[ConnectionCheck]:
+    """
+    Check every server in `names` at the same time with `check_connection`,
+    so the check takes as long as the slowest server rather than the sum of
+    all of them.
+
+    Args:
+        names: names of servers (eg. EASTVIEW, NSDROP)
+        deadline: `Deadline` to limit the time taken by each stage (default None)
+
+    Returns:
+        list of `ConnectionCheck` objects in the same order as `names`
+    """
+    if not names:
+        return []
+    with ThreadPoolExecutor(
+        max_workers=len(names), thread_name_prefix="vendor_file_cli.check"
+    ) as executor:
+        return list(executor.map(lambda i: check_connection(i, deadline), names))
+
+
+def format_checks(checks: list[ConnectionCheck]) -> str:
+    """
+    Format connection checks as a table with one row per server and the
+    milliseconds taken by each stage.
+
+    Args:
+        checks: list of `ConnectionCheck` objects
+
+    Returns:
+        the table as a string
+    """
+    rows = [("SERVER", "HOST", *(i.upper() for i in STAGES), "FILES", "ERROR")]
+    for check in checks:
+        rows.append(
+            (
+                check.name,
+                f"{check.host}:{check.port}",
+                *(_format_seconds(getattr(check, i)) for i in STAGES),
+                str(check.files) if check.files is not None else "-",
+                check.error or "",
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
@@ -0,0 +1,281 @@
+"""Long-running mode which polls vendor servers and copies new files to NSDROP."""
+
+import contextlib
+import datetime
+import heapq
+import logging
+import signal
+import threading
+import time
+from types import FrameType
+from typing import Any, Optional
+
+from file_retriever import Client, FileInfo
+
+from vendor_file_cli.cache import ContentCache
+from vendor_file_cli.config import load_vendor_configs
+from vendor_file_cli.deadlines import Deadline
+from vendor_file_cli.dedupe import HashIndex
+from vendor_file_cli.pipeline import ValidationPipeline
+from vendor_file_cli.scheduler import AdaptiveScheduler
+from vendor_file_cli.throttle import Throttle
+from vendor_file_cli.tokens import TokenRefresher
+from vendor_file_cli.utils import (
+    configure_sheet,
+    connect,
+    get_token_store,
+    get_vendor_list,
+    load_creds,
+)
+from vendor_file_cli.validator import get_single_file, get_vendor_file_list
+
+logger = logging.getLogger(__name__)
+
+
+class FetchDaemon:
+    """
+    Poll each vendor's server on its own interval and copy new files to NSDROP
+    using `get_vendor_file_list` and `get_single_file`. Client sessions are kept
+    open between polls and are only reopened when they are no longer active.
+    Each operation is limited by the timeouts from `get_operation_timeouts` so a
+    server that stops responding only holds up the poll of that vendor.
+
+    If `adaptive` is True, an `AdaptiveScheduler` learns each vendor's delivery
+    pattern from the modification times of the files it copies and the vendor is
+    polled frequently around expected deliveries and less often otherwise.
+
+    The daemon stops after the current poll when it receives SIGINT or SIGTERM.
+    On SIGHUP the vendor credentials are reloaded, open sessions are closed and
+    the schedule is updated with any vendors that were added or removed. The
+    rate limits of the daemon's `Throttle` and the operation timeouts are also
+    reloaded, so transfers can be sped up or slowed down without restarting
+    the daemon.
+
+    While any of the polled vendors' files are validated, the Google Sheets API
+    token is refreshed by a `TokenRefresher` shortly before it expires, so
+    writing validation output never waits for a refresh.
+    """
+
+    def __init__(
+        self,
+        vendors: Optional[list[str]] = None,
+        interval: int = 15,
+        days: int = 30,
+        test: bool = False,
+        pipeline: bool = False,
+        adaptive: bool = False,
+        dedupe: Optional[str] = None,
+        cache: bool = False,
+    ) -> None:
+        """
+        Args:
+            vendors:
+                names of vendors to poll (default None). if None, all vendors
+                with configured credentials are polled
+            interval:
+                minutes between polls of a vendor whose `VendorConfig` does not
+                have a `poll_interval` (default 15)
+            days: number of days to go back and retrieve files from (default 30)
+            test: whether to write validation output to the test sheet
+            pipeline: whether to validate files concurrently with transfers
+            adaptive: whether to adapt polling intervals to delivery history
+            dedupe:
+                what to do with files whose content is already on NSDROP:
+                `skip` or `marker` (default None). if None, content is not
+                checked
+            cache: whether to add copied files to the local `ContentCache`
+        """
+        self.requested_vendors = [i.upper() for i in vendors] if vendors else None
+        self.interval = interval
+        self.days = days
+        self.test = test
+        self.pipeline = pipeline
+        self.scheduler = AdaptiveScheduler() if adaptive else None
+        self.throttle = Throttle()
+        self.deadline = Deadline()
+        self.cache = ContentCache() if cache else None
+        self.hashes = HashIndex(dedupe) if dedupe else None
+        self.clients: dict[str, Client] = {}
+        self.schedule: list[tuple[float, str]] = []
+        self._stop = threading.Event()
+        self._reload = threading.Event()
+        self._wake = threading.Event()
+
+    def _client(self, name: str) -> Client:
+        client = self.clients.get(name.upper())
+        if client is not None:
+            try:
+                if client.is_active():
+                    return client
+            except Exception:
+                pass
+            self._close_client(name)
+        client = connect(name, self.deadline)
+        self.clients[name.upper()] = client
+        return client
+
+    def _close_client(self, name: str) -> None:
+        client = self.clients.pop(name.upper(), None)
+        if client is not None:
+            with contextlib.suppress(Exception):
+                client.close()
+
+    def _handle_signal(self, signum: int, frame: Optional[FrameType]) -> None:
+        if hasattr(signal, "SIGHUP") and signum == signal.SIGHUP:
+            logger.info("Received SIGHUP. Reloading vendor configuration.")
+            self._reload.set()
+        else:
+            logger.info(f"Received signal {signum}. Stopping after current poll.")
+            self._stop.set()
+        self._wake.set()
+
+    def _token_refresher(self, vendors: list[str]) -> Optional[TokenRefresher]:
+        configs = load_vendor_configs()
+        if not any(i in configs and configs[i].validate for i in vendors):
+            return None
+        return TokenRefresher(
+            get_token_store(), refresh=lambda: configure_sheet(force_refresh=True)
+        )
+
+    def close(self) -> None:
+        """Close all open client sessions."""
+        for name in list(self.clients):
+            self._close_client(name)
+
+    def next_poll(self, vendor: str, now: float) -> float:
+        """
+        Return the time at which `vendor` should next be polled.
+
+        Args:
+            vendor: name of vendor
+            now: current time as returned by `time.monotonic`
+
+        Returns:
+            time of the vendor's next poll
+        """
+        config = load_vendor_configs().get(vendor.upper())
+        minutes = (config.poll_interval if config else None) or self.interval
+        if self.scheduler is not None:
+            return now + self.scheduler.next_delay(vendor, time.time(), minutes * 60)
+        return now + minutes * 60
+
+    def poll(
+        self, vendor: str, pipeline: Optional[ValidationPipeline] = None
+    ) -> list[FileInfo]:
+        """
+        Copy any new files from a vendor's server to NSDROP. If the poll fails
+        (eg. the vendor's server or NSDROP cannot be reached) the error is logged
+        and the sessions are closed so that they are reopened on the next poll.
+
+        Args:
+            vendor: name of vendor
+            pipeline: `ValidationPipeline` to validate files with (default None)
+
+        Returns:
+            list of `FileInfo` objects for the files copied to NSDROP, including
+            those copied before the poll failed. files that were not copied
+            because their content is already on NSDROP are not included
+        """
+        copied: list[FileInfo] = []
+        try:
+            nsdrop_client = self._client("nsdrop")
+            vendor_client = self._client(vendor)
+            files = get_vendor_file_list(
+                vendor=vendor,
+                timedelta=datetime.timedelta(days=self.days),
+                nsdrop_client=nsdrop_client,
+                vendor_client=vendor_client,
+                deadline=self.deadline,
+            )
+            logger.info(
+                f"({vendor_client.name}) {len(files)} file(s) on "
+                f"{vendor_client.name} server to copy to NSDROP"
+            )
+            for file in files:
+                copied_file = get_single_file(
+                    vendor=vendor,
+                    file=file,
+                    vendor_client=vendor_client,
+                    nsdrop_client=nsdrop_client,
+                    test=self.test,
+                    pipeline=pipeline,
+                    throttle=self.throttle,
+                    deadline=self.deadline,
+                    cache=self.cache,
+                    hashes=self.hashes,
+                )
+                if copied_file is not None:
+                    copied.append(file)
+        except Exception as e:
+            logger.error(f"({vendor.upper()}) Unable to poll vendor server: {e}")
+            self._close_client(vendor)
+            self._close_client("nsdrop")
+        return copied
+
+    def reload(self) -> None:
+        """
+        Reload vendor credentials, rate limits and timeouts, close open sessions
+        and update the schedule with the current list of vendors. Vendors that are
+        still configured keep their next poll time and new vendors are polled
+        immediately.
+        """
+        self._reload.clear()
+        try:
+            load_creds()
+        except ValueError:
+            load_vendor_configs.cache_clear()
+        self.throttle.reload()
+        self.deadline = Deadline()
+        self.close()
+        vendors = self.requested_vendors or get_vendor_list()
+        scheduled = {vendor: due for due, vendor in self.schedule}
+        now = time.monotonic()
+        self.schedule = [(scheduled.get(i, now), i) for i in vendors]
+        heapq.heapify(self.schedule)
+
+    def run(self) -> None:
+        """Poll vendors until the daemon receives SIGINT or SIGTERM."""
+        handled = [signal.SIGINT, signal.SIGTERM]
+        if hasattr(signal, "SIGHUP"):
+            handled.append(signal.SIGHUP)
+        previous: dict[int, Any] = {
+            i: signal.signal(i, self._handle_signal) for i in handled
+        }
+        now = time.monotonic()
+        vendors = self.requested_vendors or get_vendor_list()
+        self.schedule = [(now, i) for i in vendors]
+        heapq.heapify(self.schedule)
+        logger.info(f"Polling {len(vendors)} vendor(s) for new files.")
+        try:
+            with (
+                self._token_refresher(vendors) or contextlib.nullcontext(),
+                ValidationPipeline(test=self.test)
+                if self.pipeline
+                else contextlib.nullcontext() as pipeline,
+            ):
+                while not self._stop.is_set():
+                    if self._reload.is_set():
+                        self.reload()
+                    if not self.schedule:
+                        self._wake.wait()
+                        self._wake.clear()
+                        continue
+                    due, vendor = self.schedule[0]
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        self._wake.wait(wait)
+                        self._wake.clear()
+                        continue
+                    heapq.heappop(self.schedule)
+                    files = self.poll(vendor, pipeline=pipeline)
+                    if self.scheduler is not None:
+                        self.scheduler.record(vendor, [i.file_mtime for i in files])
+                    heapq.heappush(
+                        self.schedule,
+                        (self.next_poll(vendor, time.monotonic()), vendor),
+                    )
+        finally:
+            self.close()
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            logger.info("Stopped polling vendors.")
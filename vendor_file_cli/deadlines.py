@@ -0,0 +1,339 @@
+"""Time limits for operations on servers and for whole runs."""
+
+import contextlib
+import copy
+import ftplib
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Generator, Optional, TypeVar
+
+import paramiko
+from file_retriever import Client
+
+from vendor_file_cli.config import get_operation_timeouts
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Operations whose timeout is the time they may go without making progress
+# rather than the time they may take in total.
+STALL_OPERATIONS = ("get", "put")
+
+
+class OperationTimeout(TimeoutError):
+    """Raised when an operation on a server takes longer than its timeout."""
+
+
+class DeadlineExceeded(OperationTimeout):
+    """Raised when the time budget for a run has been used up."""
+
+
+def _close(client: Client) -> None:
+    with contextlib.suppress(Exception):
+        client.close()
+
+
+def _close_connected(future: "Future[Client]") -> None:
+    if future.exception() is None:
+        _close(future.result())
+
+
+def _stalled(error: BaseException) -> bool:
+    # clients wrap socket errors in their own exceptions, so the timeout may be
+    # the cause, context or argument of the error that reaches the caller
+    seen = set()
+    errors = [error]
+    while errors:
+        e = errors.pop()
+        if id(e) in seen:
+            continue
+        seen.add(id(e))
+        if isinstance(e, TimeoutError):
+            return True
+        errors.extend(i for i in (e.__cause__, e.__context__) if i is not None)
+        errors.extend(i for i in e.args if isinstance(i, BaseException))
+    return False
+
+
+def _start(func: Callable[[], T]) -> "Future[T]":
+    future: Future[T] = Future()
+
+    def target() -> None:
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(
+        target=target, name="vendor_file_cli.operation", daemon=True
+    ).start()
+    return future
+
+
+@contextlib.contextmanager
+def released(client: Client) -> Generator[Client, None, None]:
+    """
+    Yield `client` and close it on exit. Errors from closing a session that was
+    already closed after a timeout are ignored.
+    """
+    try:
+        yield client
+    finally:
+        _close(client)
+
+
+def set_socket_timeout(client: Client, seconds: float) -> None:
+    """
+    Set a timeout on the socket used by a client's session so that a read from
+    a server that has stopped responding eventually fails, even if nothing is
+    waiting for it any more.
+
+    Args:
+        client: `Client` object for a server
+        seconds: number of seconds a single read or write on the socket may take
+    """
+    connection = getattr(getattr(client, "session", None), "connection", None)
+    if isinstance(connection, paramiko.SFTPClient):
+        connection.get_channel().settimeout(seconds)
+    elif isinstance(connection, ftplib.FTP):
+        connection.timeout = seconds
+        if connection.sock is not None:
+            connection.sock.settimeout(seconds)
+
+
+class Deadline:
+    """
+    Per-operation timeouts plus an optional time budget for a whole run.
+    Connecting, listing and writing to the google sheet are run on a separate
+    thread and, if they have not finished when their timeout (or the end of
+    the budget) is reached, the client they were using is closed so that its
+    session is released and `OperationTimeout` is raised.
+
+    Transfers (`STALL_OPERATIONS`) are run on the calling thread with their
+    timeout set on the session's socket, so a transfer of any size may take as
+    long as it needs while it keeps making progress and times out once a
+    single read or write has waited that long. A transfer that has started is
+    not cut short by the budget unless it stalls.
+
+    Once the budget has been used up every operation raises `DeadlineExceeded`
+    before it starts.
+    """
+
+    def __init__(
+        self,
+        budget: Optional[float] = None,
+        timeouts: Optional[dict[str, float]] = None,
+        hedge_after: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            budget:
+                number of seconds the run may take (default None). if None,
+                only the per-operation timeouts apply
+            timeouts:
+                seconds each kind of operation may take (default None). missing
+                operations use `get_operation_timeouts`
+            hedge_after:
+                seconds after which a listing that has not finished is started
+                again on a fresh connection (default None). if None, a quarter
+                of the listing timeout is used
+            clock: function returning the current time in seconds
+        """
+        self._clock = clock
+        self.expires = clock() + budget if budget is not None else None
+        self.timeouts = {**get_operation_timeouts(), **(timeouts or {})}
+        self.hedge_after = (
+            hedge_after if hedge_after is not None else self.timeouts["list"] / 4
+        )
+
+    def call(self, operation: str, client: Client, func: Callable[[], T]) -> T:
+        """
+        Call `func` with the timeout for `operation`. If the call times out,
+        `client` is closed. Operations in `STALL_OPERATIONS` time out when a
+        read or write on the client's socket waits longer than the timeout.
+
+        Args:
+            operation: kind of operation (eg. list, get, put)
+            client: `Client` object the operation uses
+            func: function to call with no arguments
+
+        Returns:
+            the result of `func`
+
+        Raises:
+            OperationTimeout: if the call takes longer than its timeout
+            DeadlineExceeded: if the budget for the run has been used up
+        """
+        timeout = self.timeout(operation)
+        if operation in STALL_OPERATIONS:
+            return self._call_stalled(operation, client, func, timeout)
+        future = _start(func)
+        done, _ = wait([future], timeout=timeout)
+        if not done:
+            _close(client)
+            raise self._timed_out(operation, client.name, timeout)
+        return future.result()
+
+    def connect(self, name: str, func: Callable[[], Client]) -> Client:
+        """
+        Open a session to a server with the connect timeout and set a timeout on
+        the session's socket.
+
+        Args:
+            name: name of server (eg. EASTVIEW, NSDROP)
+            func: function that returns a connected `Client`
+
+        Returns:
+            `Client` object for the server
+
+        Raises:
+            OperationTimeout: if connecting takes longer than its timeout
+            DeadlineExceeded: if the budget for the run has been used up
+        """
+        timeout = self.timeout("connect")
+        future = _start(func)
+        done, _ = wait([future], timeout=timeout)
+        if not done:
+            # the session is closed if the connection is made after all
+            future.add_done_callback(_close_connected)
+            raise self._timed_out("connect", name.upper(), timeout)
+        client = future.result()
+        with contextlib.suppress(Exception):
+            set_socket_timeout(client, max(self.timeouts.values()))
+        return client
+
+    def expired(self) -> bool:
+        """Whether the budget for the run has been used up."""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def hedge(
+        self,
+        operation: str,
+        client: Client,
+        func: Callable[[Client], T],
+        reconnect: Callable[[], Client],
+    ) -> T:
+        """
+        Call `func` with `client` and, if it has not finished after
+        `hedge_after` seconds, call it again with a fresh client from
+        `reconnect`. The result of the first call to succeed is returned. If
+        the fresh client wins, its session replaces the session of `client`
+        so the caller can keep using `client`, and the stalled session is
+        closed.
+
+        Args:
+            operation: kind of operation (eg. list)
+            client: `Client` object to call `func` with first
+            func: function to call with a client
+            reconnect: function that returns a fresh `Client` for the same server
+
+        Returns:
+            the result of the first call to `func` to succeed
+
+        Raises:
+            OperationTimeout: if neither call succeeds before the timeout
+            DeadlineExceeded: if the budget for the run has been used up
+        """
+        timeout = self.timeout(operation)
+        start = self._clock()
+        primary = copy.copy(client)
+        attempts: dict[Future, Client] = {
+            _start(functools.partial(func, primary)): primary
+        }
+        pending = set(attempts)
+        errors: list[BaseException] = []
+        hedged = False
+        while pending:
+            left = timeout - (self._clock() - start)
+            wait_for = left if hedged else min(left, self.hedge_after)
+            done, pending = wait(
+                pending, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    winner = attempts[future]
+                    for other in attempts.values():
+                        if other is not winner:
+                            _close(other)
+                    if winner is not primary:
+                        logger.info(
+                            f"({client.name}) Using {operation} result from "
+                            "fresh connection."
+                        )
+                        client.session = winner.session
+                    return future.result()
+                errors.append(future.exception())  # type: ignore[arg-type]
+            if done:
+                continue
+            if not hedged and left > self.hedge_after:
+                hedged = True
+                logger.info(
+                    f"({client.name}) {operation.capitalize()} has taken more than "
+                    f"{self.hedge_after:.0f}s. Retrying on a fresh connection."
+                )
+                try:
+                    backup = self.connect(client.name, reconnect)
+                except Exception as e:
+                    logger.warning(f"({client.name}) Unable to reconnect: {e}")
+                    continue
+                future = _start(functools.partial(func, backup))
+                attempts[future] = backup
+                pending.add(future)
+                continue
+            for other in attempts.values():
+                _close(other)
+            raise self._timed_out(operation, client.name, timeout)
+        raise errors[0]
+
+    def remaining(self) -> Optional[float]:
+        """Return the number of seconds left in the budget or None if unlimited."""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - self._clock())
+
+    def timeout(self, operation: str) -> float:
+        """
+        Return the number of seconds an operation may take, which is the
+        smaller of its timeout and the time left in the budget.
+
+        Raises:
+            DeadlineExceeded: if the budget for the run has been used up
+        """
+        timeout = self.timeouts[operation]
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise DeadlineExceeded("Run deadline exceeded.")
+        return min(timeout, remaining)
+
+    def _call_stalled(
+        self, operation: str, client: Client, func: Callable[[], T], timeout: float
+    ) -> T:
+        with contextlib.suppress(Exception):
+            set_socket_timeout(client, timeout)
+        try:
+            return func()
+        except Exception as e:
+            if not _stalled(e):
+                raise
+            _close(client)
+            raise self._timed_out(operation, client.name, timeout) from e
+        finally:
+            with contextlib.suppress(Exception):
+                set_socket_timeout(client, max(self.timeouts.values()))
+
+    def _timed_out(self, operation: str, name: str, timeout: float) -> OperationTimeout:
+        if self.expired():
+            logger.error(f"({name}) Run deadline exceeded during {operation}.")
+            return DeadlineExceeded("Run deadline exceeded.")
+        logger.error(
+            f"({name}) {operation.capitalize()} timed out after {timeout:.0f}s."
+        )
+        return OperationTimeout(f"{operation} on {name} timed out after {timeout:.0f}s")
@@ -0,0 +1,256 @@
+"""Detect vendor files whose content has already been copied to NSDROP."""
+
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Optional
+
+from file_retriever import File, FileInfo
+
+from vendor_file_cli.utils import CHUNK_SIZE, file_lock, get_state_path
+
+logger = logging.getLogger(__name__)
+
+# What to do with a file whose content is already on NSDROP. `skip` copies
+# nothing and `marker` copies a small text file naming the original instead.
+DEDUPE_MODES = ("skip", "marker")
+
+# Suffix added to the name of a file to name its marker.
+MARKER_SUFFIX = ".duplicate"
+
+STATE_FILE = "content_hashes.jsonl"
+
+# Seconds after which a file recorded in a `HashIndex` is pruned (1 year).
+MAX_AGE = 365 * 24 * 60 * 60.0
+
+
+def hash_stream(stream: BinaryIO) -> str:
+    """
+    Return the SHA-256 digest of the contents of a seekable stream. Streams with
+    a `getbuffer` method (eg. `io.BytesIO`) are hashed without copying their
+    contents, others are read in chunks. The stream is rewound afterwards.
+
+    Args:
+        stream: seekable binary stream
+
+    Returns:
+        hex digest of the contents of the stream
+    """
+    digest = hashlib.sha256()
+    getbuffer = getattr(stream, "getbuffer", None)
+    if getbuffer is not None:
+        with getbuffer() as buffer:
+            digest.update(buffer)
+    else:
+        stream.seek(0)
+        while chunk := stream.read(CHUNK_SIZE):
+            digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class HashIndex:
+    """
+    Index of the content of files copied to NSDROP from all vendors, stored as
+    JSON Lines in the state directory. Each SHA-256 digest maps to the path on
+    NSDROP of the first file copied with that content. Each vendor file that
+    has been hashed is also recorded with its size and modification time, so a
+    duplicate that is still on the vendor's server is not downloaded again on
+    later runs.
+
+    Each file is recorded by appending one line to the index, while holding a
+    lock shared with other processes, and lines appended by other processes
+    are read before the index is used. Files recorded more than `max_age`
+    seconds ago are pruned and the index is rewritten without them and without
+    superseded lines when it is opened.
+    """
+
+    def __init__(
+        self,
+        mode: str = "skip",
+        max_age: float = MAX_AGE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Args:
+            mode:
+                what to do with duplicates: `skip` to copy nothing or `marker`
+                to copy a marker file naming the original (default skip)
+            max_age:
+                seconds after which a recorded file is pruned (default 1 year)
+            clock: function returning the current time in seconds since the epoch
+
+        Raises:
+            ValueError: if `mode` is not one of `DEDUPE_MODES`
+        """
+        if mode not in DEDUPE_MODES:
+            raise ValueError(f"Dedupe mode must be one of {', '.join(DEDUPE_MODES)}")
+        self.mode = mode
+        self.max_age = max_age
+        self.path = get_state_path(STATE_FILE)
+        self.lock_path = f"{self.path}.lock"
+        self.hashes: dict[str, str] = {}
+        self.files: dict[str, dict] = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._inode: Optional[int] = None
+        self._offset = 0
+        with self._lock, file_lock(self.lock_path):
+            if self._read() > len(self.files):
+                self._compact()
+
+    def _add(self, entry: dict[str, Any]) -> None:
+        if self._clock() - entry["time"] > self.max_age:
+            return
+        self.hashes.setdefault(entry["digest"], entry["path"])
+        self.files[entry["file"]] = {
+            "size": entry["size"],
+            "mtime": entry["mtime"],
+            "digest": entry["digest"],
+            "path": entry["path"],
+            "time": entry["time"],
+        }
+
+    def _compact(self) -> None:
+        # originals are written before their duplicates so that each digest
+        # still maps to the same path when the index is read again
+        entries = sorted(
+            ({"file": k, **v} for k, v in self.files.items()),
+            key=lambda i: (self.hashes.get(i["digest"]) != i["path"], i["time"]),
+        )
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                for entry in entries:
+                    fh.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Unable to prune content hashes in {self.path}: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return
+        self.hashes, self.files = {}, {}
+        self._inode, self._offset = None, 0
+        self._read()
+
+    def _read(self) -> int:
+        # read lines appended since the last read and return how many were read.
+        # the index is read again from the start if another process rewrote it
+        lines = 0
+        try:
+            with open(self.path, "rb") as fh:
+                stat = os.fstat(fh.fileno())
+                if stat.st_ino != self._inode or stat.st_size < self._offset:
+                    self.hashes, self.files = {}, {}
+                    self._inode, self._offset = stat.st_ino, 0
+                fh.seek(self._offset)
+                for line in fh:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._offset += len(line)
+                    lines += 1
+                    with contextlib.suppress(KeyError, TypeError, ValueError):
+                        self._add(json.loads(line))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Unable to read content hashes from {self.path}: {e}")
+        return lines
+
+    def check(self, vendor: str, file: FileInfo) -> Optional[str]:
+        """
+        Check whether a vendor file was found to be a duplicate on an earlier
+        run, without downloading it.
+
+        Args:
+            vendor: name of vendor
+            file: `FileInfo` object for the file on the vendor's server
+
+        Returns:
+            path on NSDROP of the original file or None if the file has not
+            been seen, has changed or was not a duplicate
+        """
+        with self._lock:
+            self._read()
+            entry = self.files.get(f"{vendor.upper()}/{file.file_name}")
+            if entry is None or entry["size"] != file.file_size:
+                return None
+            if int(entry["mtime"]) != int(file.file_mtime or 0):
+                return None
+            original = self.hashes.get(entry["digest"])
+            if original is None or original == entry["path"]:
+                return None
+            return original
+
+    def find(self, digest: str, path: str) -> Optional[str]:
+        """
+        Return the path on NSDROP of another file with the same content.
+
+        Args:
+            digest: SHA-256 digest of the file's content
+            path: path on NSDROP the file would be copied to
+
+        Returns:
+            path of the original file or None if no other file has the content
+        """
+        with self._lock:
+            self._read()
+            original = self.hashes.get(digest)
+        return original if original != path else None
+
+    def marker(self, file: FileInfo, original: str, digest: str) -> File:
+        """Return a marker file to copy to NSDROP in place of a duplicate."""
+        content = f"Same content as {original}\nsha256: {digest}\n".encode()
+        info = FileInfo(
+            f"{file.file_name}{MARKER_SUFFIX}",
+            time.time(),
+            0o100644,
+            len(content),
+            0,
+            0,
+            None,
+        )
+        return File.from_fileinfo(info, io.BytesIO(content))
+
+    def record(self, vendor: str, file: FileInfo, path: str, digest: str) -> None:
+        """
+        Record the content of a vendor file. The digest is mapped to `path`
+        unless another file with the same content has already been recorded.
+
+        Args:
+            vendor: name of vendor
+            file: `FileInfo` object for the file on the vendor's server
+            path: path on NSDROP the file was (or would have been) copied to
+            digest: SHA-256 digest of the file's content
+        """
+        entry = {
+            "file": f"{vendor.upper()}/{file.file_name}",
+            "size": file.file_size,
+            "mtime": file.file_mtime,
+            "digest": digest,
+            "path": path,
+            "time": self._clock(),
+        }
+        with self._lock, file_lock(self.lock_path):
+            # another process may have recorded the same content first
+            self._read()
+            self._add(entry)
+            try:
+                with open(self.path, "a+b") as fh:
+                    # end a line that was cut off when another process stopped
+                    if fh.seek(0, os.SEEK_END):
+                        fh.seek(-1, os.SEEK_END)
+                        if fh.read(1) != b"\n":
+                            fh.write(b"\n")
+                    fh.write(json.dumps(entry).encode() + b"\n")
+                    fh.flush()
+                    self._inode = os.fstat(fh.fileno()).st_ino
+                    self._offset = fh.tell()
+            except OSError as e:
+                logger.warning(f"Unable to record content hash in {self.path}: {e}")
@@ -0,0 +1,216 @@
+"""Append-only journal of a fetch run, used to resume a run that was interrupted."""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from file_retriever import FileInfo
+
+from vendor_file_cli.utils import get_state_path
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = "run_journal_{}.jsonl"
+
+
+def journal_name(params: dict[str, Any]) -> str:
+    """
+    Return the name of the journal file for a run with `params`. Runs with
+    different parameters (eg. vendors, days or shard) are recorded in
+    different files, so starting one run does not discard the journal of
+    another.
+
+    Args:
+        params: JSON-serializable parameters of the run
+
+    Returns:
+        name of the journal file in the state directory
+    """
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+    return JOURNAL_FILE.format(digest.hexdigest()[:12])
+
+
+def _file_entry(file: FileInfo) -> dict[str, Any]:
+    return {
+        "name": file.file_name,
+        "size": file.file_size,
+        "mtime": file.file_mtime,
+        "mode": file.file_mode,
+    }
+
+
+def _file_info(entry: dict[str, Any]) -> FileInfo:
+    return FileInfo(
+        entry["name"], entry["mtime"], entry["mode"], entry["size"], 0, 0, None
+    )
+
+
+class RunJournal:
+    """
+    Journal of a run of `get_vendor_files`, written to a JSON Lines file in the
+    state directory. The files to copy from each vendor are recorded once the
+    vendor has been listed, followed by each file as it is copied (and
+    validated, unless validation is pipelined) and each vendor as it is
+    finished. Every entry is flushed to disk before the run continues.
+
+    The journal is named after a hash of the run's parameters (see
+    `journal_name`). A journal opened with `resume` reads the entries of the
+    previous run if it was started with the same parameters and did not
+    finish. Vendors that were finished are skipped, vendors that were listed
+    are not listed again and files that were copied are not copied again.
+    Otherwise the journal is started afresh, with a warning if the previous
+    run did not finish. A run that is cut short by its deadline is closed
+    with `stop` rather than `finish`, so that it can still be resumed.
+    """
+
+    def __init__(
+        self, params: dict[str, Any], resume: bool = False, name: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            params:
+                JSON-serializable parameters of the run (eg. vendors, days). a
+                run is only resumed if its parameters match
+            resume: whether to resume the previous run (default False)
+            name:
+                name of the journal file in the state directory (default None).
+                if None, the name from `journal_name` is used
+        """
+        self.path = get_state_path(name or journal_name(params))
+        self.params = params
+        self.plans: dict[str, list[FileInfo]] = {}
+        self.copied: dict[str, set[str]] = {}
+        self.finished: set[str] = set()
+        self.resumed = False
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        elif self._unfinished(self._read()):
+            logger.warning(
+                "The previous run with the same options did not finish. Starting "
+                "a new run. Pass --resume to resume it instead."
+            )
+        self._fh = open(self.path, "a" if self.resumed else "w", encoding="utf-8")
+        if self.resumed:
+            # end a line that was cut off when the run stopped
+            self._fh.write("\n")
+        else:
+            self._write({"event": "start", "params": params})
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def _load(self) -> None:
+        entries = self._read()
+        if not entries or entries[0].get("event") != "start":
+            logger.info("No interrupted run to resume. Starting a new run.")
+            return
+        if entries[-1].get("event") == "finish":
+            logger.info("Previous run finished. Starting a new run.")
+            return
+        if entries[0].get("params") != self.params:
+            logger.warning(
+                "Interrupted run was started with different options. Starting a "
+                "new run."
+            )
+            return
+        for entry in entries[1:]:
+            vendor = entry.get("vendor", "")
+            if entry["event"] == "plan":
+                self.plans[vendor] = [_file_info(i) for i in entry["files"]]
+            elif entry["event"] == "copied":
+                self.copied.setdefault(vendor, set()).add(entry["file"])
+            elif entry["event"] == "vendor_done":
+                self.finished.add(vendor)
+        self.resumed = True
+        logger.info(
+            f"Resuming interrupted run: {len(self.finished)} vendor(s) finished, "
+            f"{sum(len(i) for i in self.copied.values())} file(s) copied."
+        )
+
+    def _read(self) -> list[dict[str, Any]]:
+        entries = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    with contextlib.suppress(ValueError):
+                        if line.strip():
+                            entries.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _unfinished(self, entries: list[dict[str, Any]]) -> bool:
+        return (
+            bool(entries)
+            and entries[0].get("event") == "start"
+            and entries[-1].get("event") != "finish"
+        )
+
+    def _write(self, entry: dict[str, Any]) -> None:
+        entry["time"] = time.time()
+        with self._lock:
+            self._fh.write(json.dumps(entry) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        """Close the journal file without marking the run as finished."""
+        with self._lock:
+            self._fh.close()
+
+    def finish(self) -> None:
+        """Mark the run as finished so that it is not resumed."""
+        self._write({"event": "finish"})
+
+    def stop(self) -> None:
+        """Mark the run as stopped by its deadline so that it can be resumed."""
+        self._write({"event": "stop"})
+
+    def is_finished(self, vendor: str) -> bool:
+        """Whether all of the vendor's files were copied in the resumed run."""
+        return vendor.upper() in self.finished
+
+    def pending(self, vendor: str, files: list[FileInfo]) -> list[FileInfo]:
+        """Return the files in `files` that have not been copied yet."""
+        copied = self.copied.get(vendor.upper(), set())
+        return [i for i in files if i.file_name not in copied]
+
+    def plan(self, vendor: str) -> Optional[list[FileInfo]]:
+        """
+        Return the files to copy from a vendor recorded in the resumed run or
+        None if the vendor has not been listed.
+        """
+        return self.plans.get(vendor.upper())
+
+    def record_copied(self, vendor: str, file: FileInfo) -> None:
+        """Record that a file has been copied to NSDROP."""
+        with self._lock:
+            self.copied.setdefault(vendor.upper(), set()).add(file.file_name)
+        self._write(
+            {"event": "copied", "vendor": vendor.upper(), "file": file.file_name}
+        )
+
+    def record_plan(self, vendor: str, files: list[FileInfo]) -> None:
+        """Record the files to copy from a vendor after it has been listed."""
+        self.plans[vendor.upper()] = list(files)
+        self._write(
+            {
+                "event": "plan",
+                "vendor": vendor.upper(),
+                "files": [_file_entry(i) for i in files],
+            }
+        )
+
+    def record_vendor_done(self, vendor: str) -> None:
+        """Record that all of a vendor's files have been copied."""
+        self.finished.add(vendor.upper())
+        self._write({"event": "vendor_done", "vendor": vendor.upper()})
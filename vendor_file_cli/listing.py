@@ -0,0 +1,329 @@
+"""Columnar representation of directory listings from vendor servers."""
+
+import calendar
+import datetime
+import fnmatch
+import ftplib
+import logging
+import re
+import stat
+import threading
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import paramiko
+from file_retriever import Client, FileInfo
+
+logger = logging.getLogger(__name__)
+
+MONTHS = {
+    name.lower(): number for number, name in enumerate(calendar.month_abbr) if name
+}
+
+# Whether each FTP server (keyed by host and port) supports MLSD. Servers are
+# probed with FEAT the first time they are listed.
+_mlsd_support: dict[str, bool] = {}
+_mlsd_lock = threading.Lock()
+
+
+class FileListing:
+    """
+    A directory listing held as parallel arrays of file names, modification
+    times and sizes rather than as a list of `FileInfo` objects. Filters are
+    applied to the whole listing in a single pass and `FileInfo` objects are
+    only returned for the files that pass the filters.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        mtimes: Iterable[float],
+        sizes: Iterable[int],
+        modes: Optional[Iterable[int]] = None,
+        file_info: Optional[Sequence[FileInfo]] = None,
+    ) -> None:
+        """
+        Args:
+            names: file names
+            mtimes: file modification times as seconds since the epoch
+            sizes: file sizes in bytes
+            modes: file permissions (default None)
+            file_info:
+                `FileInfo` objects the listing was built from (default None).
+                if provided, these objects are returned by `filter` rather than
+                creating new ones
+        """
+        self.names = list(names)
+        self.mtimes = np.fromiter(mtimes, dtype=np.float64, count=len(self.names))
+        self.sizes = np.fromiter(sizes, dtype=np.int64, count=len(self.names))
+        self.modes = (
+            np.fromiter(modes, dtype=np.int64, count=len(self.names))
+            if modes is not None
+            else np.full(len(self.names), 0o100644, dtype=np.int64)
+        )
+        self._file_info = file_info
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def concat(cls, listings: Sequence["FileListing"]) -> "FileListing":
+        """Combine several listings (eg. of different directories) into one."""
+        if len(listings) == 1:
+            return listings[0]
+        names = [name for listing in listings for name in listing.names]
+        return cls(
+            names=names,
+            mtimes=(float(i) for listing in listings for i in listing.mtimes),
+            sizes=(int(i) for listing in listings for i in listing.sizes),
+            modes=(int(i) for listing in listings for i in listing.modes),
+            file_info=(
+                [i for listing in listings for i in listing._file_info]
+                if all(listing._file_info is not None for listing in listings)
+                else None
+            ),
+        )
+
+    @classmethod
+    def from_file_info(cls, files: Sequence[FileInfo]) -> "FileListing":
+        """Create a `FileListing` from a list of `FileInfo` objects."""
+        return cls(
+            names=[i.file_name for i in files],
+            mtimes=(float(i.file_mtime) for i in files),
+            sizes=(int(i.file_size or 0) for i in files),
+            file_info=files,
+        )
+
+    def filter(self, since: float, exclude: Iterable[str] = ()) -> list[FileInfo]:
+        """
+        Select the files modified at or after `since` whose names are not in
+        `exclude`.
+
+        Args:
+            since: earliest modification time to include as seconds since the epoch
+            exclude: file names to exclude (eg. files already on NSDROP)
+
+        Returns:
+            list of `FileInfo` objects for the selected files
+        """
+        mask = self.mtimes >= since
+        excluded = set(exclude)
+        if excluded:
+            mask &= np.fromiter(
+                (name not in excluded for name in self.names),
+                dtype=np.bool_,
+                count=len(self.names),
+            )
+        return [self.file_info(int(i)) for i in np.flatnonzero(mask)]
+
+    def match(self, patterns: Iterable[str]) -> dict[str, list[FileInfo]]:
+        """
+        Find the files whose names match each of `patterns`. Patterns may be
+        file names or glob patterns (eg. `*.mrc`), which are matched case
+        sensitively. File names are looked up in a dictionary of the listing
+        and glob patterns are matched against the names in memory, so no
+        requests are made to the server.
+
+        Args:
+            patterns: file names or glob patterns
+
+        Returns:
+            dictionary of the `FileInfo` objects matching each pattern, in the
+            order the files appear in the listing
+        """
+        index: dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            index.setdefault(name, i)
+        matches: dict[str, list[FileInfo]] = {}
+        for pattern in patterns:
+            if not any(char in pattern for char in "*?["):
+                found = [index[pattern]] if pattern in index else []
+            else:
+                is_match = re.compile(fnmatch.translate(pattern)).match
+                found = [i for i, name in enumerate(self.names) if is_match(name)]
+            matches[pattern] = [self.file_info(i) for i in found]
+        return matches
+
+    def file_info(self, index: int) -> FileInfo:
+        """Return a `FileInfo` object for the file at `index` in the listing."""
+        if self._file_info is not None:
+            return self._file_info[index]
+        return FileInfo(
+            self.names[index],
+            float(self.mtimes[index]),
+            int(self.modes[index]),
+            int(self.sizes[index]),
+            0,
+            0,
+            None,
+        )
+
+
+def _ftp_supports_mlsd(ftp: ftplib.FTP) -> bool:
+    key = f"{ftp.host}:{ftp.port}"
+    with _mlsd_lock:
+        if key in _mlsd_support:
+            return _mlsd_support[key]
+    try:
+        features = ftp.sendcmd("FEAT")
+    except ftplib.Error:
+        features = ""
+    supported = any(
+        line.strip().upper().startswith("MLST") for line in features.splitlines()
+    )
+    with _mlsd_lock:
+        _mlsd_support[key] = supported
+    return supported
+
+
+def _list_ftp(ftp: ftplib.FTP, remote_dir: str) -> FileListing:
+    if _ftp_supports_mlsd(ftp):
+        try:
+            return _list_mlsd(ftp, remote_dir)
+        except ftplib.error_perm as e:
+            logger.debug(f"MLSD failed on {ftp.host}, using LIST instead: {e}")
+            with _mlsd_lock:
+                _mlsd_support[f"{ftp.host}:{ftp.port}"] = False
+    lines: list[str] = []
+    ftp.retrlines(f"LIST {remote_dir}".strip(), lines.append)
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    entries = [entry for line in lines if (entry := parse_list_line(line, now))]
+    return FileListing(
+        names=[i[0] for i in entries],
+        mtimes=(i[1] for i in entries),
+        sizes=(i[2] for i in entries),
+        modes=(i[3] for i in entries),
+    )
+
+
+def _list_mlsd(ftp: ftplib.FTP, remote_dir: str) -> FileListing:
+    names, mtimes, sizes, modes = [], [], [], []
+    for name, facts in ftp.mlsd(
+        remote_dir, facts=["type", "size", "modify", "unix.mode"]
+    ):
+        if facts.get("type", "file").lower() != "file":
+            continue
+        names.append(name)
+        mtimes.append(_parse_mlsd_time(facts.get("modify")))
+        sizes.append(int(facts.get("size", 0)))
+        modes.append(stat.S_IFREG | int(facts.get("unix.mode", "644"), 8))
+    return FileListing(names=names, mtimes=mtimes, sizes=sizes, modes=modes)
+
+
+def _list_sftp(connection: paramiko.SFTPClient, remote_dir: str) -> FileListing:
+    entries = [
+        i
+        for i in connection.listdir_attr(remote_dir or ".")
+        if i.st_mode is None or stat.S_ISREG(i.st_mode)
+    ]
+    return FileListing(
+        names=[i.filename for i in entries],
+        mtimes=(float(i.st_mtime or 0) for i in entries),
+        sizes=(int(i.st_size or 0) for i in entries),
+        modes=(int(i.st_mode or 0o100644) for i in entries),
+    )
+
+
+def _parse_mlsd_time(value: Optional[str]) -> float:
+    if not value:
+        return 0.0
+    parsed = datetime.datetime.strptime(value[:14], "%Y%m%d%H%M%S")
+    return parsed.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _parse_permissions(permissions: str) -> int:
+    mode = stat.S_IFREG
+    for bit, char in zip(range(8, -1, -1), permissions[1:10]):
+        if char not in "-STl":
+            mode |= 1 << bit
+    return mode
+
+
+def list_directory(client: Client, remote_dir: str) -> FileListing:
+    """
+    List the files in a directory on a server with a single command. FTP
+    servers that support `MLSD` return the name, size and modification time
+    of every file in one response. Other FTP servers are listed with `LIST`,
+    which is parsed with `parse_list_line` and whose times are assumed to be
+    in UTC. SFTP servers are listed with
+    `listdir_attr`. Sessions of any other type use `Client.list_file_info`.
+
+    Args:
+        client: `Client` object for the server
+        remote_dir: directory on the server to list
+
+    Returns:
+        `FileListing` of the files in the directory
+    """
+    connection = getattr(getattr(client, "session", None), "connection", None)
+    if isinstance(connection, ftplib.FTP):
+        return _list_ftp(connection, remote_dir)
+    if isinstance(connection, paramiko.SFTPClient):
+        return _list_sftp(connection, remote_dir)
+    return FileListing.from_file_info(client.list_file_info(remote_dir))
+
+
+def parse_list_line(
+    line: str, now: datetime.datetime
+) -> Optional[tuple[str, float, int, int]]:
+    """
+    Parse a line of `LIST` output in the Unix (`ls -l`) or DOS format. `LIST`
+    output has no time zone, so times are assumed to be in UTC; a server that
+    lists files in local time has their modification times shifted by its UTC
+    offset. Unix listings omit the year for files modified in the last six
+    months, so the most recent year in which the date exists (eg. a leap year
+    for Feb 29) and that does not put the time in the future is used.
+
+    Args:
+        line: line of `LIST` output
+        now: current time, used to fill in a missing year
+
+    Returns:
+        tuple of file name, modification time, size and mode or None if the
+        line is not a regular file
+    """
+    parts = line.split(maxsplit=8)
+    if len(parts) == 9 and parts[0][:1] in "-dlbcps":
+        if parts[0][0] != "-":
+            return None
+        permissions, _, _, _, size, month, day, time_or_year, name = parts
+        try:
+            if ":" in time_or_year:
+                hour, minute = (int(i) for i in time_or_year.split(":"))
+                # Feb 29 only exists in a leap year, which is at most 8 years ago
+                for year in range(now.year, now.year - 9, -1):
+                    try:
+                        mtime = datetime.datetime(
+                            year,
+                            MONTHS[month.lower()],
+                            int(day),
+                            hour,
+                            minute,
+                            tzinfo=datetime.timezone.utc,
+                        )
+                    except ValueError:
+                        continue
+                    if mtime <= now + datetime.timedelta(days=1):
+                        break
+                else:
+                    return None
+            else:
+                mtime = datetime.datetime(
+                    int(time_or_year),
+                    MONTHS[month.lower()],
+                    int(day),
+                    tzinfo=datetime.timezone.utc,
+                )
+            return name, mtime.timestamp(), int(size), _parse_permissions(permissions)
+        except (KeyError, ValueError):
+            return None
+    parts = line.split(maxsplit=3)
+    if len(parts) == 4 and parts[2].isdigit():
+        try:
+            mtime = datetime.datetime.strptime(
+                f"{parts[0]} {parts[1].upper()}", "%m-%d-%y %I:%M%p"
+            ).replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            return None
+        return parts[3], mtime.timestamp(), int(parts[2]), stat.S_IFREG | 0o644
+    return None
@@ -0,0 +1,105 @@
+"""Logging configuration for the CLI."""
+
+import atexit
+import datetime
+import json
+import logging
+import logging.config
+import logging.handlers
+from typing import Optional
+
+from vendor_file_cli.utils import create_logger_dict
+
+LOG_FORMATS = ("text", "json")
+
+# Loggers configured by `create_logger_dict` and whose levels are set by a bare
+# level passed to `--log-level`.
+LOGGERS = ("file_retriever", "vendor_file_cli")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format each log record as a single line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "app": "vendor_file_cli",
+            "asctime": datetime.datetime.fromtimestamp(record.created)
+            .astimezone()
+            .isoformat(timespec="milliseconds"),
+            "name": record.name,
+            "fileName": record.filename,
+            "lineno": record.lineno,
+            "levelname": record.levelname,
+            "threadName": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# registered once so that whichever listener is current when the process exits
+# is stopped, however many times logging is configured
+atexit.register(_stop_listener)
+
+
+def configure_logging(
+    log_format: str = "text", levels: Optional[dict[str, str]] = None
+) -> None:
+    """
+    Configure logging with `create_logger_dict` and start the background thread
+    that writes log records to the stream and file handlers. Log calls only put
+    records on a queue, so they never wait on file I/O or log rotation. The
+    thread is stopped and the queue flushed when the process exits. Calling
+    this function again replaces the previous configuration.
+
+    Args:
+        log_format: format of log output, `text` or `json` (default text)
+        levels:
+            levels to set on loggers, keyed by logger name (default None). eg.
+            {"file_retriever": "WARNING", "vendor_file_cli.listing": "DEBUG"}
+    """
+    global _listener
+    _stop_listener()
+    logging.config.dictConfig(create_logger_dict(log_format=log_format, levels=levels))
+    handler = logging.getHandlerByName("queue")
+    listener = getattr(handler, "listener", None)
+    if listener is not None:
+        listener.start()
+        _listener = listener
+
+
+def parse_log_levels(values: tuple[str, ...]) -> dict[str, str]:
+    """
+    Parse `--log-level` values into levels keyed by logger name. A value may be
+    a level (eg. `INFO`), which is set on all of the CLI's loggers, or
+    `LOGGER=LEVEL` (eg. `file_retriever=WARNING`) to set the level of a single
+    logger.
+
+    Args:
+        values: values passed to `--log-level`
+
+    Returns:
+        dictionary of level names keyed by logger name
+
+    Raises:
+        ValueError: if a level is not a valid logging level
+    """
+    levels: dict[str, str] = {}
+    for value in values:
+        name, _, level = value.rpartition("=")
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Invalid log level: {level}")
+        for i in (name.strip(),) if name.strip() else LOGGERS:
+            levels[i] = level
+    return levels
@@ -0,0 +1,145 @@
+"""Memo of validation output for records that have already been validated."""
+
+import functools
+import hashlib
+import importlib.metadata
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from vendor_file_cli.config import get_validation_memo_settings
+from vendor_file_cli.utils import read_state, write_state
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "validation_memo.json"
+
+
+def _validator_version() -> Optional[str]:
+    try:
+        return importlib.metadata.version("record-validator")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+class ValidationMemo:
+    """
+    Bounded memo of the output of `validate_single_record`, keyed by a hash of
+    the raw bytes of a record, the tags it is required to contain and the
+    installed version of record-validator.
+    Vendors often send the same records again in corrected or cumulative files
+    and a record that has been seen before is not validated again. The least
+    recently used entries are dropped once the memo holds `max_entries`.
+
+    If `persist` is True the memo is loaded from the state directory when it is
+    created and written back by `save`. A saved memo is ignored if it was
+    written with a different version of record-validator, or if the version
+    cannot be determined.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        persist: Optional[bool] = None,
+        version: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            max_entries:
+                maximum number of records to remember (default None). if None,
+                the size from `get_validation_memo_settings` is used. if 0,
+                nothing is remembered
+            persist:
+                whether to load and save the memo in the state directory
+                (default None). if None, the setting from
+                `get_validation_memo_settings` is used
+            version:
+                version of record-validator (default None). if None, the version
+                of the installed package is used
+        """
+        size, persisted = get_validation_memo_settings()
+        self.max_entries = max_entries if max_entries is not None else size
+        self.version = version or _validator_version()
+        self.persist = (persist if persist is not None else persisted) and bool(
+            self.version
+        )
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        if self.persist and self.max_entries:
+            state = read_state(STATE_FILE)
+            if state.get("version") == self.version:
+                self._entries.update(state.get("entries", {}))
+                self._trim()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """
+        Return a copy of the validation output stored for `key` or None if the
+        record has not been validated.
+        """
+        if not self.max_entries:
+            return None
+        with self._lock:
+            out = self._entries.get(key)
+            if out is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(out)
+
+    def key(self, data: bytes, required_tags: Iterable[str] = ()) -> str:
+        """
+        Return the memo key for the raw bytes of a MARC record. The key also
+        depends on the tags the record is required to contain, so a record
+        validated for a vendor with different required tags is not matched.
+
+        Args:
+            data: raw bytes of the record
+            required_tags: tags of fields the record must contain (default ())
+
+        Returns:
+            hex digest to store the record's validation output under
+        """
+        tags = ",".join(sorted(set(required_tags)))
+        digest = hashlib.sha256(f"{self.version}\0{tags}\0".encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def put(self, key: str, out: dict[str, Any]) -> None:
+        """Store a copy of the validation output for `key`."""
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = dict(out)
+            self._entries.move_to_end(key)
+            self._trim()
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the memo to the state directory if it is persistent and changed."""
+        if not self.persist:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": self.version, "entries": dict(self._entries)}
+            self._dirty = False
+        write_state(STATE_FILE, data)
+        logger.debug(f"Saved validation output for {len(data['entries'])} record(s)")
+
+
+@functools.cache
+def get_validation_memo() -> ValidationMemo:
+    """Return the memo shared by all files validated in this process."""
+    return ValidationMemo()
@@ -0,0 +1,122 @@
+"""Run validation and reporting of vendor files concurrently with file transfers."""
+
+import logging
+import queue
+import threading
+from types import TracebackType
+from typing import Any, Optional, Type
+
+from file_retriever import File
+
+from vendor_file_cli.utils import write_data_to_sheet
+from vendor_file_cli.validator import validate_file
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ValidationPipeline:
+    """
+    Validate files and write the validation output to the google sheet on
+    background threads. Files are passed from the transfer stage to the
+    validation stage, and batches of validation output are passed from the
+    validation stage to the reporting stage, through bounded queues. This allows
+    a file's validation and sheet write to overlap with the download and upload
+    of the next file while limiting the number of files held in memory.
+
+    The pipeline is used as a context manager. On exit all files that were
+    submitted are validated and reported before the worker threads are joined,
+    including when the transfer stage raised an exception. If the run is
+    interrupted (eg. by a `KeyboardInterrupt`) any files still waiting to be
+    validated are logged and dropped.
+    """
+
+    def __init__(self, test: bool, max_pending: int = 4) -> None:
+        """
+        Args:
+            test: whether to write the validation results to the test sheet
+            max_pending:
+                maximum number of files waiting to be validated, and of batches
+                waiting to be written to the google sheet, before the previous
+                stage blocks
+        """
+        self.test = test
+        self._files: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._reports: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._cancelled = threading.Event()
+        self._validator = threading.Thread(
+            target=self._validate_files, name="vendor_file_cli.validator", daemon=True
+        )
+        self._reporter = threading.Thread(
+            target=self._write_reports, name="vendor_file_cli.reporter", daemon=True
+        )
+
+    def __enter__(self) -> "ValidationPipeline":
+        self._validator.start()
+        self._reporter.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is not None and not issubclass(exc_type, Exception):
+            self._cancelled.set()
+        self.close()
+
+    def close(self) -> None:
+        """Wait for all submitted files to be validated and reported."""
+        self._files.put(_STOP)
+        self._validator.join()
+        self._reports.put(_STOP)
+        self._reporter.join()
+
+    def submit(self, file_obj: File, vendor: str) -> None:
+        """
+        Add a file to the validation queue. Blocks if `max_pending` files are
+        already waiting to be validated.
+
+        Args:
+            file_obj: `File` object representing the file to validate
+            vendor: name of vendor to validate file for
+        """
+        self._files.put((file_obj, vendor))
+
+    def _report(self, values: dict, test: bool) -> None:
+        self._reports.put((values, test))
+
+    def _validate_files(self) -> None:
+        while (item := self._files.get()) is not _STOP:
+            file_obj, vendor = item
+            if self._cancelled.is_set():
+                logger.warning(
+                    f"({vendor.upper()}) Run interrupted. {file_obj.file_name} "
+                    "was not validated."
+                )
+                continue
+            try:
+                validate_file(
+                    file_obj=file_obj, vendor=vendor, test=self.test, sink=self._report
+                )
+            except Exception as e:
+                logger.error(
+                    f"({vendor.upper()}) Unable to validate {file_obj.file_name}: {e}"
+                )
+
+    def _write_reports(self) -> None:
+        while (item := self._reports.get()) is not _STOP:
+            values: dict[str, Any]
+            values, test = item
+            if self._cancelled.is_set():
+                logger.warning(
+                    f"({values['vendor_code'][0]}) Run interrupted. Validation data "
+                    f"not written to google sheet for {values['file_name'][0]}."
+                )
+                continue
+            try:
+                write_data_to_sheet(values, test=test)
+            except Exception as e:
+                logger.error(f"Unable to send data to google sheet: {e}")
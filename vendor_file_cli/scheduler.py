@@ -0,0 +1,183 @@
+"""Choose when to poll each vendor based on the vendor's delivery history."""
+
+import datetime
+import logging
+import statistics
+from collections import Counter
+from typing import Iterable, Optional
+
+from vendor_file_cli.utils import read_state, write_state
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 7 * 24
+
+
+def _hour_of_week(timestamp: float) -> int:
+    dt = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+    return dt.weekday() * 24 + dt.hour
+
+
+class DeliveryHistory:
+    """
+    The modification times of files delivered by a vendor. Only the most recent
+    `max_size` deliveries are kept.
+    """
+
+    def __init__(self, mtimes: Iterable[float] = (), max_size: int = 500) -> None:
+        self.max_size = max_size
+        self.mtimes: list[float] = []
+        self.add(mtimes)
+
+    def __len__(self) -> int:
+        return len(self.mtimes)
+
+    def add(self, mtimes: Iterable[float]) -> int:
+        """
+        Add delivery times to the history.
+
+        Args:
+            mtimes: file modification times as seconds since the epoch
+
+        Returns:
+            number of delivery times that were not already in the history
+        """
+        known = set(self.mtimes)
+        new = {float(i) for i in mtimes} - known
+        self.mtimes = sorted(known | new)[-self.max_size :]
+        return len(new)
+
+    @property
+    def typical_gap(self) -> Optional[float]:
+        """Median number of seconds between distinct delivery times."""
+        if len(self.mtimes) < 2:
+            return None
+        gaps = [b - a for a, b in zip(self.mtimes, self.mtimes[1:]) if b - a > 60]
+        return statistics.median(gaps) if gaps else None
+
+    @property
+    def hours(self) -> Counter:
+        """Number of deliveries in each hour of the week (0 is Monday 00:00 UTC)."""
+        return Counter(_hour_of_week(i) for i in self.mtimes)
+
+    def seconds_to_window(self, now: float, margin: int = 1) -> Optional[float]:
+        """
+        Return the number of seconds until the next hour of the week in which the
+        vendor has previously delivered files, widened by `margin` hours on
+        either side. Returns 0 if `now` is inside a delivery window and None if
+        there is no history.
+
+        Args:
+            now: current time as seconds since the epoch
+            margin: number of hours to widen each delivery window by
+
+        Returns:
+            seconds until the next delivery window
+        """
+        hours = self.hours
+        if not hours:
+            return None
+        windows = {
+            (hour + offset) % HOURS_PER_WEEK
+            for hour in hours
+            for offset in range(-margin, margin + 1)
+        }
+        current = _hour_of_week(now)
+        start_of_hour = now - now % 3600
+        for ahead in range(HOURS_PER_WEEK):
+            if (current + ahead) % HOURS_PER_WEEK in windows:
+                return max(0.0, start_of_hour + ahead * 3600 - now)
+        return None
+
+
+class AdaptiveScheduler:
+    """
+    Choose how long to wait before polling each vendor again. Vendors are
+    polled every `min_interval` seconds around the hours of the week in which
+    they have delivered files before, and from shortly before their next
+    delivery is due based on the typical gap between deliveries until half a gap
+    has passed. Outside of those windows the wait doubles after each poll that
+    finds no new files, up to `max_interval` or the start of the next delivery
+    window. Vendors with fewer than
+    `min_history` recorded deliveries are polled at their normal interval.
+
+    Delivery history is saved to `delivery_history.json` in the state directory
+    so that it is kept between runs.
+    """
+
+    state_file = "delivery_history.json"
+
+    def __init__(
+        self,
+        min_interval: float = 5 * 60,
+        max_interval: float = 6 * 60 * 60,
+        min_history: int = 3,
+    ) -> None:
+        """
+        Args:
+            min_interval: seconds between polls inside a delivery window
+            max_interval: maximum number of seconds between polls
+            min_history: number of deliveries needed before adapting intervals
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_history = min_history
+        self.idle_polls: Counter = Counter()
+        self.histories: dict[str, DeliveryHistory] = {
+            vendor: DeliveryHistory(mtimes)
+            for vendor, mtimes in read_state(self.state_file).items()
+        }
+
+    def history(self, vendor: str) -> DeliveryHistory:
+        """Return the `DeliveryHistory` for a vendor."""
+        return self.histories.setdefault(vendor.upper(), DeliveryHistory())
+
+    def next_delay(self, vendor: str, now: float, interval: float) -> float:
+        """
+        Return the number of seconds to wait before polling a vendor again.
+
+        Args:
+            vendor: name of vendor
+            now: current time as seconds since the epoch
+            interval: vendor's normal polling interval in seconds
+
+        Returns:
+            number of seconds until the vendor should next be polled
+        """
+        history = self.history(vendor)
+        if len(history) < self.min_history:
+            return interval
+        gap = history.typical_gap
+        if gap is not None:
+            expected = history.mtimes[-1] + gap
+            if expected - self.min_interval <= now <= expected + gap / 2:
+                return self.min_interval
+        to_window = history.seconds_to_window(now)
+        if to_window == 0:
+            return self.min_interval
+        backoff = min(
+            self.max_interval, interval * 2 ** self.idle_polls[vendor.upper()]
+        )
+        if to_window is not None:
+            backoff = min(backoff, max(to_window, self.min_interval))
+        return backoff
+
+    def record(self, vendor: str, mtimes: Iterable[float]) -> None:
+        """
+        Record the modification times of files found during a poll.
+
+        Args:
+            vendor: name of vendor
+            mtimes: modification times of new files as seconds since the epoch
+        """
+        if self.history(vendor).add(mtimes) > 0:
+            self.idle_polls[vendor.upper()] = 0
+            self.save()
+        else:
+            self.idle_polls[vendor.upper()] += 1
+
+    def save(self) -> None:
+        """Save delivery history to the state directory."""
+        write_state(
+            self.state_file, {k: v.mtimes for k, v in self.histories.items() if v}
+        )
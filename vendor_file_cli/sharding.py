@@ -0,0 +1,443 @@
+"""Split a fetch run across several workers and keep them from copying the same file."""
+
+import abc
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import socket
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import paramiko
+from file_retriever import Client, FileInfo
+
+from vendor_file_cli.config import get_vendor_config, load_vendor_configs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_DIR = "NSDROP/vendor_records/.leases"
+DEFAULT_LEASE_TTL = 60 * 60
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    One of `count` workers sharing a fetch run. Vendors are assigned to workers
+    by a hash of the vendor's name. Files from vendors whose `VendorConfig` has
+    `shard_by_file` set are instead assigned by a hash of the file name so that
+    a vendor with a large backlog is spread across all of the workers. The
+    assignment only depends on the names and `count`, so every worker agrees on
+    it without any coordination.
+
+    Attributes:
+        index: position of this worker, from 1 to `count`
+        count: total number of workers
+    """
+
+    index: int
+    count: int
+
+    def __post_init__(self) -> None:
+        if self.count < 1 or not 1 <= self.index <= self.count:
+            raise ValueError(
+                f"Invalid shard {self.index}/{self.count}. Shard must be between "
+                f"1 and the number of shards."
+            )
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """
+        Create a `Shard` from a string in the form "K/N" (eg. "2/3").
+
+        Raises:
+            ValueError: if `value` is not a valid shard
+        """
+        index, _, count = value.partition("/")
+        try:
+            index_int, count_int = int(index), int(count)
+        except ValueError:
+            raise ValueError(
+                f"Invalid shard {value!r}. Shard should be in the form K/N (eg. 1/3)."
+            )
+        return cls(index=index_int, count=count_int)
+
+    def owns(self, key: str) -> bool:
+        """Whether `key` is assigned to this worker."""
+        return zlib.crc32(key.encode("utf-8")) % self.count == self.index - 1
+
+    def files(self, vendor: str, files: list[FileInfo]) -> list[FileInfo]:
+        """Return the files from `vendor` that this worker should copy."""
+        if not _by_file(vendor):
+            return files
+        return [i for i in files if self.owns(f"{vendor.upper()}/{i.file_name}")]
+
+    def vendors(self, vendors: list[str]) -> list[str]:
+        """Return the vendors that this worker should check for files."""
+        return [i for i in vendors if _by_file(i) or self.owns(i.upper())]
+
+
+def _by_file(vendor: str) -> bool:
+    config = load_vendor_configs().get(vendor.upper())
+    return config is not None and config.shard_by_file
+
+
+class LeaseStore(abc.ABC):
+    """
+    Base class for stores of lease files. A worker holds the lease on a file
+    while it copies it and other workers skip the file until the lease is
+    released. A lease is created with an exclusive create so only one worker can
+    hold it at a time. Leases held with `hold` are renewed by a heartbeat thread
+    every third of `ttl` seconds, so a long copy does not lose its lease. Leases
+    left behind by a worker that stopped without releasing them expire after
+    `ttl` seconds and are then taken over by the next worker that tries to
+    acquire them. To take over an expired lease a worker first creates a
+    takeover marker named after the content of that lease, again with an
+    exclusive create, and checks that the lease has not changed since it was
+    read before replacing it. Only one worker can create the marker for a given
+    expired lease, so when several workers find the same expired lease only one
+    of them takes it over. A marker left behind by a worker that stopped during
+    a takeover expires after `ttl` seconds like a lease.
+    """
+
+    def __init__(self, root: str, ttl: float = DEFAULT_LEASE_TTL) -> None:
+        """
+        Args:
+            root: directory containing the lease files
+            ttl: number of seconds after which an unreleased lease expires
+        """
+        self.root = root
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._held: set[str] = set()
+        self._lock = threading.Lock()
+        self._released = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @abc.abstractmethod
+    def _create(self, path: str, data: bytes) -> bool:
+        """Create the file at `path` only if it does not exist."""
+
+    @abc.abstractmethod
+    def _join(self, *paths: str) -> str:
+        """Join paths using the store's path separator."""
+
+    @abc.abstractmethod
+    def _read(self, path: str) -> Optional[tuple[bytes, float]]:
+        """Return the content and modification time of `path` or None."""
+
+    @abc.abstractmethod
+    def _remove(self, path: str) -> None:
+        """Remove the file at `path` if it exists."""
+
+    @abc.abstractmethod
+    def _replace(self, path: str, data: bytes) -> bool:
+        """Atomically replace the file at `path`, whether or not it exists."""
+
+    def _data(self) -> bytes:
+        return json.dumps(
+            {"owner": self.owner, "expires": time.time() + self.ttl}
+        ).encode("utf-8")
+
+    def _expired(self, lease: tuple[bytes, float]) -> bool:
+        data, mtime = lease
+        try:
+            expires = float(json.loads(data)["expires"])
+        except (ValueError, KeyError, TypeError):
+            expires = mtime + self.ttl
+        return expires < time.time()
+
+    def _marker(self, path: str, data: bytes) -> str:
+        return f"{path}.{hashlib.sha256(data).hexdigest()[:12]}.takeover"
+
+    def _owned(self, path: str) -> bool:
+        lease = self._read(path)
+        if lease is None:
+            return False
+        try:
+            return json.loads(lease[0])["owner"] == self.owner
+        except (ValueError, KeyError, TypeError):
+            return False
+
+    def _path(self, key: str) -> str:
+        return self._join(self.root, f"{key.replace('/', '_')}.lease")
+
+    def _take_over(self, path: str, lease: tuple[bytes, float]) -> bool:
+        marker = self._marker(path, lease[0])
+        if not self._create(marker, self._data()):
+            # another worker is taking over the lease or stopped while doing so
+            current = self._read(marker)
+            if current is not None and self._expired(current):
+                self._remove(marker)
+            return False
+        try:
+            current = self._read(path)
+            if current is None or current[0] != lease[0]:
+                return False
+            return self._replace(path, self._data())
+        finally:
+            self._remove(marker)
+
+    def _renew_held(self) -> None:
+        while not self._released.wait(self.ttl / 3):
+            with self._lock:
+                keys = list(self._held)
+            for key in keys:
+                self.renew(key)
+        with self._lock:
+            self._heartbeat = None
+            if self._held:
+                self._start_heartbeat()
+
+    def _start_heartbeat(self) -> None:
+        self._released.clear()
+        self._heartbeat = threading.Thread(
+            target=self._renew_held, name="vendor_file_cli.lease-heartbeat", daemon=True
+        )
+        self._heartbeat.start()
+
+    def acquire(self, key: str) -> bool:
+        """
+        Try to acquire the lease on `key`.
+
+        Args:
+            key: name of the lease (eg. "EASTVIEW/foo.mrc")
+
+        Returns:
+            whether the lease was acquired
+        """
+        path = self._path(key)
+        if self._create(path, self._data()):
+            return True
+        lease = self._read(path)
+        if lease is None:
+            return self._create(path, self._data())
+        if not self._expired(lease):
+            return False
+        logger.warning(f"Lease on {key} has expired. Taking over lease.")
+        return self._take_over(path, lease)
+
+    @contextlib.contextmanager
+    def hold(self, key: str) -> Iterator[bool]:
+        """
+        Context manager which tries to acquire the lease on `key`, renews it
+        with the store's heartbeat thread while it is held and releases it on
+        exit if it was acquired.
+
+        Args:
+            key: name of the lease (eg. "EASTVIEW/foo.mrc")
+
+        Yields:
+            whether the lease was acquired
+        """
+        acquired = self.acquire(key)
+        if acquired:
+            with self._lock:
+                self._held.add(key)
+                if self._heartbeat is None:
+                    self._start_heartbeat()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with self._lock:
+                    self._held.discard(key)
+                    if not self._held:
+                        self._released.set()
+                self.release(key)
+
+    def release(self, key: str) -> None:
+        """Release the lease on `key` if it is held by this store."""
+        path = self._path(key)
+        if self._owned(path):
+            self._remove(path)
+
+    def renew(self, key: str) -> bool:
+        """
+        Extend the lease on `key` by `ttl` seconds if it is held by this store.
+
+        Args:
+            key: name of the lease (eg. "EASTVIEW/foo.mrc")
+
+        Returns:
+            whether the lease was renewed
+        """
+        path = self._path(key)
+        if not self._owned(path):
+            logger.warning(f"Unable to renew lease on {key}. Lease is not held.")
+            return False
+        return self._replace(path, self._data())
+
+
+class LocalLeaseStore(LeaseStore):
+    """Lease files stored in a local (or network mounted) directory."""
+
+    def __init__(self, root: str, ttl: float = DEFAULT_LEASE_TTL) -> None:
+        super().__init__(root=root, ttl=ttl)
+        os.makedirs(root, exist_ok=True)
+
+    def _create(self, path: str, data: bytes) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        return True
+
+    def _join(self, *paths: str) -> str:
+        return os.path.join(*paths)
+
+    def _read(self, path: str) -> Optional[tuple[bytes, float]]:
+        try:
+            with open(path, "rb") as fh:
+                return fh.read(), os.fstat(fh.fileno()).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, path: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+    def _replace(self, path: str, data: bytes) -> bool:
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return False
+        return True
+
+
+class SFTPLeaseStore(LeaseStore):
+    """Lease files stored in a directory on an SFTP server (eg. NSDROP)."""
+
+    def __init__(
+        self, connection: paramiko.SFTPClient, root: str, ttl: float = DEFAULT_LEASE_TTL
+    ) -> None:
+        """
+        Args:
+            connection: open SFTP connection to the server
+            root: directory on the server containing the lease files
+            ttl: number of seconds after which an unreleased lease expires
+        """
+        super().__init__(root=root, ttl=ttl)
+        self.connection = connection
+        try:
+            self.connection.stat(root)
+        except OSError:
+            self.connection.mkdir(root)
+
+    def _create(self, path: str, data: bytes) -> bool:
+        try:
+            with self.connection.open(path, "wx") as fh:
+                fh.write(data)
+        except OSError:
+            return False
+        return True
+
+    def _join(self, *paths: str) -> str:
+        return posixpath.join(*paths)
+
+    def _read(self, path: str) -> Optional[tuple[bytes, float]]:
+        try:
+            with self.connection.open(path, "r") as fh:
+                return fh.read(), float(fh.stat().st_mtime or 0)
+        except OSError:
+            return None
+
+    def _remove(self, path: str) -> None:
+        with contextlib.suppress(OSError):
+            self.connection.remove(path)
+
+    def _replace(self, path: str, data: bytes) -> bool:
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with self.connection.open(tmp_path, "wx") as fh:
+                fh.write(data)
+            self.connection.posix_rename(tmp_path, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                self.connection.remove(tmp_path)
+            return False
+        return True
+
+
+@contextlib.contextmanager
+def claim_file(
+    vendor: str, file: FileInfo, nsdrop_client: Client, leases: LeaseStore
+) -> Iterator[bool]:
+    """
+    Context manager which holds the lease on a vendor's file while it is copied.
+    The file is only claimed if the lease is acquired and the file has not been
+    copied to NSDROP by another worker since the files on NSDROP were listed.
+
+    Args:
+        vendor: name of vendor
+        file: `FileInfo` object representing the file to copy
+        nsdrop_client: `Client` object for the NSDROP server
+        leases: `LeaseStore` to hold the lease in
+
+    Yields:
+        whether this worker should copy the file
+    """
+    dst = get_vendor_config(vendor).dst
+    with leases.hold(f"{vendor.upper()}/{file.file_name}") as acquired:
+        if not acquired:
+            logger.info(
+                f"({nsdrop_client.name}) Skipping {file.file_name}. File is being "
+                "copied by another worker."
+            )
+            yield False
+        elif nsdrop_client.check_file(file=file, dir=dst, remote=True):
+            logger.info(
+                f"({nsdrop_client.name}) Skipping {file.file_name}. File was copied "
+                "by another worker."
+            )
+            yield False
+        else:
+            yield True
+
+
+def open_lease_store(
+    nsdrop_client: Client, lease_dir: Optional[str] = None
+) -> LeaseStore:
+    """
+    Return the `LeaseStore` used by a sharded run. Leases are stored in
+    `lease_dir` on the local filesystem if it is provided and otherwise on
+    NSDROP in the directory set by the `NSDROP_LEASE_DIR` env var (default
+    "NSDROP/vendor_records/.leases").
+
+    Args:
+        nsdrop_client: `Client` object for the NSDROP server
+        lease_dir: local directory to store leases in (default None)
+
+    Returns:
+        `LeaseStore` object
+
+    Raises:
+        ValueError: if leases are stored on NSDROP and it is not an SFTP server
+    """
+    if lease_dir is not None:
+        return LocalLeaseStore(lease_dir)
+    connection = getattr(nsdrop_client.session, "connection", None)
+    if not isinstance(connection, paramiko.SFTPClient):
+        raise ValueError(
+            "Leases can only be stored on an SFTP server. Use a local lease "
+            "directory instead."
+        )
+    return SFTPLeaseStore(
+        connection, os.environ.get("NSDROP_LEASE_DIR", DEFAULT_LEASE_DIR)
+    )
@@ -0,0 +1,230 @@
+"""Structural checks of MARC21 records made on their raw bytes."""
+
+from typing import Any, Iterable, Optional, Union
+
+from pymarc import Field, Indicators, Record, Subfield, marc8_to_unicode
+
+LEADER_LENGTH = 24
+DIRECTORY_ENTRY_LENGTH = 12
+FIELD_TERMINATOR = 0x1E
+RECORD_TERMINATOR = 0x1D
+SUBFIELD_DELIMITER = b"\x1f"
+
+
+def _digits(data: bytes) -> Optional[int]:
+    return int(data) if data.isdigit() else None
+
+
+class MarcView:
+    """
+    Read-only view of a MARC21 record in transmission format. Only the leader
+    and directory are read when the view is created. Fields are decoded into
+    pymarc `Field` objects when they are looked up, so a record whose fields
+    are never inspected is never fully parsed. A view can be used in place of
+    a pymarc `Record` by `get_control_number` and `validate_single_record`.
+
+    The record length and base address in the leader must match the data, the
+    directory must be made of complete 12-byte entries and every entry must
+    point to a field that ends with a field terminator inside the record.
+    Problems are recorded in `errors` rather than raised.
+
+    Attributes:
+        data: raw bytes of the record, including its record terminator
+        errors:
+            parts of the record whose structure is invalid (`leader` or
+            `directory`). fields after an invalid directory entry are not
+            available
+    """
+
+    def __init__(self, data: bytes) -> None:
+        """
+        Args:
+            data: raw bytes of a single record, including its record terminator
+        """
+        self.data = data
+        self.errors: list[str] = []
+        self._entries: list[tuple[str, int, int]] = []
+        self._parse()
+
+    def _decode(self, data: bytes) -> str:
+        if self.utf8:
+            return data.decode("utf-8", errors="replace")
+        return marc8_to_unicode(data, hide_utf8_warnings=True)
+
+    def _field(self, tag: str, start: int, end: int) -> Field:
+        data = self.data[start:end]
+        if tag < "010" and tag.isdigit():
+            if self.utf8:
+                return Field(tag=tag, data=data.decode("utf-8", errors="replace"))
+            return Field(tag=tag, data=data.decode("iso8859-1"))
+        indicators, *subfields = data.split(SUBFIELD_DELIMITER)
+        first, second = (indicators.decode("ascii", errors="replace") + "  ")[:2]
+        return Field(
+            tag=tag,
+            indicators=Indicators(first, second),
+            subfields=[
+                Subfield(
+                    code=i[:1].decode("ascii", errors="replace"),
+                    value=self._decode(i[1:]),
+                )
+                for i in subfields
+                if i
+            ],
+        )
+
+    def _parse(self) -> None:
+        data = self.data
+        length = _digits(data[:5])
+        base_address = _digits(data[12:17])
+        if (
+            len(data) <= LEADER_LENGTH
+            or length != len(data)
+            or data[-1] != RECORD_TERMINATOR
+            or base_address is None
+            or not LEADER_LENGTH < base_address < len(data)
+        ):
+            self.errors.append("leader")
+            return
+        directory = data[LEADER_LENGTH : base_address - 1]
+        if (
+            data[base_address - 1] != FIELD_TERMINATOR
+            or not directory
+            or len(directory) % DIRECTORY_ENTRY_LENGTH
+        ):
+            self.errors.append("directory")
+            return
+        for i in range(0, len(directory), DIRECTORY_ENTRY_LENGTH):
+            entry = directory[i : i + DIRECTORY_ENTRY_LENGTH]
+            field_length = _digits(entry[3:7])
+            offset = _digits(entry[7:12])
+            if field_length is None or offset is None:
+                self.errors.append("directory")
+                return
+            start = base_address + offset
+            end = start + field_length - 1
+            if (
+                field_length < 1
+                or end >= len(data) - 1
+                or data[end] != FIELD_TERMINATOR
+            ):
+                self.errors.append("directory")
+                return
+            self._entries.append(
+                (entry[:3].decode("ascii", errors="replace"), start, end)
+            )
+
+    @property
+    def control_number(self) -> Optional[str]:
+        """Data in the record's 001 field or None if it has none."""
+        field = self.get("001")
+        return field.data if field is not None else None
+
+    @property
+    def field_count(self) -> int:
+        """Number of fields in the record's directory."""
+        return len(self._entries)
+
+    @property
+    def fields(self) -> list[Field]:
+        """All of the record's fields, decoded."""
+        return [self._field(*i) for i in self._entries]
+
+    @property
+    def leader(self) -> str:
+        """The record's leader."""
+        return self.data[:LEADER_LENGTH].decode("ascii", errors="replace")
+
+    @property
+    def tags(self) -> list[str]:
+        """Tags of the fields in the record's directory, in order."""
+        return [i[0] for i in self._entries]
+
+    @property
+    def utf8(self) -> bool:
+        """Whether the leader says the record is encoded in UTF-8."""
+        return self.data[9:10] == b"a"
+
+    def get(self, tag: str, default: Optional[Field] = None) -> Optional[Field]:
+        """Return the first field with `tag`, decoded, or `default`."""
+        for entry in self._entries:
+            if entry[0] == tag:
+                return self._field(*entry)
+        return default
+
+    def get_fields(self, *tags: str) -> list[Field]:
+        """Return the fields with any of `tags`, decoded, or all fields."""
+        return [self._field(*i) for i in self._entries if not tags or i[0] in tags]
+
+    def missing(self, required_tags: Iterable[str]) -> list[str]:
+        """Return the tags in `required_tags` that are not in the record."""
+        present = set(self.tags)
+        return [i for i in required_tags if i not in present]
+
+    def to_record(self) -> Record:
+        """Return the record as a pymarc `Record`."""
+        record = Record(leader=self.leader)
+        record.add_field(*self.fields)
+        return record
+
+
+def prevalidate(
+    view: Union[MarcView, Record], required_tags: Iterable[str] = ()
+) -> Optional[dict[str, Any]]:
+    """
+    Reject a record whose structure is invalid or that is missing a required
+    field before it is validated with the `RecordModel`. The output has the
+    same keys as the output of `validate_single_record`. Structural errors are
+    reported as invalid fields and missing tags as missing fields. A pymarc
+    `Record` is only checked for missing tags.
+
+    Args:
+        view: `MarcView` of the record or pymarc `Record` from `read_record`
+        required_tags: tags of fields every record must contain (default ())
+
+    Returns:
+        dictionary with validation output or None if the record should be
+        validated with the `RecordModel`
+    """
+    if isinstance(view, MarcView):
+        errors = view.errors
+        missing = [] if errors else view.missing(required_tags)
+    else:
+        errors = []
+        present = {i.tag for i in view.fields}
+        missing = [i for i in required_tags if i not in present]
+    if not errors and not missing:
+        return None
+    return {
+        "valid": False,
+        "error_count": len(errors) + len(missing),
+        "missing_field_count": len(missing),
+        "missing_fields": missing,
+        "extra_field_count": 0,
+        "extra_fields": [],
+        "invalid_field_count": len(errors),
+        "invalid_fields": list(errors),
+        "order_item_mismatches": [],
+    }
+
+
+def read_record(data: bytes) -> Union[MarcView, Record]:
+    """
+    Read a record as a `MarcView`. The view's structural checks are stricter
+    than pymarc's (eg. pymarc does not check the field terminator at the end of
+    the directory), so if the view finds the structure invalid the record is
+    parsed with pymarc instead and is only reported as malformed if pymarc
+    cannot read it either.
+
+    Args:
+        data: raw bytes of a single record, including its record terminator
+
+    Returns:
+        `MarcView` of the record or pymarc `Record` if only pymarc can read it
+    """
+    view = MarcView(data)
+    if not view.errors:
+        return view
+    try:
+        return Record(data=data, hide_utf8_warnings=True)
+    except Exception:
+        return view
@@ -0,0 +1,235 @@
+"""Limit the rate of transfers to and from each server with token buckets."""
+
+import io
+import logging
+import threading
+import time
+from typing import BinaryIO, Callable, Iterable, Optional
+
+from vendor_file_cli.config import get_global_rate_limits, load_vendor_configs
+
+logger = logging.getLogger(__name__)
+
+# Key used for the limits shared by all servers.
+GLOBAL = "GLOBAL"
+
+
+class TokenBucket:
+    """
+    Token bucket which refills at `rate` tokens per second up to `capacity`
+    tokens. `reserve` takes tokens immediately, even if that leaves the bucket
+    in debt, and returns how long the caller should wait before using them. This
+    means concurrent callers are served in the order they arrive and a request
+    larger than the capacity of the bucket is paced rather than refused.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            rate: tokens added to the bucket per second
+            capacity:
+                maximum number of tokens in the bucket (default None). if None,
+                the bucket holds one second of tokens (and at least one token)
+            clock: function returning the current time in seconds
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._updated = clock()
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens from the bucket.
+
+        Args:
+            amount: number of tokens to take
+
+        Returns:
+            number of seconds to wait before the tokens are available
+        """
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def set_rate(self, rate: float, capacity: Optional[float] = None) -> None:
+        """Change the rate (and capacity) of the bucket, keeping any debt."""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity if capacity is not None else max(rate, 1.0)
+            self.tokens = min(self.tokens, self.capacity)
+
+
+class ThrottledStream(io.RawIOBase):
+    """
+    Read-only stream which paces reads from a wrapped binary stream with a
+    `Throttle`.
+    """
+
+    def __init__(self, stream: BinaryIO, throttle: "Throttle", name: str) -> None:
+        """
+        Args:
+            stream: stream to read from
+            throttle: `Throttle` to pace reads with
+            name: name of the server the data is sent to or read from
+        """
+        super().__init__()
+        self.stream = stream
+        self.throttle = throttle
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        data = self.stream.read(len(buffer))
+        self.throttle.wait(self.name, size=len(data), ops=0)
+        buffer[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.stream.seek(offset, whence)
+
+    def seekable(self) -> bool:
+        return self.stream.seekable()
+
+    def tell(self) -> int:
+        return self.stream.tell()
+
+
+class Throttle:
+    """
+    Limits on the bytes and transfers per second to and from each server, plus
+    limits shared by all servers. Each limit is a `TokenBucket`. A transfer
+    takes tokens from the buckets of the server it is sent to or read from and
+    from the global buckets, so a file copied from a vendor to NSDROP counts
+    against the global limits in both directions.
+
+    Limits are read from each server's `VendorConfig` and from
+    `get_global_rate_limits`. `reload` re-reads them without losing the state of
+    the buckets, so limits can be changed while transfers are running.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """
+        Args:
+            clock: function returning the current time in seconds
+            sleep: function used to wait for tokens
+        """
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.buckets: dict[tuple[str, str], TokenBucket] = {}
+        self.reload()
+
+    def _buckets(self, names: Iterable[str]) -> list[tuple[str, TokenBucket]]:
+        with self._lock:
+            return [
+                (kind, bucket)
+                for name in names
+                for kind in ("bytes", "ops")
+                if (bucket := self.buckets.get((name, kind))) is not None
+            ]
+
+    def limits(self) -> dict[str, tuple[Optional[float], Optional[float]]]:
+        """Return the bytes and transfers per second allowed for each server."""
+        with self._lock:
+            limits: dict[str, tuple[Optional[float], Optional[float]]] = {}
+            for name in {name for name, _ in self.buckets}:
+                bytes_bucket = self.buckets.get((name, "bytes"))
+                ops_bucket = self.buckets.get((name, "ops"))
+                limits[name] = (
+                    bytes_bucket.rate if bytes_bucket else None,
+                    ops_bucket.rate if ops_bucket else None,
+                )
+            return limits
+
+    def reload(self) -> None:
+        """Read the limits for each server from its `VendorConfig`."""
+        limits = {GLOBAL: get_global_rate_limits()}
+        for name, config in load_vendor_configs().items():
+            limits[name] = (config.bytes_per_second, config.ops_per_second)
+        current = self.limits()
+        for name in current.keys() - limits.keys():
+            self.set_limit(name)
+        for name, (bytes_per_second, ops_per_second) in limits.items():
+            if current.get(name, (None, None)) != (bytes_per_second, ops_per_second):
+                self.set_limit(name, bytes_per_second, ops_per_second)
+
+    def set_limit(
+        self,
+        name: str,
+        bytes_per_second: Optional[float] = None,
+        ops_per_second: Optional[float] = None,
+    ) -> None:
+        """
+        Change the limits for a server. Transfers already waiting on the old
+        limits are not interrupted.
+
+        Args:
+            name: name of server (eg. EASTVIEW, NSDROP) or GLOBAL
+            bytes_per_second: maximum bytes per second or None for no limit
+            ops_per_second: maximum transfers per second or None for no limit
+        """
+        name = name.upper()
+        with self._lock:
+            for kind, rate in (("bytes", bytes_per_second), ("ops", ops_per_second)):
+                bucket = self.buckets.get((name, kind))
+                if not rate:
+                    self.buckets.pop((name, kind), None)
+                elif bucket is None:
+                    self.buckets[(name, kind)] = TokenBucket(rate, clock=self._clock)
+                else:
+                    bucket.set_rate(rate)
+        if bytes_per_second or ops_per_second:
+            logger.info(
+                f"({name}) Transfers limited to {bytes_per_second or 'unlimited'} "
+                f"bytes/s and {ops_per_second or 'unlimited'} transfers/s."
+            )
+        else:
+            logger.info(f"({name}) Transfers are not rate limited.")
+
+    def stream(self, stream: BinaryIO, name: str) -> ThrottledStream:
+        """Return `stream` wrapped so that reads are paced for server `name`."""
+        return ThrottledStream(stream, self, name.upper())
+
+    def wait(self, name: str, size: int = 0, ops: int = 1) -> float:
+        """
+        Take tokens for a transfer to or from a server and wait until they are
+        available.
+
+        Args:
+            name: name of server (eg. EASTVIEW, NSDROP)
+            size: number of bytes to be transferred
+            ops: number of transfers
+
+        Returns:
+            number of seconds spent waiting
+        """
+        delay = 0.0
+        for kind, bucket in self._buckets([name.upper(), GLOBAL]):
+            amount = size if kind == "bytes" else ops
+            if amount:
+                delay = max(delay, bucket.reserve(amount))
+        if delay > 0:
+            self._sleep(delay)
+        return delay
@@ -0,0 +1,182 @@
+"""Store Google Sheets API access tokens on disk and refresh them in the background."""
+
+import contextlib
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Generator, Optional
+
+from vendor_file_cli.utils import file_lock
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FILE = "sheet_token.json"
+
+# Seconds before a token expires that the background refresher replaces it.
+REFRESH_MARGIN = 300.0
+
+EXPIRY_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class TokenStore:
+    """
+    Access token for the Google Sheets API and its expiry, saved to a JSON
+    file so that a token is reused by later calls and other processes until
+    it expires rather than refreshed every time credentials are built. Reads
+    and writes of the file are made while holding an exclusive lock on a
+    separate lock file, so a process that holds `locked` while it refreshes
+    the token makes other processes wait for the new token rather than
+    refresh it again.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time) -> None:
+        """
+        Args:
+            path: path to JSON file to store the token in
+            clock: function returning the current time in seconds since the epoch
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._clock = clock
+
+    def expires_in(self) -> Optional[float]:
+        """
+        Return the number of seconds until the stored token expires or None if
+        no token is stored or its expiry cannot be read.
+        """
+        expiry = self.load().get("expiry")
+        if expiry is None:
+            return None
+        try:
+            expires = datetime.datetime.strptime(expiry, EXPIRY_FORMAT).replace(
+                tzinfo=datetime.timezone.utc
+            )
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Unable to read token expiry from {self.path}: {e}")
+            return None
+        return expires.timestamp() - self._clock()
+
+    def load(self) -> dict[str, Any]:
+        """
+        Return the stored token and its expiry (in `EXPIRY_FORMAT`, UTC) or an
+        empty dictionary if no token is stored or the file cannot be read.
+        """
+        try:
+            with open(self.path, "r") as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read token from {self.path}: {e}")
+            return {}
+        if not data.get("token") or not data.get("expiry"):
+            return {}
+        return data
+
+    @contextlib.contextmanager
+    def locked(self) -> Generator["TokenStore", None, None]:
+        """Hold the store's lock file exclusively, waiting for other holders."""
+        with file_lock(self.lock_path):
+            yield self
+
+    def save(self, token: Optional[str], expiry: Optional[datetime.datetime]) -> None:
+        """
+        Save a token and its expiry. The file is written to a temporary file,
+        which is only readable by the current user, and then moved into place.
+        Tokens without an expiry are not saved.
+
+        Args:
+            token: access token
+            expiry: time the token expires as a naive datetime in UTC
+        """
+        if not token or not isinstance(expiry, datetime.datetime):
+            return
+        data = {"token": token, "expiry": expiry.strftime(EXPIRY_FORMAT)}
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or None, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump(data, fh)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Unable to save token to {self.path}: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+
+
+class TokenRefresher:
+    """
+    Refresh the token in a `TokenStore` on a background thread `margin`
+    seconds before it expires, so that credentials built while writing to the
+    google sheet never wait for a refresh. If no token is stored the token is
+    refreshed when the thread starts. A failed refresh is logged and tried
+    again after `retry` seconds.
+    """
+
+    def __init__(
+        self,
+        store: TokenStore,
+        refresh: Callable[[], Any],
+        margin: float = REFRESH_MARGIN,
+        retry: float = 60.0,
+    ) -> None:
+        """
+        Args:
+            store: `TokenStore` whose token is refreshed
+            refresh: function that refreshes the token and saves it to `store`
+            margin: seconds before expiry to refresh the token (default 300)
+            retry: seconds to wait after a failed refresh (default 60)
+        """
+        self.store = store
+        self.refresh = refresh
+        self.margin = margin
+        self.retry = retry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "TokenRefresher":
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    def _delay(self) -> float:
+        try:
+            expires_in = self.store.expires_in()
+        except Exception as e:
+            logger.warning(f"Unable to read Google Sheet API token expiry: {e}")
+            return 0.0
+        if expires_in is None:
+            return 0.0
+        return max(0.0, expires_in - self.margin)
+
+    def _run(self) -> None:
+        delay = self._delay()
+        while not self._stop.wait(delay):
+            try:
+                self.refresh()
+                logger.debug("Refreshed Google Sheet API token.")
+            except Exception as e:
+                logger.warning(f"Unable to refresh Google Sheet API token: {e}")
+            delay = self._delay() or self.retry
+
+    def start(self) -> None:
+        """Start refreshing the token on a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="vendor_file_cli.token-refresher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,500 @@
+"""Copy files from several vendors to NSDROP on parallel workers."""
+
+import contextlib
+import datetime
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+
+from file_retriever import Client, FileInfo
+from file_retriever.errors import FileRetrieverError
+
+from vendor_file_cli.cache import ContentCache
+from vendor_file_cli.concurrency import ConcurrencyController
+from vendor_file_cli.config import get_vendor_config, load_vendor_configs
+from vendor_file_cli.deadlines import (
+    Deadline,
+    DeadlineExceeded,
+    OperationTimeout,
+    released,
+)
+from vendor_file_cli.dedupe import HashIndex
+from vendor_file_cli.journal import RunJournal
+from vendor_file_cli.sharding import LeaseStore, Shard, claim_file, open_lease_store
+from vendor_file_cli.throttle import Throttle
+from vendor_file_cli.utils import connect
+from vendor_file_cli.validator import get_single_file, get_vendor_file_list
+
+if TYPE_CHECKING:
+    from vendor_file_cli.pipeline import ValidationPipeline
+
+logger = logging.getLogger(__name__)
+
+# Used to predict how long a transfer will take.
+DEFAULT_BYTES_PER_SECOND = 1024 * 1024
+DEFAULT_OVERHEAD = 1.0
+
+
+@dataclass(frozen=True)
+class TransferTask:
+    """A file to copy from a vendor's server to NSDROP."""
+
+    vendor: str
+    file: FileInfo
+
+    @property
+    def size(self) -> int:
+        """Size of the file in bytes."""
+        return int(self.file.file_size or 0)
+
+    def estimate(
+        self,
+        bytes_per_second: float = DEFAULT_BYTES_PER_SECOND,
+        overhead: float = DEFAULT_OVERHEAD,
+    ) -> float:
+        """Predicted number of seconds needed to copy the file."""
+        return overhead + self.size / bytes_per_second
+
+
+class TransferQueue:
+    """
+    Hand out transfer tasks longest-first. Each vendor's tasks are kept in
+    their own queue sorted by file size and the next task is the largest file
+    from any vendor that has fewer transfers in progress than its limit
+    (`max_sessions` from its `VendorConfig` by default). Ties are broken in
+    favour of the vendor with the fewest transfers in progress, so a vendor with
+    many large files cannot hold every worker and starting the largest files
+    first keeps a single large file from being left until the end of the run.
+
+    If a `ConcurrencyController` is provided, its current limits are used
+    instead, and the total number of transfers in progress is also kept below
+    the limit for NSDROP.
+
+    The queue can be shared by worker threads. `get` blocks while every vendor
+    with pending tasks is at its limit.
+    """
+
+    def __init__(
+        self,
+        tasks: Iterable[TransferTask],
+        limits: Optional[dict[str, int]] = None,
+        controller: Optional[ConcurrencyController] = None,
+    ) -> None:
+        """
+        Args:
+            tasks: `TransferTask` objects to hand out
+            limits:
+                maximum number of concurrent transfers for each vendor
+                (default None). vendors that are not included use the
+                `max_sessions` from their `VendorConfig`
+            controller:
+                `ConcurrencyController` to take the limits from (default None)
+        """
+        by_vendor: dict[str, list[TransferTask]] = defaultdict(list)
+        for task in tasks:
+            by_vendor[task.vendor.upper()].append(task)
+        self._pending = {
+            vendor: deque(sorted(vendor_tasks, key=lambda i: i.size, reverse=True))
+            for vendor, vendor_tasks in by_vendor.items()
+        }
+        configs = load_vendor_configs()
+        self.limits = {
+            vendor: max(
+                1,
+                (limits or {}).get(vendor)
+                or (configs[vendor].max_sessions if vendor in configs else 1),
+            )
+            for vendor in self._pending
+        }
+        self.controller = controller
+        self.in_flight: Counter = Counter()
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return sum(len(i) for i in self._pending.values())
+
+    def _limit(self, vendor: str) -> int:
+        if self.controller is not None:
+            return self.controller.limit(vendor)
+        return self.limits[vendor]
+
+    def _next(self) -> Optional[TransferTask]:
+        if self.controller is not None and sum(
+            self.in_flight.values()
+        ) >= self.controller.limit("NSDROP"):
+            return None
+        best: Optional[str] = None
+        best_key: tuple[int, int] = (-1, 0)
+        for vendor, pending in self._pending.items():
+            if not pending or self.in_flight[vendor] >= self._limit(vendor):
+                continue
+            key = (pending[0].size, -self.in_flight[vendor])
+            if best is None or key > best_key:
+                best, best_key = vendor, key
+        if best is None:
+            return None
+        self.in_flight[best] += 1
+        return self._pending[best].popleft()
+
+    def done(self, task: TransferTask) -> None:
+        """Mark a task returned by `get` or `pop` as finished."""
+        with self._condition:
+            self.in_flight[task.vendor.upper()] -= 1
+            self._condition.notify_all()
+
+    def get(
+        self, on_wait: Optional[Callable[[], None]] = None
+    ) -> Optional[TransferTask]:
+        """
+        Return the next task, waiting for a vendor to drop below its limit if
+        necessary. Returns None when there are no tasks left.
+
+        Args:
+            on_wait: function to call before waiting (default None)
+        """
+        with self._condition:
+            while len(self) > 0:
+                task = self._next()
+                if task is not None:
+                    return task
+                if on_wait is not None:
+                    on_wait()
+                self._condition.wait()
+            return None
+
+    def pop(self) -> Optional[TransferTask]:
+        """Return the next task or None if every vendor is at its limit."""
+        with self._condition:
+            return self._next()
+
+
+def plan_makespan(
+    tasks: list[TransferTask],
+    workers: int,
+    limits: Optional[dict[str, int]] = None,
+    bytes_per_second: float = DEFAULT_BYTES_PER_SECOND,
+    overhead: float = DEFAULT_OVERHEAD,
+) -> float:
+    """
+    Predict how long it will take `workers` workers to copy `tasks` when they
+    take tasks from a `TransferQueue`, using each task's `estimate`.
+
+    Args:
+        tasks: `TransferTask` objects to copy
+        workers: number of workers
+        limits: maximum number of concurrent transfers for each vendor
+        bytes_per_second: expected transfer rate of each worker
+        overhead: expected number of seconds spent on each file besides transfer
+
+    Returns:
+        predicted number of seconds until the last transfer finishes
+    """
+    queue = TransferQueue(tasks, limits=limits)
+    free = [0.0] * max(1, workers)
+    running: list[tuple[float, int, TransferTask]] = []
+    sequence = itertools.count()
+    makespan = 0.0
+    while len(queue) > 0:
+        now = heapq.heappop(free)
+        while running and running[0][0] <= now:
+            queue.done(heapq.heappop(running)[2])
+        task = queue.pop()
+        if task is None:
+            # every vendor with files left is at its limit. wait for the next
+            # transfer to finish
+            heapq.heappush(free, running[0][0])
+            continue
+        end = now + task.estimate(bytes_per_second, overhead)
+        heapq.heappush(running, (end, next(sequence), task))
+        heapq.heappush(free, end)
+        makespan = max(makespan, end)
+    return makespan
+
+
+@dataclass
+class TransferReport:
+    """Outcome of `run_transfers`."""
+
+    predicted_makespan: float
+    actual_makespan: float = 0.0
+    copied: list[TransferTask] = field(default_factory=list)
+    failed: list[TransferTask] = field(default_factory=list)
+    not_started: list[TransferTask] = field(default_factory=list)
+    skipped: list[TransferTask] = field(default_factory=list)
+
+
+def list_transfer_tasks(
+    vendors: list[str],
+    timedelta: datetime.timedelta,
+    shard: Optional[Shard] = None,
+    deadline: Optional[Deadline] = None,
+    journal: Optional[RunJournal] = None,
+) -> list[TransferTask]:
+    """
+    List the files on each vendor's server that are not on NSDROP. Vendors
+    whose servers cannot be reached or do not respond in time are skipped. If
+    the budget of `deadline` runs out, the vendors that have not been listed yet
+    are skipped. Vendors that were finished or listed in the run resumed by
+    `journal` are not listed again and files it has copied are left out.
+
+    Args:
+        vendors: list of vendor names
+        timedelta: time period to retrieve files from
+        shard: `Shard` to list files for (default None)
+        deadline: `Deadline` to limit the time taken to list files (default None)
+        journal: `RunJournal` to record and resume the run with (default None)
+
+    Returns:
+        list of `TransferTask` objects
+    """
+    tasks = []
+    for vendor in vendors:
+        if journal is not None and journal.is_finished(vendor):
+            logger.info(f"({vendor.upper()}) Finished in interrupted run. Skipping.")
+            continue
+        planned = journal.plan(vendor) if journal is not None else None
+        if journal is not None and planned is not None:
+            files = journal.pending(vendor, planned)
+            logger.info(
+                f"({vendor.upper()}) {len(files)} file(s) left to copy from "
+                "interrupted run"
+            )
+            tasks.extend(TransferTask(vendor=vendor, file=i) for i in files)
+            continue
+        try:
+            with released(connect("nsdrop", deadline)) as nsdrop_client:
+                with released(connect(vendor, deadline)) as vendor_client:
+                    files = get_vendor_file_list(
+                        vendor=vendor,
+                        timedelta=timedelta,
+                        nsdrop_client=nsdrop_client,
+                        vendor_client=vendor_client,
+                        deadline=deadline,
+                    )
+                    if shard is not None:
+                        files = shard.files(vendor, files)
+                    logger.info(
+                        f"({vendor_client.name}) {len(files)} file(s) on "
+                        f"{vendor_client.name} server to copy to NSDROP"
+                    )
+                    if journal is not None:
+                        journal.record_plan(vendor, files)
+                    tasks.extend(TransferTask(vendor=vendor, file=i) for i in files)
+        except DeadlineExceeded:
+            break
+        except (FileRetrieverError, OperationTimeout):
+            continue
+    return tasks
+
+
+def _transfer_worker(
+    queue: TransferQueue,
+    report: TransferReport,
+    test: bool,
+    pipeline: Optional["ValidationPipeline"],
+    leases: bool,
+    lease_dir: Optional[str],
+    controller: ConcurrencyController,
+    throttle: Throttle,
+    deadline: Optional[Deadline],
+    cache: Optional[ContentCache],
+    hashes: Optional[HashIndex],
+    journal: Optional[RunJournal],
+) -> None:
+    clients: dict[str, Client] = {}
+    lease_stores: dict[int, LeaseStore] = {}
+
+    def client(name: str) -> Client:
+        if name.upper() not in clients:
+            clients[name.upper()] = connect(name, deadline)
+        return clients[name.upper()]
+
+    def close(name: str) -> None:
+        with contextlib.suppress(Exception):
+            clients.pop(name.upper()).close()
+
+    def close_vendors(keep: Optional[str] = None) -> None:
+        # sessions that are not in use would count against a vendor's limit
+        for name in [i for i in clients if i not in ("NSDROP", keep)]:
+            close(name)
+
+    def lease_store(nsdrop_client: Client) -> LeaseStore:
+        if id(nsdrop_client) not in lease_stores:
+            lease_stores.clear()
+            lease_stores[id(nsdrop_client)] = open_lease_store(nsdrop_client, lease_dir)
+        return lease_stores[id(nsdrop_client)]
+
+    try:
+        while (task := queue.get(on_wait=close_vendors)) is not None:
+            if deadline is not None and deadline.expired():
+                report.not_started.append(task)
+                queue.done(task)
+                continue
+            close_vendors(keep=task.vendor.upper())
+            started = time.monotonic()
+            ok: Optional[bool] = None
+            failed_host = "NSDROP"
+            try:
+                nsdrop_client = client("nsdrop")
+                failed_host = task.vendor
+                vendor_client = client(task.vendor)
+                with (
+                    claim_file(
+                        task.vendor,
+                        task.file,
+                        nsdrop_client,
+                        lease_store(nsdrop_client),
+                    )
+                    if leases
+                    else contextlib.nullcontext(True)
+                ) as claimed:
+                    if claimed:
+                        copied_file = get_single_file(
+                            vendor=task.vendor,
+                            file=task.file,
+                            vendor_client=vendor_client,
+                            nsdrop_client=nsdrop_client,
+                            test=test,
+                            pipeline=pipeline,
+                            throttle=throttle,
+                            deadline=deadline,
+                            cache=cache,
+                            hashes=hashes,
+                        )
+                        if copied_file is None:
+                            report.skipped.append(task)
+                        else:
+                            if journal is not None:
+                                journal.record_copied(task.vendor, task.file)
+                            report.copied.append(task)
+                            ok = True
+            except Exception as e:
+                ok = False
+                logger.error(
+                    f"({task.vendor.upper()}) Unable to copy {task.file.file_name} "
+                    f"to NSDROP: {e}"
+                )
+                report.failed.append(task)
+                for name in [task.vendor, "nsdrop"]:
+                    if name.upper() in clients:
+                        close(name)
+            finally:
+                finished = time.monotonic()
+                if ok:
+                    for name in [task.vendor, "nsdrop"]:
+                        controller.record(name, task.size, started, finished, ok)
+                elif ok is False:
+                    controller.record(failed_host, 0, started, finished, ok)
+                queue.done(task)
+    finally:
+        for name in list(clients):
+            close(name)
+
+
+def run_transfers(
+    tasks: list[TransferTask],
+    workers: int,
+    test: bool,
+    pipeline: Optional["ValidationPipeline"] = None,
+    leases: bool = False,
+    lease_dir: Optional[str] = None,
+    throttle: Optional[Throttle] = None,
+    deadline: Optional[Deadline] = None,
+    cache: Optional[ContentCache] = None,
+    hashes: Optional[HashIndex] = None,
+    journal: Optional[RunJournal] = None,
+) -> TransferReport:
+    """
+    Copy files to NSDROP on `workers` threads which take tasks from a shared
+    `TransferQueue`. Each worker opens its own sessions to the vendor servers
+    and NSDROP. The number of concurrent transfers to each host is tuned during
+    the run by a `ConcurrencyController` and the learned limits are saved for
+    the next run. Transfers on all workers share the rate limits of `throttle`.
+    The predicted and actual time taken to copy all of the files are logged and
+    returned. Each transfer is limited by the timeouts of `deadline` and, once
+    its budget runs out, the remaining files are not started.
+
+    Args:
+        tasks: `TransferTask` objects to copy
+        workers: number of worker threads
+        test: whether to write validation output to the test sheet
+        pipeline: `ValidationPipeline` to validate files with (default None)
+        leases: whether to hold a lease on each file while it is copied
+        lease_dir:
+            local directory to store leases in (default None). if None, leases
+            are stored on NSDROP
+        throttle:
+            `Throttle` to limit the rate of transfers with (default None). if
+            None, the limits are read from each server's `VendorConfig`
+        deadline: `Deadline` to limit the time taken by transfers (default None)
+        cache: `ContentCache` to add copied files to (default None)
+        hashes: `HashIndex` to skip files already on NSDROP with (default None)
+        journal: `RunJournal` to record copied files in (default None)
+
+    Returns:
+        `TransferReport` object
+    """
+    if throttle is None:
+        throttle = Throttle()
+    controller = ConcurrencyController([i.vendor for i in tasks] + ["NSDROP"])
+    queue = TransferQueue(tasks, controller=controller)
+    report = TransferReport(
+        predicted_makespan=plan_makespan(
+            tasks, min(workers, controller.limit("NSDROP")), limits=controller.limits()
+        )
+    )
+    logger.info(
+        f"Copying {len(tasks)} file(s) on {workers} worker(s). Predicted "
+        f"makespan: {report.predicted_makespan:.1f}s"
+    )
+    start = time.monotonic()
+    threads = [
+        threading.Thread(
+            target=_transfer_worker,
+            args=(
+                queue,
+                report,
+                test,
+                pipeline,
+                leases,
+                lease_dir,
+                controller,
+                throttle,
+                deadline,
+                cache,
+                hashes,
+                journal,
+            ),
+            name=f"vendor_file_cli.transfer-{i}",
+        )
+        for i in range(max(1, min(workers, len(tasks))))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.actual_makespan = time.monotonic() - start
+    controller.save()
+    for vendor, count in Counter(i.vendor.upper() for i in report.copied).items():
+        logger.info(
+            f"(NSDROP) {count} file(s) copied to `{get_vendor_config(vendor).dst}`"
+        )
+    logger.info(
+        f"Copied {len(report.copied)} file(s) in {report.actual_makespan:.1f}s "
+        f"(predicted {report.predicted_makespan:.1f}s)."
+    )
+    if report.skipped:
+        logger.info(
+            f"Skipped {len(report.skipped)} file(s) already on NSDROP from another "
+            "vendor or file."
+        )
+    if report.not_started:
+        logger.error(
+            f"Run deadline exceeded. {len(report.not_started)} file(s) not copied."
+        )
+    return report
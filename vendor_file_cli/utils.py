@@ -1,31 +1,96 @@
+import contextlib
+import json
 import logging
 import os
-from typing import Generator, Optional, Union
+import posixpath
+import re
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import TYPE_CHECKING, BinaryIO, Generator, Optional, Union
 
+import httplib2
 import pandas as pd
+import paramiko
 import yaml
-from file_retriever import Client, File
+from file_retriever import Client, File, FileInfo
+from file_retriever.errors import FileRetrieverError
 from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp  # type: ignore
 from google_auth_oauthlib.flow import InstalledAppFlow  # type: ignore
 from googleapiclient.discovery import build  # type: ignore
 from googleapiclient.errors import HttpError  # type: ignore
-from pymarc import MARCReader, Record
+from pymarc import Field, Indicators, MARCReader, Record, Subfield
+
+from vendor_file_cli.config import (
+    get_operation_timeouts,
+    get_vendor_config,
+    load_vendor_configs,
+)
+from vendor_file_cli.deadlines import set_socket_timeout
+
+if TYPE_CHECKING:
+    import hashlib
+
+    from vendor_file_cli.deadlines import Deadline
+    from vendor_file_cli.structure import MarcView
+    from vendor_file_cli.throttle import Throttle
+    from vendor_file_cli.tokens import TokenStore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+    import msvcrt
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 8 * 1024 * 1024
 
-def configure_sheet() -> Credentials:
-    """
-    Get or update credentials for google sheets API and save token to file.
+# SFTP channel settings used by `tune_session`. The window is how much data the
+# server may send before waiting for an acknowledgement and needs to be at
+# least the bandwidth-delay product of the link to keep it full.
+SFTP_WINDOW_SIZE = 16 * 1024 * 1024
+SFTP_MAX_PACKET_SIZE = 128 * 1024
+# Number of read requests `fetch_file` keeps in flight on an SFTP session.
+SFTP_PREFETCH_REQUESTS = 128
 
-    Args:
-        None
+# Start tag of a record in a MARCXML document, with or without a namespace prefix.
+MARCXML_RECORD_TAG = re.compile(rb"<(?:[\w.-]+:)?record[\s/>]")
 
-    Returns:
-        google.oauth2.credentials.Credentials: Credentials object for google sheet API.
-    """
+# Environment variables set by the last call to `load_creds`.
+_loaded_creds: set[str] = set()
+
+
+def _marcxml_record(element: ET.Element) -> Record:
+    record = Record()
+    for child in element:
+        name = child.tag.rpartition("}")[2]
+        if name == "leader":
+            record.leader = (child.text or "").ljust(24)[:24]
+        elif name == "controlfield":
+            record.add_field(Field(tag=child.get("tag", ""), data=child.text or ""))
+        elif name == "datafield":
+            record.add_field(
+                Field(
+                    tag=child.get("tag", ""),
+                    indicators=Indicators(
+                        child.get("ind1") or " ", child.get("ind2") or " "
+                    ),
+                    subfields=[
+                        Subfield(code=i.get("code", ""), value=i.text or "")
+                        for i in child
+                        if i.tag.rpartition("}")[2] == "subfield"
+                    ],
+                )
+            )
+    return record
+
+
+def _sheet_credentials(saved: dict, force_refresh: bool) -> Credentials:
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/accounts.reauth",
@@ -33,7 +98,7 @@ def configure_sheet() -> Credentials:
     token_uri = "https://oauth2.googleapis.com/token"
 
     creds_dict = {
-        "token": os.getenv("GOOGLE_SHEET_TOKEN"),
+        "token": saved.get("token", os.getenv("GOOGLE_SHEET_TOKEN")),
         "refresh_token": os.getenv("GOOGLE_SHEET_REFRESH_TOKEN"),
         "token_uri": token_uri,
         "client_id": os.getenv("GOOGLE_SHEET_CLIENT_ID"),
@@ -41,7 +106,9 @@ def configure_sheet() -> Credentials:
         "scopes": scopes,
         "universe_domain": "googleapis.com",
         "account": "",
-        "expiry": "2024-11-06T15:15:43.146164Z",
+        # the expiry of a token from the environment is unknown so it is
+        # treated as expired
+        "expiry": saved.get("expiry", "2024-11-06T15:15:43.146164Z"),
     }
     flow_dict = {
         "installed": {
@@ -57,7 +124,7 @@ def configure_sheet() -> Credentials:
 
     try:
         creds = Credentials.from_authorized_user_info(creds_dict)
-        if creds and creds.expired and creds.refresh_token:
+        if creds and (creds.expired or force_refresh) and creds.refresh_token:
             creds.refresh(Request())
         elif not creds or not creds.valid:
             logger.debug(
@@ -70,29 +137,139 @@ def configure_sheet() -> Credentials:
         raise e
 
 
-def connect(name: str) -> Client:
+def configure_sheet(force_refresh: bool = False) -> Credentials:
+    """
+    Get or update credentials for google sheets API and save token to file.
+
+    The access token and its expiry are kept in the `TokenStore` returned by
+    `get_token_store` and reused until shortly before the token expires, so
+    the token is not refreshed every time credentials are needed. The store is
+    locked while the token is read and refreshed, so processes running at the
+    same time wait for a single refresh. If no token has been stored, the
+    token from the environment is refreshed.
+
+    Args:
+        force_refresh:
+            whether to refresh the token even if it has not expired (eg. to
+            refresh it ahead of its expiry) (default False)
+
+    Returns:
+        google.oauth2.credentials.Credentials: Credentials object for google sheet API.
+    """
+    store = get_token_store()
+    with store.locked():
+        saved = store.load()
+        creds = _sheet_credentials(saved, force_refresh=force_refresh)
+        if creds is not None and creds.token != saved.get("token"):
+            store.save(creds.token, getattr(creds, "expiry", None))
+        return creds
+
+
+def connect(name: str, deadline: Optional["Deadline"] = None) -> Client:
     """
     Create and return a `Client` object for the specified server using
-    credentials stored in env vars.
+    credentials stored in the server's `VendorConfig`. SFTP sessions are tuned
+    for throughput with `tune_session`. If a `Deadline` is provided, connecting
+    is limited by its connect timeout. Otherwise the session's socket is given
+    the longest of the operation timeouts, so that a read from a server that
+    has stopped responding eventually fails.
 
     Args:
         name: name of server (eg. EASTVIEW, NSDROP)
+        deadline: `Deadline` to limit the time taken to connect (default None)
 
     Returns:
         a `Client` object for the specified server
     """
-    client_name = name.upper()
-    return Client(
-        name=client_name,
-        username=os.environ[f"{client_name}_USER"],
-        password=os.environ[f"{client_name}_PASSWORD"],
-        host=os.environ[f"{client_name}_HOST"],
-        port=os.environ[f"{client_name}_PORT"],
-    )
+    config = get_vendor_config(name)
+
+    def client() -> Client:
+        client = Client(
+            name=config.name,
+            username=config.user,
+            password=config.password,
+            host=config.host,
+            port=config.port,
+        )
+        tune_session(client, compression=config.compression)
+        return client
+
+    if deadline is not None:
+        return deadline.connect(name, client)
+    session = client()
+    with contextlib.suppress(Exception):
+        set_socket_timeout(session, max(get_operation_timeouts().values()))
+    return session
+
+
+def count_marc_records(stream: BinaryIO) -> int:
+    """
+    Count the records in a stream of binary MARC21 or MARCXML data by scanning it
+    in chunks for record terminators or `record` start tags. Trailing MARC21
+    data that is not followed by a record terminator is counted as a record
+    unless it is only whitespace, as it is by `read_marc_chunks`. The records
+    are not parsed and the stream is rewound when the count is complete.
+
+    Args:
+        stream: seekable binary stream containing MARC21 or MARCXML records
+
+    Returns:
+        number of records in the stream
+    """
+    xml = detect_marc_format(stream) == "marcxml"
+    record_count = 0
+    tail = b""
+    trailing = False
+    while chunk := stream.read(CHUNK_SIZE):
+        if not xml:
+            record_count += chunk.count(b"\x1d")
+            end = chunk.rfind(b"\x1d")
+            if end == -1:
+                trailing = trailing or bool(chunk.strip())
+            else:
+                trailing = bool(chunk[end + 1 :].strip())
+            continue
+        # matches ending in the tail were counted with the previous chunk
+        data = tail + chunk
+        record_count += sum(
+            1 for i in MARCXML_RECORD_TAG.finditer(data) if i.end() > len(tail)
+        )
+        tail = data[-64:]
+    stream.seek(0)
+    return record_count + trailing
+
+
+def create_logger_dict(
+    log_format: str = "text", levels: Optional[dict[str, str]] = None
+) -> dict:
+    """
+    Create a dictionary to configure logger. Records from the `vendor_file_cli`
+    and `file_retriever` loggers are put on a queue by a `QueueHandler` and
+    written to the stream and file handlers by a `QueueListener` on a
+    background thread.
 
+    Args:
+        log_format: format of log output, `text` or `json` (default text)
+        levels:
+            levels to set on loggers, keyed by logger name (default None).
+            loggers other than `vendor_file_cli` and `file_retriever` are added
+            and propagate to their parent
 
-def create_logger_dict() -> dict:
-    """Create a dictionary to configure logger."""
+    Returns:
+        dictionary to pass to `logging.config.dictConfig`
+    """
+    formatter = "json" if log_format == "json" else "basic"
+    levels = levels or {}
+    loggers: dict[str, dict] = {
+        name: {
+            "handlers": ["queue"],
+            "level": levels.get(name, "DEBUG"),
+            "propagate": False,
+        }
+        for name in ["file_retriever", "vendor_file_cli"]
+    }
+    for name, level in levels.items():
+        loggers.setdefault(name, {"level": level})
     return {
         "version": 1,
         "disable_existing_loggers": False,
@@ -101,42 +278,159 @@ def create_logger_dict() -> dict:
                 "format": "%(app)s-%(asctime)s-%(filename)s-%(lineno)d-%(levelname)s-%(message)s",  # noqa: E501
                 "defaults": {"app": "vendor_file_cli"},
             },
-            "json": {
-                "format": '{"app": "vendor_file_cli", "ascitime": "%(asctime)s", "fileName": "%(name)s", "lineno":"%(lineno)d", "levelname": "%(levelname)s", "message": "%(message)s"}',  # noqa: E501
-            },
+            "json": {"()": "vendor_file_cli.logs.JsonFormatter"},
         },
         "handlers": {
             "stream": {
                 "class": "logging.StreamHandler",
-                "formatter": "basic",
+                "formatter": formatter,
                 "level": "DEBUG",
             },
             "file": {
                 "class": "logging.handlers.RotatingFileHandler",
-                "formatter": "basic",
+                "formatter": formatter,
                 "level": "DEBUG",
                 "filename": "vendor_file_cli.log",
                 "maxBytes": 10 * 1024 * 1024,
                 "backupCount": 5,
             },
-        },
-        "loggers": {
-            "file_retriever": {
+            "queue": {
+                "class": "logging.handlers.QueueHandler",
                 "handlers": ["stream", "file"],
-                "level": "DEBUG",
-                "propagate": False,
-            },
-            "vendor_file_cli": {
-                "handlers": ["stream", "file"],
-                "level": "DEBUG",
-                "propagate": False,
+                "respect_handler_level": True,
             },
         },
+        "loggers": loggers,
     }
 
 
-def get_control_number(record: Record) -> str:
-    """Get control number from MARC record to add to validation output."""
+def detect_marc_format(stream: BinaryIO) -> str:
+    """
+    Detect whether a stream contains binary MARC21 or MARCXML records from its
+    first non-whitespace byte. The stream is rewound afterwards.
+
+    Args:
+        stream: seekable binary stream containing MARC records
+
+    Returns:
+        `marcxml` if the stream starts with an XML tag, otherwise `marc21`
+    """
+    stream.seek(0)
+    start = stream.read(1024).removeprefix(b"\xef\xbb\xbf").lstrip()
+    stream.seek(0)
+    return "marcxml" if start.startswith(b"<") else "marc21"
+
+
+def fetch_file(
+    client: Client,
+    file: FileInfo,
+    remote_dir: str,
+    throttle: Optional["Throttle"] = None,
+    digest: Optional["hashlib._Hash"] = None,
+) -> File:
+    """
+    Download a file from a server. On SFTP sessions up to
+    `SFTP_PREFETCH_REQUESTS` read requests are sent ahead of the data being
+    read, so the download is not limited to one request per round trip, and
+    the file is written to a temporary file that is held in memory until it
+    exceeds `SPOOL_SIZE` and is then written to disk. Other sessions use
+    `Client.get_file`, which holds the whole file in memory.
+
+    If a `Throttle` is provided, SFTP downloads are paced by the rate limits of
+    the server as the file is read, with at most `SFTP_PREFETCH_REQUESTS` reads
+    in flight ahead of the pace. `Client.get_file` cannot be paced, so other
+    downloads wait for tokens for the whole file before they start.
+
+    If a `digest` (eg. `hashlib.sha256()`) is provided, it is updated with the
+    contents of the file as they are downloaded, so the file does not have to
+    be read again to hash it.
+
+    Args:
+        client: `Client` object for the server
+        file: `FileInfo` object representing the file to download
+        remote_dir: directory on the server containing the file
+        throttle: `Throttle` to limit the rate of the download (default None)
+        digest: hash object to update with the contents of the file
+
+    Returns:
+        `File` object with the contents of the file
+
+    Raises:
+        FileRetrieverError: if the file cannot be read from an SFTP server
+    """
+    connection = getattr(getattr(client, "session", None), "connection", None)
+    if not isinstance(connection, paramiko.SFTPClient):
+        if throttle is not None:
+            throttle.wait(client.name, size=file.file_size or 0, ops=0)
+        fetched_file = client.get_file(file=file, remote_dir=remote_dir)
+        if digest is not None:
+            # `Client.get_file` returns the file in memory, so it is hashed in place
+            with fetched_file.file_stream.getbuffer() as buffer:
+                digest.update(buffer)
+        return fetched_file
+    path = posixpath.join(remote_dir, file.file_name)
+    logger.debug(f"({client.name}) Fetching {file.file_name} from `{remote_dir}`")
+    stream = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        with connection.open(path, "rb") as remote_file:
+            remote_file.prefetch(
+                file.file_size, max_concurrent_requests=SFTP_PREFETCH_REQUESTS
+            )
+            source = (
+                throttle.stream(remote_file, client.name)
+                if throttle is not None
+                else remote_file
+            )
+            while chunk := source.read(CHUNK_SIZE):
+                stream.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+    except (OSError, paramiko.SSHException) as e:
+        logger.error(f"({client.name}) Unable to retrieve {file.file_name}: {e}")
+        stream.close()
+        raise FileRetrieverError(e)
+    stream.seek(0)
+    return File.from_fileinfo(file, stream)  # type: ignore[arg-type]
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Generator[None, None, None]:
+    """
+    Hold an exclusive lock on the file at `path`, creating it if it does not
+    exist and waiting for other processes that hold the lock.
+
+    Args:
+        path: path to the lock file
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:  # pragma: no cover
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:  # pragma: no cover
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+def get_control_number(record: Union[Record, "MarcView"]) -> str:
+    """
+    Get control number from MARC record to add to validation output. Accepts a
+    pymarc `Record` or a `MarcView`, for which only the fields that are looked
+    up are decoded.
+    """
     field = record.get("001", None)
     if field is not None:
         control_number = field.data
@@ -159,6 +453,41 @@ def get_control_number(record: Record) -> str:
     return "None"
 
 
+def get_state_path(file_name: str) -> str:
+    """
+    Return the path to a file in the directory used to store state between runs
+    (eg. delivery history). The directory is read from the
+    `VENDOR_FILE_CLI_STATE_DIR` env var and defaults to `~/.vendor_file_cli`.
+    It is created if it does not exist.
+
+    Args:
+        file_name: name of file in state directory
+
+    Returns:
+        path to file
+    """
+    state_dir = os.environ.get(
+        "VENDOR_FILE_CLI_STATE_DIR",
+        os.path.join(os.path.expanduser("~"), ".vendor_file_cli"),
+    )
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, file_name)
+
+
+def get_token_store() -> "TokenStore":
+    """
+    Return the `TokenStore` used to keep the Google Sheets API access token in
+    the state directory.
+
+    Returns:
+        `TokenStore` object
+    """
+    # tokens imports `file_lock` from this module
+    from vendor_file_cli.tokens import TOKEN_FILE, TokenStore
+
+    return TokenStore(get_state_path(TOKEN_FILE))
+
+
 def get_vendor_list() -> list[str]:
     """
     Read environment variables and return a list of vendors whose
@@ -168,8 +497,7 @@ def get_vendor_list() -> list[str]:
         list of vendors (eg. EASTVIEW, LEILA) whose credentials have been loaded.
     """
     try:
-        hosts = [i for i in os.environ.keys() if i.endswith("_HOST")]
-        vendors = [i.split("_HOST")[0] for i in hosts if "NSDROP" not in i]
+        vendors = [i for i in load_vendor_configs() if "NSDROP" not in i]
         if vendors == []:
             raise ValueError("No vendors found in environment variables.")
         return vendors
@@ -180,7 +508,9 @@ def get_vendor_list() -> list[str]:
 
 def load_creds(config_path: Optional[str] = None) -> None:
     """
-    Read yaml file with credentials and set as environment variables.
+    Read yaml file with credentials and set as environment variables. Variables
+    that were set by a previous call but are no longer in the file are removed,
+    so vendors removed from the file are no longer configured.
 
     Args:
         config_path: Path to .yaml file with credentials.
@@ -197,11 +527,17 @@ def load_creds(config_path: Optional[str] = None) -> None:
             config = yaml.safe_load(file)
             if config is None:
                 raise ValueError("No credentials found in config file.")
+            for k in _loaded_creds.difference(config):
+                os.environ.pop(k, None)
             for k, v in config.items():
                 os.environ[k] = str(v)
+            load_vendor_configs.cache_clear()
             vendor_list = get_vendor_list()
             for vendor in vendor_list:
                 os.environ[f"{vendor}_DST"] = f"NSDROP/vendor_records/{vendor.lower()}"
+            load_vendor_configs.cache_clear()
+            _loaded_creds.clear()
+            _loaded_creds.update(config, (f"{i}_DST" for i in vendor_list))
     except ValueError as e:
         logger.error(str(e))
         raise e
@@ -209,12 +545,162 @@ def load_creds(config_path: Optional[str] = None) -> None:
 
 def read_marc_file_stream(file_obj: File) -> Generator[Record, None, None]:
     """Read the records contained within filestream of File object using pymarc"""
-    fh = file_obj.file_stream.getvalue()
-    reader = MARCReader(fh)
+    yield from read_marc_stream(file_obj.file_stream)
+
+
+def read_marc_chunks(stream: BinaryIO) -> Generator[bytes, None, None]:
+    """
+    Read the raw bytes of records one at a time from a seekable binary stream
+    of MARC21 data. The stream is split on record terminators, as in
+    `count_marc_records`, and the records are not parsed. Trailing data that is
+    not followed by a record terminator is yielded as a final record unless it
+    is only whitespace.
+
+    MARCXML records are read with `read_marcxml_stream` and yielded in MARC21
+    transmission format encoded as UTF-8.
+    """
+    if detect_marc_format(stream) == "marcxml":
+        for record in read_marcxml_stream(stream):
+            record.leader = record.leader[:9] + "a" + record.leader[10:]
+            yield record.as_marc21()
+        return
+    remainder = b""
+    while chunk := stream.read(CHUNK_SIZE):
+        *records, remainder = (remainder + chunk).split(b"\x1d")
+        for record in records:
+            yield record + b"\x1d"
+    if remainder.strip():
+        yield remainder
+
+
+def read_marc_stream(stream: BinaryIO) -> Generator[Record, None, None]:
+    """
+    Read records one at a time from a seekable binary stream using pymarc. Only
+    the record currently being parsed is held in memory. Streams of MARCXML are
+    read with `read_marcxml_stream`.
+    """
+    if detect_marc_format(stream) == "marcxml":
+        yield from read_marcxml_stream(stream)
+        return
+    reader = MARCReader(stream)
     for record in reader:
         yield record
 
 
+def read_marcxml_stream(stream: BinaryIO) -> Generator[Record, None, None]:
+    """
+    Read records one at a time from a seekable binary stream of MARCXML. The
+    document is parsed incrementally and each `record` element is cleared once
+    it has been converted to a pymarc `Record`, so memory use does not grow
+    with the size of the file. Elements may use the MARC21 slim namespace or
+    no namespace.
+
+    Raises:
+        ET.ParseError:
+            if the document is not well-formed. records before the error are
+            yielded first
+    """
+    stream.seek(0)
+    root = None
+    try:
+        for event, element in ET.iterparse(stream, events=("start", "end")):
+            if root is None:
+                root = element
+            if event == "end" and element.tag.rpartition("}")[2] == "record":
+                record = _marcxml_record(element)
+                element.clear()
+                if element is not root:
+                    root.clear()
+                yield record
+    except ET.ParseError as e:
+        logger.error(f"Unable to parse MARCXML: {e}")
+        raise
+
+
+def read_state(file_name: str) -> dict:
+    """
+    Read a JSON file from the state directory.
+
+    Args:
+        file_name: name of file in state directory
+
+    Returns:
+        contents of file or an empty dictionary if the file does not exist or
+        cannot be read
+    """
+    path = get_state_path(file_name)
+    try:
+        with open(path, "r") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unable to read state from {path}: {e}")
+        return {}
+
+
+def spool_stream(stream: BinaryIO) -> BinaryIO:
+    """
+    Return a seekable version of `stream`. Streams that cannot be rewound (eg.
+    a socket) are copied in chunks to a temporary file which is held in memory
+    until it exceeds `SPOOL_SIZE` and is then written to disk.
+
+    Args:
+        stream: binary stream to spool
+
+    Returns:
+        seekable binary stream with the same content as `stream`
+    """
+    if stream.seekable():
+        return stream
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+    spool.seek(0)
+    return spool  # type: ignore[return-value]
+
+
+def tune_session(client: Client, compression: bool = False) -> None:
+    """
+    Reopen the SFTP channel of a client's session with a window of
+    `SFTP_WINDOW_SIZE` and a maximum packet size of `SFTP_MAX_PACKET_SIZE` so
+    that more data can be in flight on high-latency links. If `compression` is
+    True, the keys of the SSH transport are renegotiated with compression
+    enabled, which only takes effect if the server supports it. Sessions that
+    are not SFTP are left unchanged.
+
+    Args:
+        client: `Client` object for the server
+        compression: whether to compress the SSH transport
+    """
+    session = getattr(client, "session", None)
+    connection = getattr(session, "connection", None)
+    if not isinstance(connection, paramiko.SFTPClient):
+        return
+    transport = connection.get_channel().get_transport()
+    if compression:
+        try:
+            transport.use_compression(True)
+            transport.renegotiate_keys()
+        except paramiko.SSHException as e:
+            logger.warning(f"({client.name}) Unable to enable compression: {e}")
+    try:
+        tuned = paramiko.SFTPClient.from_transport(
+            transport,
+            window_size=SFTP_WINDOW_SIZE,
+            max_packet_size=SFTP_MAX_PACKET_SIZE,
+        )
+    except paramiko.SSHException as e:
+        logger.warning(f"({client.name}) Unable to tune SFTP session: {e}")
+        return
+    if tuned is None:
+        return
+    cwd = connection.getcwd()
+    if cwd is not None:
+        tuned.chdir(cwd)
+    session.connection = tuned
+    connection.close()
+
+
 def write_data_to_sheet(values: dict, test: bool) -> Union[dict, None]:
     """
     Write output of validation to google sheet.
@@ -261,7 +747,8 @@ def write_data_to_sheet(values: dict, test: bool) -> Union[dict, None]:
 
     try:
         creds = configure_sheet()
-        service = build("sheets", "v4", credentials=creds)
+        http = httplib2.Http(timeout=get_operation_timeouts()["sheet"])
+        service = build("sheets", "v4", http=AuthorizedHttp(creds, http=http))
         result = (
             service.spreadsheets()
             .values()
@@ -284,3 +771,25 @@ def write_data_to_sheet(values: dict, test: bool) -> Union[dict, None]:
         f"({vendor_code}) Validation data not written to google sheet for {file_name}."
     )
     return None
+
+
+def write_state(file_name: str, data: dict) -> None:
+    """
+    Write a dictionary to a JSON file in the state directory. The file is
+    written to a temporary file and then moved into place so that readers never
+    see a partially written file.
+
+    Args:
+        file_name: name of file in state directory
+        data: JSON-serializable dictionary to write
+    """
+    path = get_state_path(file_name)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Unable to write state to {path}: {e}")
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
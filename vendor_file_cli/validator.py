@@ -1,8 +1,10 @@
 import datetime
+import hashlib
 import logging
-import os
+import posixpath
+import xml.etree.ElementTree as ET
 from collections import defaultdict
-from typing import Any
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Generator, Optional, Union
 
 from file_retriever import Client, File, FileInfo
 from pydantic import ValidationError
@@ -10,14 +12,67 @@ from pymarc import Record
 from record_validator.marc_errors import MarcValidationError
 from record_validator.marc_models import RecordModel
 
+from vendor_file_cli.cache import ContentCache
+from vendor_file_cli.config import (
+    VendorConfig,
+    get_required_tags,
+    get_vendor_code,
+    get_vendor_config,
+)
+from vendor_file_cli.deadlines import Deadline
+from vendor_file_cli.dedupe import HashIndex
+from vendor_file_cli.listing import FileListing, list_directory
+from vendor_file_cli.memo import ValidationMemo, get_validation_memo
+from vendor_file_cli.structure import MarcView, prevalidate, read_record
+from vendor_file_cli.throttle import Throttle
 from vendor_file_cli.utils import (
+    connect,
+    count_marc_records,
+    fetch_file,
     get_control_number,
-    read_marc_file_stream,
+    read_marc_chunks,
+    spool_stream,
     write_data_to_sheet,
 )
 
+if TYPE_CHECKING:
+    from vendor_file_cli.pipeline import ValidationPipeline
+
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 1000
+
+
+def _list_vendor_files(client: Client, config: VendorConfig) -> FileListing:
+    return FileListing.concat(
+        [list_directory(client, i) for i in (config.src, *config.extra_dirs)]
+    )
+
+
+def _parse_error_output() -> dict[str, Any]:
+    return {
+        "valid": False,
+        "error_count": 1,
+        "missing_field_count": 0,
+        "missing_fields": [],
+        "extra_field_count": 0,
+        "extra_fields": [],
+        "invalid_field_count": 1,
+        "invalid_fields": ["marcxml"],
+        "order_item_mismatches": [],
+    }
+
+
+def _read_chunks(
+    stream: BinaryIO,
+) -> Generator[Union[bytes, ET.ParseError], None, None]:
+    # a MARCXML file that is not well-formed cannot be read past the error, so
+    # the error is yielded in place of the rest of the file's records
+    try:
+        yield from read_marc_chunks(stream)
+    except ET.ParseError as e:
+        yield e
+
 
 def get_single_file(
     vendor: str,
@@ -25,35 +80,120 @@ def get_single_file(
     vendor_client: Client,
     nsdrop_client: Client,
     test: bool,
-) -> File:
+    pipeline: Optional["ValidationPipeline"] = None,
+    throttle: Optional[Throttle] = None,
+    deadline: Optional[Deadline] = None,
+    cache: Optional[ContentCache] = None,
+    hashes: Optional[HashIndex] = None,
+) -> Optional[File]:
     """
     Get a file from a vendor server and copy it to the vendor's NSDROP directory.
-    Validates the file if the vendor is EASTVIEW, LEILA, or AMALIVRE_SASB.
+    Validates the file if the vendor's `VendorConfig` has a validation code (by
+    default EASTVIEW, LEILA, and AMALIVRE_SASB). If a `ValidationPipeline` is
+    provided the file is added to its queue and validated in the background,
+    otherwise it is validated before returning. Files are downloaded with
+    `fetch_file`, which pipelines reads from SFTP servers.
+
+    If a `Throttle` is provided, the transfer is paced by the rate limits of the
+    vendor's server, NSDROP and the global limits. Downloads from SFTP servers
+    and the upload to NSDROP are paced as they are read. Downloads from FTP
+    servers wait for tokens for the whole file before they start.
+
+    If a `Deadline` is provided, the download and upload are each limited by
+    its timeouts and the clients are closed if either of them times out.
+
+    If a `ContentCache` is provided, the contents of the file are added to it
+    once the file has been copied to NSDROP, so that validating the file again
+    does not download it from NSDROP.
+
+    If a `HashIndex` is provided, the SHA-256 digest of the file, computed as it
+    is downloaded, is looked up in it before the file is copied. A file with the
+    same content as a file already copied to NSDROP (by any vendor) is neither
+    copied nor validated. If the index's mode is `marker`, a small marker file
+    naming the original is copied to NSDROP instead. Files found to be
+    duplicates on an earlier run are skipped without being downloaded if their
+    size and modification time have not changed.
 
     Args:
         vendor: name of vendor
         file: `FileInfo` object representing the file to retrieve
         vendor_client: `Client` object for the vendor server
         nsdrop_client: `Client` object for the NSDROP server
+        test: whether to write the validation results to the test sheet
+        pipeline: `ValidationPipeline` to validate the file with (default None)
+        throttle: `Throttle` to limit the rate of the transfer with (default None)
+        deadline: `Deadline` to limit the time taken by the transfer (default None)
+        cache: `ContentCache` to add the file to (default None)
+        hashes: `HashIndex` to check the file's content against (default None)
 
     Returns:
-        None
+        `File` object that was copied to NSDROP or None if the file was not
+        copied because its content is already on NSDROP
 
     """
-    if vendor.lower() == "bakertaylor_bpl" and file.file_name.startswith(
-        ("ADD", "NEW")
-    ):
-        remote_dir = ""
+    config = get_vendor_config(vendor)
+    path = posixpath.join(config.dst, file.file_name)
+    if hashes is not None and (original := hashes.check(vendor, file)) is not None:
+        logger.info(
+            f"({vendor.upper()}) Skipping {file.file_name}: same content as {original}"
+        )
+        return None
+    if throttle is not None:
+        throttle.wait(vendor)
+    remote_dir = config.remote_dir(file.file_name)
+    content_hash = hashlib.sha256() if hashes is not None else None
+    if deadline is not None:
+        fetched_file = deadline.call(
+            "get",
+            vendor_client,
+            lambda: fetch_file(vendor_client, file, remote_dir, throttle, content_hash),
+        )
     else:
-        remote_dir = os.environ[f"{vendor.upper()}_SRC"]
-    nsdrop_dir = os.environ[f"{vendor.upper()}_DST"]
-    fetched_file = vendor_client.get_file(file=file, remote_dir=remote_dir)
-    nsdrop_client.put_file(file=fetched_file, dir=nsdrop_dir, remote=True)
-    if vendor.upper() in ["EASTVIEW", "LEILA", "AMALIVRE_SASB"]:
+        fetched_file = fetch_file(
+            vendor_client, file, remote_dir, throttle, content_hash
+        )
+    if hashes is not None and content_hash is not None:
+        digest = content_hash.hexdigest()
+        original = hashes.find(digest, path)
+        if original is not None:
+            logger.info(
+                f"({vendor.upper()}) {file.file_name} has the same content as "
+                f"{original}. Not copying to NSDROP."
+            )
+            if hashes.mode == "marker":
+                nsdrop_client.put_file(
+                    file=hashes.marker(file, original, digest),
+                    dir=config.dst,
+                    remote=True,
+                )
+            hashes.record(vendor, file, path, digest)
+            return None
+    upload = fetched_file
+    if throttle is not None:
+        throttle.wait(nsdrop_client.name)
+        upload = File.from_fileinfo(
+            fetched_file, throttle.stream(fetched_file.file_stream, nsdrop_client.name)
+        )
+    if deadline is not None:
+        written_file = deadline.call(
+            "put",
+            nsdrop_client,
+            lambda: nsdrop_client.put_file(file=upload, dir=config.dst, remote=True),
+        )
+    else:
+        written_file = nsdrop_client.put_file(file=upload, dir=config.dst, remote=True)
+    if hashes is not None:
+        hashes.record(vendor, file, path, digest)
+    if cache is not None:
+        cache.put(config.dst, fetched_file, written_file)
+    if config.validate:
         logger.debug(
             f"({nsdrop_client.name}) Validating {vendor} file: {fetched_file.file_name}"
         )
-        validate_file(file_obj=fetched_file, vendor=vendor, test=test)
+        if pipeline is not None:
+            pipeline.submit(file_obj=fetched_file, vendor=vendor)
+        else:
+            validate_file(file_obj=fetched_file, vendor=vendor, test=test)
     return fetched_file
 
 
@@ -62,6 +202,7 @@ def get_vendor_file_list(
     timedelta: datetime.timedelta,
     nsdrop_client: Client,
     vendor_client: Client,
+    deadline: Optional[Deadline] = None,
 ) -> list[FileInfo]:
     """
     Create list of files to retrieve from vendor server. Compares list of files
@@ -69,96 +210,162 @@ def get_vendor_file_list(
     includes files that are not already present in the NSDROP directory. The
     list of files is filtered based on the timedelta provided.
 
-    If the vendor is BAKERTAYLOR_NYPL, the root directory of the is also checked
-    for files that are not in the NSDROP directory. This is because the
-    BAKERTAYLOR_NYPL server has multiple directories that contain files that
-    need to be copied to NSDROP.
+    If the vendor's `VendorConfig` has `extra_dirs` (eg. BAKERTAYLOR_BPL), those
+    directories are also checked for files that are not in the NSDROP directory.
+    This is because the BAKERTAYLOR_BPL server has multiple directories that
+    contain files that need to be copied to NSDROP.
 
     If the vendor is MIDWEST_NYPL, the directories are compared using just
     the file names and then a list of FileInfo objects is created from the
     list of file names. This is due to the fact that there are nearly 10k files
     on the MIDWEST_NYPL server.
 
+    Each directory on the vendor server is listed with `list_directory`, which
+    uses a single command per directory (`MLSD` or `LIST` on FTP servers)
+    rather than looking up the size and modification time of each file. The
+    listing is held as a `FileListing` and the time period and NSDROP filters
+    are applied to it in a single pass against a precomputed cutoff time, so
+    no datetime objects are created per file.
+
+    If a `Deadline` is provided, both listings are limited by its list timeout.
+    If the vendor's server has not returned its listing after
+    `Deadline.hedge_after` seconds, the listing is started again on a fresh
+    connection and the first one to finish is used. If the fresh connection
+    wins, it replaces the session of `vendor_client`.
+
     Args:
 
         vendor: name of vendor
         timedelta: timedelta object representing the time period to retrieve files from
         nsdrop_client: `Client` object for the NSDROP server
         vendor_client: `Client` object for the vendor server
+        deadline: `Deadline` to limit the time taken by the listings (default None)
 
     Returns:
         list of `FileInfo` objects representing files to retrieve from the vendor server
     """
-    today = datetime.datetime.now(tz=datetime.timezone.utc)
-    vendor = vendor.upper()
-    nsdrop_files = nsdrop_client.list_files(os.environ[f"{vendor}_DST"])
-    vendor_files = vendor_client.list_file_info(os.environ[f"{vendor}_SRC"])
-
-    if vendor == "BAKERTAYLOR_BPL":
-        vendor_files.extend(vendor_client.list_file_info(""))
-
-    return [
-        i
-        for i in vendor_files
-        if i.file_name not in nsdrop_files
-        and datetime.datetime.fromtimestamp(i.file_mtime, tz=datetime.timezone.utc)
-        >= today - timedelta
-    ]
+    cutoff = (datetime.datetime.now(tz=datetime.timezone.utc) - timedelta).timestamp()
+    config = get_vendor_config(vendor)
+    if deadline is not None:
+        nsdrop_files = deadline.call(
+            "list", nsdrop_client, lambda: nsdrop_client.list_files(config.dst)
+        )
+        listing = deadline.hedge(
+            "list",
+            vendor_client,
+            lambda client: _list_vendor_files(client, config),
+            reconnect=lambda: connect(vendor),
+        )
+    else:
+        nsdrop_files = nsdrop_client.list_files(config.dst)
+        listing = _list_vendor_files(vendor_client, config)
+    return listing.filter(since=cutoff, exclude=nsdrop_files)
 
 
-def validate_file(file_obj: File, vendor: str, test: bool) -> dict:
+def validate_file(
+    file_obj: File,
+    vendor: str,
+    test: bool,
+    batch_size: int = BATCH_SIZE,
+    sink: Optional[Callable[[dict, bool], Any]] = None,
+    memo: Optional[ValidationMemo] = None,
+) -> dict:
     """
-    Validate a file of MARC records and output to google sheet.
+    Validate a file of MARC records and output to google sheet. Records are read
+    from the file's stream and validated one at a time and the output is written
+    to the google sheet in batches of `batch_size` rows so that memory use is
+    bounded by the batch size rather than the size of the file. Records that
+    have already been validated are looked up in `memo` instead of being
+    validated again. Each record is read as a `MarcView`, so its fields are
+    only decoded if they are needed. Its structure is checked first and records
+    that are malformed or missing a required field are reported as invalid
+    without being validated against the `RecordModel`. Records the view finds
+    malformed are parsed with pymarc instead (see `read_record`) and are only
+    reported as malformed if pymarc cannot read them either. If a MARCXML file
+    is not well-formed, the rest of the file after the records that could be
+    read is reported as one invalid record with `marcxml` in the invalid fields
+    column.
 
     Args:
         file_obj: `File` object representing the file to validate.
         vendor: name of vendor to validate file for.
-        write: whether to write the validation results to the google sheet.
+        test: whether to write the validation results to the test sheet.
+        batch_size: number of rows to write to the google sheet at a time.
+        sink:
+            function called with each batch of rows and `test` (default None).
+            If None, each batch is written to the google sheet.
+        memo:
+            `ValidationMemo` to look up and store validation output in (default
+            None). If None, the memo shared by the process is used.
 
     Returns:
-        dictionary containing validation output for the file.
+        dictionary with the name of the file, the number of records validated
+        and the number of those records that are invalid. The validation output
+        for each record is only passed to `sink`, so it is not held in memory
+        for the whole file.
 
     """
-    if "AMALIVRE" in vendor.upper():
-        vendor_code = "AUXAM"
-    elif "EASTVIEW" in vendor.upper():
-        vendor_code = "EVP"
-    elif "LEILA" in vendor.upper():
-        vendor_code = "LEILA"
-    else:
-        vendor_code = vendor.upper()
-    record_count = len([i for i in read_marc_file_stream(file_obj)])
-    reader = read_marc_file_stream(file_obj)
-    record_n = 1
-    out_dict = defaultdict(list)
-    for record in reader:
-        validation_data = validate_single_record(record)
+    vendor_code = get_vendor_code(vendor)
+    required_tags = get_required_tags(vendor)
+    if sink is None:
+        sink = write_data_to_sheet
+    if memo is None:
+        memo = get_validation_memo()
+    stream = spool_stream(file_obj.file_stream)
+    record_count = count_marc_records(stream)
+    validation_date = datetime.datetime.today().strftime("%Y-%m-%d %I:%M:%S")
+    batch: defaultdict[str, list] = defaultdict(list)
+    record_n = invalid_count = 0
+    for record_n, data in enumerate(_read_chunks(stream), start=1):
+        if isinstance(data, ET.ParseError):
+            validation_data = _parse_error_output()
+            control_number = "None"
+        else:
+            record = read_record(data)
+            key = memo.key(data, required_tags)
+            validation_data = memo.get(key)
+            if validation_data is None:
+                validation_data = prevalidate(record, required_tags)
+                if validation_data is None:
+                    validation_data = validate_single_record(record)
+                memo.put(key, validation_data)
+            control_number = get_control_number(record)
+        if not validation_data["valid"]:
+            invalid_count += 1
         validation_data.update(
             {
-                "record_number": f"{record_n} of {record_count}",
-                "control_number": get_control_number(record),
+                "record_number": f"{record_n} of {max(record_n, record_count)}",
+                "control_number": control_number,
                 "file_name": file_obj.file_name,
                 "vendor_code": vendor_code,
-                "validation_date": datetime.datetime.today().strftime(
-                    "%Y-%m-%d %I:%M:%S"
-                ),
+                "validation_date": validation_date,
             }
         )
         for k, v in validation_data.items():
-            out_dict[k].append(str(v))
-        record_n += 1
-    write_data_to_sheet(out_dict, test=test)
-    return out_dict
+            batch[k].append(str(v))
+        if record_n % batch_size == 0:
+            sink(batch, test)
+            batch = defaultdict(list)
+    if batch:
+        sink(batch, test)
+    memo.save()
+    return {
+        "file_name": file_obj.file_name,
+        "record_count": record_n,
+        "invalid_count": invalid_count,
+    }
 
 
-def validate_single_record(record: Record) -> dict[str, Any]:
+def validate_single_record(record: Union[Record, MarcView]) -> dict[str, Any]:
     """
     Validate a single MARC record using the RecordModel. If the record is invalid,
     return a dictionary with the error information. If the record is valid, return
     a dictionary with the validation information.
 
     Args:
-        record: pymarc.Record object representing the record to validate.
+        record:
+            pymarc.Record object or `MarcView` representing the record to
+            validate.
 
     Returns:
         dictionary with validation output.